@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Measure the per-message cost of the conversion plugin's replier.
+
+The replier runs on every message in every channel, so what matters most is
+how quickly it rejects the lines that are not conversions. The "before"
+numbers use the original pattern without the pre-filter.
+
+The pattern is also timed on long lines that get past the pre-filter and
+used to make the regex engine backtrack.
+
+Usage: python benchmarks/conversion_bench.py [-n NUMBER]
+"""
+
+import argparse
+import datetime
+import os.path
+import re
+import sys
+import timeit
+import unittest.mock as mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import botologist.bot
+import botologist.protocol.irc as irc
+import plugins.conversion
+from plugins.conversion import ConversionPlugin
+
+
+OLD_PATTERN = re.compile(
+	r'((?:[\d][\d,. ]*?|[\.][\d]*?)[km]??)' + r' ?' +
+	r'((?:(?:square|cubic) )?[a-z.,/°]+)' + r' (into|in|to) ' +
+	r'((?:(?:square|cubic) )?[a-z.,/°]+)', re.I)
+
+# a mix of what a channel typically looks like: mostly chatter, some of it
+# with numbers or "in"/"to" in it, and the odd conversion
+CORPUS = [
+	'hey, anyone around?',
+	'lol',
+	'did you see the game last night',
+	'I am going to the store in a bit',
+	'brb',
+	'the build is broken again, someone pushed to master without running tests',
+	'https://github.com/anlutro/botologist/pull/123',
+	'meeting moved to 14:30',
+	'we had 3 outages in 2 weeks, that is not great',
+	'can you look into it when you have time?',
+	'ok',
+	'version 1.2.3 is out, upgrade to it asap',
+	'my ping is like 250 to the eu servers',
+	'anyone know how to get into the admin panel',
+	'100 kg in lbs',
+	'what is 10 eur into usd?',
+	'it is 30 c in here today',
+	'1 2 3 4 5 6 7 8 9 10 11 12 13 14 15 16 17 18 19 20 21 22 23 24 25',
+	'ah, 1000 1000 1000 1000 1000 1000 1000 1000 1000 1000 1000 1000 foo',
+	'nah',
+]
+
+
+# lines of about 480 characters that pass might_be_conversion but aren't
+# conversions
+WORST_CASES = [
+	'1,' * 240 + ' in ',
+	'1.' * 240 + ' to ',
+	'1 ' * 240 + 'in x',
+	'1' * 480 + ' in ',
+]
+
+
+class DiscardingExecutor:
+	"""Stands in for the bot's thread pool, dropping the DuckDuckGo lookups the
+	plugin hands to it instead of queueing them up."""
+	def __init__(self):
+		self.submitted = 0
+
+	def submit(self, func, *args):
+		self.submitted += 1
+
+
+def create_plugin():
+	bot = botologist.bot.Bot({
+		'storage_dir': '/tmp/botologist',
+		'bot': {'server': 'localhost:6667'},
+	})
+	plugin = ConversionPlugin(bot, irc.Channel('#bench'))
+	plugin.currency.storage_path = None
+	plugin.currency.currency_data = {'USD': 1.1, 'NOK': 9.5, 'DKK': 7.4}
+	plugin.currency.last_fetch = datetime.datetime.now()
+	return plugin
+
+
+def run_corpus(replier, messages, number):
+	def run():
+		for message in messages:
+			replier(message)
+	total = min(timeit.repeat(run, number=number, repeat=3))
+	return total / (number * len(messages)) * 1e6
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-n', '--number', type=int, default=2000)
+	args = parser.parse_args()
+
+	plugin = create_plugin()
+	replier = plugin.convert
+	messages = [irc.Message('user!user@host', '#bench', line) for line in CORPUS]
+
+	# never send unknown units off to DuckDuckGo. the lookups are never run,
+	# so nothing is left to make requests after the patch is undone
+	executor = DiscardingExecutor()
+	with mock.patch('botologist.concurrency.get_executor', return_value=executor):
+		with mock.patch.object(ConversionPlugin, 'pattern', OLD_PATTERN), \
+				mock.patch('plugins.conversion.might_be_conversion', return_value=True):
+			before = run_corpus(replier, messages, args.number)
+		after = run_corpus(replier, messages, args.number)
+
+	print('per-message cost over {} lines:'.format(len(messages)))
+	print('  before: {:.2f} us'.format(before))
+	print('  after:  {:.2f} us'.format(after))
+	print('  speedup: {:.1f}x'.format(before / after))
+	print('  remote lookups dropped: {}'.format(executor.submitted))
+
+	print('worst case pattern search times:')
+	for line in WORST_CASES:
+		def search_old():
+			OLD_PATTERN.search(line)
+		def search_new():
+			ConversionPlugin.pattern.search(line)
+		before = min(timeit.repeat(search_old, number=5, repeat=3)) / 5 * 1000
+		after = min(timeit.repeat(search_new, number=5, repeat=3)) / 5 * 1000
+		print('  {!r:24} before: {:7.2f} ms  after: {:6.3f} ms'.format(
+			line[:12] + '...', before, after))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Compare excerpt extraction on large quotes with the algorithm the qdb
+plugin used before botologist.excerpt existed.
+
+Usage: python benchmarks/excerpt_bench.py [-n NUMBER]
+"""
+
+import argparse
+import os.path
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botologist.excerpt import make_excerpt
+
+
+def old_excerpt(body, search):
+	body_len = len(body)
+	try:
+		substr_pos = body.lower().index(search.lower())
+		start = body.rfind('\n', 0, substr_pos) + 1
+		while body_len - start < 300:
+			substr_pos = body.rfind('\n', 0, start - 1) + 1
+			if body_len - substr_pos < 300:
+				start = substr_pos
+			else:
+				break
+		end = start + 350 - len(search)
+	except ValueError:
+		start = 0
+		end = 300
+
+	body = body.replace('\r', '').replace('\n', ' ').replace('\t', ' ')
+	excerpt = body[start:end]
+	if start > 0:
+		excerpt = '[...] ' + excerpt
+	if end < len(body):
+		excerpt = excerpt + ' [...]'
+	return excerpt
+
+
+def make_quote(size, rand):
+	nicks = ['<alice>', '<bob>', '<carol>', '<dave>']
+	words = ['lol', 'the', 'server', 'is', 'down', 'again', 'who', 'broke',
+		'it', 'not', 'me', 'ok', 'restart', 'please', 'thanks', 'what']
+	lines = []
+	length = 0
+	while length < size:
+		line = rand.choice(nicks) + ' ' + ' '.join(
+			rand.choice(words) for _ in range(rand.randint(3, 15)))
+		lines.append(line)
+		length += len(line) + 2
+	return '\r\n'.join(lines)
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-n', '--number', type=int, default=200)
+	args = parser.parse_args()
+
+	rand = random.Random(1)
+	searches = ['broke it', 'restart', 'nothing like this']
+	for size in (4 * 1024, 32 * 1024, 256 * 1024):
+		quote = make_quote(size, rand)
+		print('{} KiB quote:'.format(size // 1024))
+		for search in searches:
+			old = min(timeit.repeat(lambda: old_excerpt(quote, search),
+				number=args.number, repeat=3)) / args.number
+			new = min(timeit.repeat(lambda: make_excerpt(quote, search.split(),
+				length=300, threshold=400), number=args.number, repeat=3)) / args.number
+			print('  {!r:22} before: {:8.1f} us  after: {:8.1f} us'.format(
+				search, old * 1e6, new * 1e6))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Measure how long it takes to construct the bot with and without lazy
+plugin loading.
+
+Every run happens in a fresh interpreter, so module imports are included in
+the numbers. The lazy runs use a plugin manifest written by an earlier run,
+which is what a restart of a long-running bot looks like. The time of the
+first command is also measured, as that is where a lazy plugin gets imported
+if it hasn't been imported in the background yet.
+
+Usage: python benchmarks/plugin_loading.py [-n NUMBER]
+"""
+
+import argparse
+import json
+import os.path
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLUGINS = ['default', 'url', 'conversion', 'spotify', 'twitter', 'weather',
+	'tvseries', 'qlranks', 'qdb', 'pcdb']
+
+CHANNELS = ['#chan{}'.format(idx) for idx in range(5)]
+
+
+def make_config(storage_dir, lazy):
+	return {
+		'protocol': 'local',
+		'storage_dir': storage_dir,
+		'lazy_plugins': lazy,
+		'output_timezone': 'UTC',
+		'twitter_api': {
+			'consumer_key': 'x',
+			'consumer_secret': 'x',
+			'access_token': 'x',
+			'access_token_secret': 'x',
+		},
+		'plugins': {name: guess_plugin_class(name) for name in PLUGINS},
+		'channels': {channel: {'plugins': PLUGINS} for channel in CHANNELS},
+	}
+
+
+def guess_plugin_class(plugin):
+	plugin_class = ''.join(part.title() for part in plugin.split('_'))
+	return 'plugins.{}.{}Plugin'.format(plugin, plugin_class)
+
+
+def child(config):
+	"""Runs in the subprocess: construct the bot and run one command."""
+	import time
+	start = time.perf_counter()
+	import botologist.bot
+	import botologist.protocol.local as local
+	bot = botologist.bot.Bot(config)
+	constructed = time.perf_counter()
+
+	msg = local.Message('!weather', local.User('nick', 'user@host'), CHANNELS[0])
+	cmd = botologist.bot.CommandMessage(msg)
+	bot.channels[CHANNELS[0]].commands['weather'](cmd)
+	first_command = time.perf_counter()
+
+	print(json.dumps({
+		'construct': constructed - start,
+		'first_command': first_command - constructed,
+		'modules': len(sys.modules),
+	}))
+
+
+def run_child(config):
+	output = subprocess.check_output(
+		[sys.executable, __file__, '--child', json.dumps(config)], cwd=ROOT_DIR)
+	return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def run(storage_dir, lazy, number):
+	results = [run_child(make_config(storage_dir, lazy)) for _ in range(number)]
+	return {
+		key: statistics.median(result[key] for result in results)
+		for key in results[0]
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-n', '--number', type=int, default=5)
+	parser.add_argument('--child', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.child:
+		sys.path.insert(0, ROOT_DIR)
+		child(json.loads(args.child))
+		return
+
+	storage_dir = tempfile.mkdtemp()
+	try:
+		eager = run(storage_dir, False, args.number)
+		# write the manifest, then measure the runs that can make use of it
+		run_child(make_config(storage_dir, True))
+		lazy = run(storage_dir, True, args.number)
+	finally:
+		shutil.rmtree(storage_dir)
+
+	print('{} plugins in {} channels, median of {} runs:'.format(
+		len(PLUGINS), len(CHANNELS), args.number))
+	for name, result in (('eager', eager), ('lazy', lazy)):
+		print('  {:5}  startup: {:6.1f} ms  first command: {:6.1f} ms  modules: {}'.format(
+			name, result['construct'] * 1000, result['first_command'] * 1000,
+			int(result['modules'])))
+	print('  startup speedup: {:.1f}x'.format(eager['construct'] / lazy['construct']))
+
+
+if __name__ == '__main__':
+	main()
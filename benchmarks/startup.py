@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Measure how long `python -m botologist` takes to get onto IRC.
+
+The bot is started against a fake IRC server on localhost, and the time from
+starting the process until the server receives NICK, and until it has
+received a JOIN for every configured channel, is recorded. One more run with
+`python -X importtime` shows where the import time goes, both per top-level
+package and per module.
+
+Exits with status 1 if the median time to NICK or to joining all channels is
+above the given thresholds, so it can be used to catch startup regressions.
+
+Usage: python benchmarks/startup.py [-n NUMBER] [--lazy] [--max-nick MS]
+	[--max-join MS] [--top N]
+"""
+
+import argparse
+import collections
+import json
+import os.path
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLUGINS = ['default', 'url', 'conversion', 'spotify', 'twitter', 'weather',
+	'tvseries', 'qlranks', 'qdb', 'pcdb']
+
+CHANNELS = ['#chan{}'.format(idx) for idx in range(5)]
+
+# how long to wait for the bot to join all channels, in seconds
+RUN_TIMEOUT = 30
+
+
+class FakeIRCServer:
+	"""Accepts a single connection and does just enough of the IRC protocol
+	to let the bot register and join its channels, recording when it gets
+	there."""
+	def __init__(self, channels):
+		self.channels = set(channels)
+		self.joined = set()
+		self.events = {}
+		self.done = threading.Event()
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.sock.bind(('127.0.0.1', 0))
+		self.sock.listen(1)
+		self.sock.settimeout(RUN_TIMEOUT)
+		self.port = self.sock.getsockname()[1]
+		self.thread = threading.Thread(target=self.serve)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def serve(self):
+		try:
+			conn, _ = self.sock.accept()
+		except OSError:
+			return
+		nick = 'botologist'
+		buf = b''
+		with conn:
+			while not self.done.is_set():
+				try:
+					data = conn.recv(4096)
+				except OSError:
+					return
+				if not data:
+					return
+				buf += data
+				while b'\r\n' in buf:
+					line, buf = buf.split(b'\r\n', 1)
+					words = line.decode('utf-8', 'replace').split()
+					if not words:
+						continue
+					now = time.perf_counter()
+					if words[0] == 'NICK':
+						nick = words[1]
+						self.events.setdefault('nick', now)
+					elif words[0] == 'USER':
+						self.reply(conn, ':fake.server 001 {} :Welcome'.format(nick))
+					elif words[0] == 'JOIN':
+						self.joined.add(words[1])
+						self.reply(conn, ':{}!bot@127.0.0.1 JOIN {}'.format(nick, words[1]))
+						if self.joined >= self.channels:
+							self.events.setdefault('joined', now)
+							self.done.set()
+					elif words[0] == 'PING':
+						self.reply(conn, ':fake.server PONG ' + words[1])
+
+	@staticmethod
+	def reply(conn, line):
+		conn.sendall(line.encode('utf-8') + b'\r\n')
+
+	def close(self):
+		self.done.set()
+		self.sock.close()
+
+
+def write_config(storage_dir, port, lazy):
+	config = {
+		'protocol': 'irc',
+		'server': '127.0.0.1:{}'.format(port),
+		'nick': 'botologist',
+		'log_path': None,
+		'log_level': 'warning',
+		'storage_dir': storage_dir,
+		'memory_limit_soft': 1024,
+		'memory_limit_hard': 1024,
+		'lazy_plugins': lazy,
+		'output_timezone': 'UTC',
+		'twitter_api': {
+			'consumer_key': 'x',
+			'consumer_secret': 'x',
+			'access_token': 'x',
+			'access_token_secret': 'x',
+		},
+		'global_plugins': PLUGINS,
+		'channels': CHANNELS,
+	}
+	path = os.path.join(storage_dir, 'config.yml')
+	# JSON is valid YAML
+	with open(path, 'w') as f:
+		json.dump(config, f)
+	return path
+
+
+def run_bot(storage_dir, lazy, python_args=()):
+	"""Start the bot, wait for it to join all channels and kill it. Returns
+	the times to NICK and to joining, in seconds, and the bot's stderr."""
+	server = FakeIRCServer(CHANNELS)
+	config_path = write_config(storage_dir, server.port, lazy)
+	stderr_path = os.path.join(storage_dir, 'stderr.txt')
+	try:
+		with open(stderr_path, 'w') as stderr:
+			start = time.perf_counter()
+			proc = subprocess.Popen(
+				[sys.executable] + list(python_args) + ['-m', 'botologist', config_path],
+				cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=stderr)
+			try:
+				server.done.wait(RUN_TIMEOUT)
+			finally:
+				proc.kill()
+				proc.wait()
+	finally:
+		server.close()
+
+	with open(stderr_path) as f:
+		output = f.read()
+	if 'joined' not in server.events:
+		sys.exit('bot did not join all channels within {}s:\n{}'.format(
+			RUN_TIMEOUT, output))
+	return (server.events['nick'] - start, server.events['joined'] - start, output)
+
+
+def parse_importtime(output):
+	"""Parse `-X importtime` output into (module, self us, cumulative us)."""
+	imports = []
+	for line in output.splitlines():
+		if not line.startswith('import time:'):
+			continue
+		parts = line[len('import time:'):].split('|')
+		if len(parts) != 3:
+			continue
+		try:
+			self_us, cumulative_us = int(parts[0]), int(parts[1])
+		except ValueError:
+			# the header line
+			continue
+		imports.append((parts[2].strip(), self_us, cumulative_us))
+	return imports
+
+
+def import_cost_by_package(imports):
+	costs = collections.Counter()
+	for module, self_us, _ in imports:
+		costs[module.split('.')[0]] += self_us
+	return costs
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-n', '--number', type=int, default=5)
+	parser.add_argument('--lazy', action='store_true',
+		help='enable lazy_plugins (the manifest is written by a warm-up run)')
+	parser.add_argument('--max-nick', type=float, default=1500,
+		help='fail if the median time to NICK is above this many ms')
+	parser.add_argument('--max-join', type=float, default=2500,
+		help='fail if the median time to joining all channels is above this many ms')
+	parser.add_argument('--top', type=int, default=15,
+		help='number of packages and modules to show import costs for')
+	args = parser.parse_args()
+
+	storage_dir = tempfile.mkdtemp()
+	try:
+		# warm up bytecode caches and the plugin manifest
+		run_bot(storage_dir, args.lazy)
+		results = [run_bot(storage_dir, args.lazy) for _ in range(args.number)]
+		_, _, importtime_output = run_bot(storage_dir, args.lazy, ['-X', 'importtime'])
+	finally:
+		shutil.rmtree(storage_dir)
+
+	nick_times = [result[0] * 1000 for result in results]
+	join_times = [result[1] * 1000 for result in results]
+	nick_median = statistics.median(nick_times)
+	join_median = statistics.median(join_times)
+
+	print('{} plugins, {} channels, lazy_plugins: {}, {} runs (median / max):'.format(
+		len(PLUGINS), len(CHANNELS), args.lazy, args.number))
+	print('  time to NICK:              {:7.1f} ms / {:7.1f} ms'.format(
+		nick_median, max(nick_times)))
+	print('  time to join all channels: {:7.1f} ms / {:7.1f} ms'.format(
+		join_median, max(join_times)))
+
+	imports = parse_importtime(importtime_output)
+	costs = import_cost_by_package(imports)
+	print('import time by package ({} modules, {:.1f} ms in total, with -X importtime):'.format(
+		len(imports), sum(costs.values()) / 1000))
+	for package, self_us in costs.most_common(args.top):
+		print('  {:7.1f} ms  {}'.format(self_us / 1000, package))
+
+	print('slowest modules by cumulative import time (self time in brackets):')
+	slowest = sorted(imports, key=lambda item: item[2], reverse=True)
+	for module, self_us, cumulative_us in slowest[:args.top]:
+		print('  {:7.1f} ms  ({:6.1f} ms)  {}'.format(
+			cumulative_us / 1000, self_us / 1000, module))
+
+	failures = []
+	if nick_median > args.max_nick:
+		failures.append('time to NICK {:.1f} ms is above {:.1f} ms'.format(
+			nick_median, args.max_nick))
+	if join_median > args.max_join:
+		failures.append('time to join {:.1f} ms is above {:.1f} ms'.format(
+			join_median, args.max_join))
+	if failures:
+		print('FAIL: ' + ', '.join(failures))
+		sys.exit(1)
+	print('OK')
+
+
+if __name__ == '__main__':
+	main()
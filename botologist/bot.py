@@ -2,16 +2,38 @@ import logging
 log = logging.getLogger(__name__)
 
 import datetime
+import signal
 import threading
 import importlib
+import os.path
 
+import botologist.cache
+import botologist.concurrency
 import botologist.error
 import botologist.http
+import botologist.lazy
+import botologist.metrics
 import botologist.protocol
 import botologist.plugin
+import botologist.profiling
 import botologist.util
 
 
+_metrics = botologist.metrics.registry
+command_latency = _metrics.histogram('botologist_command_seconds',
+	'Time spent handling commands', ['command'])
+reply_latency = _metrics.histogram('botologist_replier_seconds',
+	'Time spent in reply handlers', ['replier'])
+ticker_latency = _metrics.histogram('botologist_ticker_seconds',
+	'Time spent in tickers', ['ticker'])
+throttled = _metrics.counter('botologist_throttled_total',
+	'Commands and replies dropped by spam throttling', ['kind'])
+
+
+def get_callback_name(func):
+	return getattr(func, '__qualname__', None) or repr(func)
+
+
 class CommandMessage:
 	"""Representation of an IRC message that is a command.
 
@@ -60,12 +82,28 @@ class Bot:
 		self.global_plugins = config.get('global_plugins', [])
 		self.started = None
 
+		# the HTTP client imports requests, which plugins that make requests
+		# import anyway, but which shouldn't slow down startup otherwise
+		if any(key.startswith('http_client_') for key in config):
+			importlib.import_module('botologist.http_client').configure(config)
+
 		self.plugins = {}
+		self._shared_plugins = {}
+		self._lazy_plugins = []
+		self.plugin_manifest = None
+		if config.get('lazy_plugins'):
+			self.plugin_manifest = botologist.lazy.PluginManifest(
+				os.path.join(self.storage_dir, 'plugins.json'))
 		self._command_log = {}
 		self._last_command = None
 		self._reply_log = {}
 		self.timer = None
 
+		self.profiler = None
+		if config.get('profiling'):
+			self.profiler = botologist.profiling.Profiler(
+				cprofile_rate=config.get('profiling_cprofile_rate', 0.0))
+
 		self.http_port = config.get('http_port')
 		self.http_host = config.get('http_host')
 		self.http_server = None
@@ -74,6 +112,8 @@ class Bot:
 		self.error_handler = botologist.error.ErrorHandler(self)
 		self.client.error_handler = self.error_handler
 		self.client.on_connect.append(self._start)
+		if self.plugin_manifest:
+			self.client.on_connect.append(self._load_lazy_plugins)
 		self.client.on_disconnect.append(self._stop)
 		self.client.on_join.append(self._handle_join)
 		self.client.on_privmsg.append(self._handle_privmsg)
@@ -84,6 +124,11 @@ class Bot:
 			# convenience compatibility layer for when plugins module was moved
 			plugin_class = plugin_class.replace('botologist.plugin.', 'plugins.')
 
+			# the manifest may let us skip importing the plugin for now
+			if self.plugin_manifest:
+				self.register_plugin(name, plugin_class)
+				continue
+
 			# dynamically import the plugin module and pass the class
 			parts = plugin_class.split('.')
 			module = importlib.import_module('.'.join(parts[:-1]))
@@ -106,6 +151,11 @@ class Bot:
 					channel = {}
 				self.add_channel(name, **channel)
 
+		if self.plugin_manifest:
+			self.plugin_manifest.save()
+
+		botologist.cache.set_storage_dir(self.storage_dir)
+
 	@property
 	def nick(self):
 		return self.client.nick
@@ -126,10 +176,25 @@ class Bot:
 
 	def run_forever(self):
 		self.started = datetime.datetime.now()
+		if self.profiler and hasattr(signal, 'SIGUSR1'):
+			# the report is logged by the next tick, as logging from inside a
+			# signal handler can deadlock
+			def sigusr1_handler(signo, stack_frame): # pylint: disable=unused-argument
+				self.profiler.request_report()
+			signal.signal(signal.SIGUSR1, sigusr1_handler)
 		self.client.run_forever()
 
 	def register_plugin(self, name, plugin):
 		if isinstance(plugin, str):
+			class_path = plugin
+			if self.plugin_manifest:
+				lazy_class = self.plugin_manifest.get_lazy_class(class_path)
+				if lazy_class:
+					self.plugins[name] = lazy_class
+					self._shared_plugins.pop(name, None)
+					log.debug('plugin %r registered lazily', name)
+					return
+
 			parts = plugin.split('.')
 			try:
 				module = importlib.import_module('.'.join(parts[:-1]))
@@ -138,8 +203,12 @@ class Bot:
 				msg = 'Could not find plugin class: {}'.format(plugin)
 				raise Exception(msg) from exception
 
+			if self.plugin_manifest:
+				self.plugin_manifest.add(class_path, plugin)
+
 		assert issubclass(plugin, botologist.plugin.Plugin)
 		self.plugins[name] = plugin
+		self._shared_plugins.pop(name, None)
 		log.debug('plugin %r registered', name)
 
 	def add_channel(self, channel, plugins=None, admins=None, allow_colors=True):
@@ -173,7 +242,7 @@ class Bot:
 				plugin_class = guess_plugin_class(plugin)
 				self.register_plugin(plugin, plugin_class)
 			log.debug('adding plugin %s to channel %s', plugin, channel.channel)
-			channel.register_plugin(self.plugins[plugin](self, channel))
+			channel.register_plugin(self._get_plugin_instance(plugin, channel))
 
 		if admins:
 			assert isinstance(admins, list)
@@ -182,6 +251,26 @@ class Bot:
 		channel.allow_colors = allow_colors
 		self.client.add_channel(channel)
 
+	def _get_plugin_instance(self, name, channel):
+		plugin_class = self.plugins[name]
+		if not plugin_class.channel_agnostic:
+			plugin = plugin_class(self, channel)
+		elif name in self._shared_plugins:
+			return self._shared_plugins[name]
+		else:
+			plugin = self._shared_plugins[name] = plugin_class(self, None)
+		if isinstance(plugin, botologist.lazy.LazyPlugin):
+			self._lazy_plugins.append(plugin)
+		return plugin
+
+	def _load_lazy_plugins(self):
+		"""Import plugins that haven't been used yet in the background, so that
+		the first command doesn't have to wait for it."""
+		executor = botologist.concurrency.get_executor()
+		for plugin in self._lazy_plugins:
+			if plugin.plugin is None:
+				executor.submit(self._wrap_error_handler(plugin.load))
+
 	def _send_msg(self, msgs, targets):
 		if targets == '*':
 			targets = (channel for channel in self.client.channels)
@@ -298,23 +387,25 @@ class Bot:
 				threshold = self.SPAM_THROTTLE
 			if diff.seconds < threshold:
 				log.info('Command throttled: %s', message.command)
+				throttled.inc(kind='command')
 				return
 
 		# log the command call for spam throttling
 		self._last_command = (message.user.identifier, message.command, message.args)
 		self._command_log[message.command] = now
 
-		response = command_func(message)
+		with command_latency.time(command=get_callback_name(command_func)):
+			response = command_func(message)
 		if response:
 			self._send_msg(response, message.target)
 
 	def _call_repliers(self, channel, message):
-		now = datetime.datetime.now()
 		final_replies = []
 
 		# iterate through reply callbacks
 		for reply_func in channel.replies:
-			replies = reply_func(message)
+			with reply_latency.time(replier=get_callback_name(reply_func)):
+				replies = reply_func(message)
 
 			if not replies:
 				continue
@@ -324,24 +415,41 @@ class Bot:
 			else:
 				final_replies.append(replies)
 
-		if not message.user.is_admin:
-			for reply in final_replies:
-				# throttle spam - prevents the same reply from being sent
-				# more than once in a row within the throttle threshold
-				if channel.channel not in self._reply_log:
-					self._reply_log[channel.channel] = {}
+		return self._throttle_replies(message, final_replies)
 
-				if reply in self._reply_log[channel.channel]:
-					diff = now - self._reply_log[channel.channel][reply]
-					if diff.seconds < self.SPAM_THROTTLE:
-						log.info('Reply throttled: "%s"', reply)
-						final_replies.remove(reply)
+	def _throttle_replies(self, message, replies):
+		if message.user.is_admin:
+			return replies
 
-				# log the reply for spam throttling
-				self._reply_log[channel.channel][reply] = now
+		now = datetime.datetime.now()
+		reply_log = self._reply_log.setdefault(message.target, {})
+		final_replies = []
+		for reply in replies:
+			# throttle spam - prevents the same reply from being sent
+			# more than once in a row within the throttle threshold
+			if reply in reply_log:
+				diff = now - reply_log[reply]
+				if diff.seconds < self.SPAM_THROTTLE:
+					log.info('Reply throttled: "%s"', reply)
+					throttled.inc(kind='reply')
+					continue
+			final_replies.append(reply)
+
+			# log the reply for spam throttling
+			reply_log[reply] = now
 
 		return final_replies
 
+	def send_reply(self, message, replies):
+		"""Send replies to a message that a replier came up with after it had
+		returned, for example from a background thread. The replies are spam
+		throttled just like the ones repliers return."""
+		if not isinstance(replies, list):
+			replies = [replies]
+		replies = self._throttle_replies(message, replies)
+		if replies:
+			self._send_msg(replies, message.target)
+
 	def _start(self):
 		if self.http_port and not self.http_server:
 			log.info('Running HTTP server on %s:%s', self.http_host, self.http_port)
@@ -365,6 +473,8 @@ class Bot:
 		self.client.stop()
 
 	def _stop(self):
+		botologist.cache.save_all()
+
 		if self.http_server:
 			log.info('shutting down HTTP server')
 			self.http_server.shutdown()
@@ -381,18 +491,28 @@ class Bot:
 	def _tick(self):
 		log.debug('ticker running')
 
+		if self.profiler:
+			self.profiler.log_requested_report()
+
 		# reset the spam throttle to prevent the log dictionaries from becoming
 		# too large. TODO: replace with a queue
 		self._command_log = {}
 		for channel in self._reply_log:
 			self._reply_log[channel] = {}
 
+		botologist.cache.save_all()
+
 		try:
+			# tickers of plugins shared between channels are only run once, and
+			# the result is sent to every channel that has the plugin
+			results = {}
 			for channel in self.client.channels.values():
 				for ticker in channel.tickers:
-					result = ticker()
-					if result:
-						self._send_msg(result, channel.channel)
+					if ticker not in results:
+						with ticker_latency.time(ticker=get_callback_name(ticker)):
+							results[ticker] = ticker()
+					if results[ticker]:
+						self._send_msg(results[ticker], channel.channel)
 		finally:
 			self._start_tick_timer()
 
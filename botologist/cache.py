@@ -0,0 +1,212 @@
+import logging
+log = logging.getLogger(__name__)
+
+import collections
+import functools
+import json
+import os
+import os.path
+import threading
+import time
+
+import botologist.metrics
+
+
+_metrics = botologist.metrics.registry
+cache_hits = _metrics.counter('botologist_cache_hits_total',
+	'Cache lookups that returned a cached value', ['cache'])
+cache_misses = _metrics.counter('botologist_cache_misses_total',
+	'Cache lookups that did not find a cached value', ['cache'])
+
+MISSING = object()
+
+
+def _to_key(value):
+	"""Turn JSON-decoded lists back into hashable tuples."""
+	if isinstance(value, list):
+		return tuple(_to_key(item) for item in value)
+	return value
+
+
+def make_key(args, kwargs):
+	def freeze(value):
+		if isinstance(value, dict):
+			return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+		if isinstance(value, (list, tuple)):
+			return tuple(freeze(item) for item in value)
+		return value
+	key = freeze(args)
+	if kwargs:
+		key += (freeze(kwargs),)
+	return key
+
+
+class TTLCache:
+	"""Size-bounded cache where entries expire after a number of seconds.
+
+	When the cache is full, the least recently used entry is evicted. Hits and
+	misses are counted, both on the object itself and in the metrics registry
+	under the cache's name.
+	"""
+	def __init__(self, maxsize=128, ttl=300, name=None):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self.name = name or 'cache'
+		self.hits = 0
+		self.misses = 0
+		self._data = collections.OrderedDict()
+		self._lock = threading.Lock()
+
+	@property
+	def hit_rate(self):
+		total = self.hits + self.misses
+		return self.hits / total if total else 0.0
+
+	def get(self, key, default=None):
+		with self._lock:
+			item = self._data.get(key)
+			if item is not None and item[1] < time.time():
+				del self._data[key]
+				item = None
+			if item is None:
+				self.misses += 1
+				cache_misses.inc(cache=self.name)
+				return default
+			self._data.move_to_end(key)
+			self.hits += 1
+			cache_hits.inc(cache=self.name)
+			return item[0]
+
+	def set(self, key, value, ttl=None):
+		if ttl is None:
+			ttl = self.ttl
+		with self._lock:
+			self._data.pop(key, None)
+			self._data[key] = (value, time.time() + ttl)
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+
+	def delete(self, key):
+		with self._lock:
+			self._data.pop(key, None)
+
+	def clear(self):
+		with self._lock:
+			self._data.clear()
+
+	def __contains__(self, key):
+		with self._lock:
+			item = self._data.get(key)
+			return item is not None and item[1] >= time.time()
+
+	def __len__(self):
+		return len(self._data)
+
+	def load(self, path):
+		if not os.path.isfile(path):
+			return
+		try:
+			with open(path, 'r') as f:
+				items = json.loads(f.read())
+		except ValueError:
+			log.warning('could not read cache file %s', path, exc_info=True)
+			return
+
+		now = time.time()
+		with self._lock:
+			for key, value, expires in items:
+				if expires >= now:
+					self._data[_to_key(key)] = (value, expires)
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+		log.debug('loaded %d entries into cache %s', len(self._data), self.name)
+
+	def save(self, path):
+		now = time.time()
+		with self._lock:
+			items = [[key, value, expires]
+				for key, (value, expires) in self._data.items()
+				if expires >= now]
+		try:
+			content = json.dumps(items)
+		except TypeError:
+			log.warning('cache %s contains values that cannot be saved', self.name,
+				exc_info=True)
+			return
+		tmp_path = path + '.tmp'
+		with open(tmp_path, 'w') as f:
+			f.write(content)
+		os.replace(tmp_path, path)
+
+
+_persistent_caches = {}
+_storage_dir = None
+
+
+def _get_cache_path(name):
+	return os.path.join(_storage_dir, 'cache_{}.json'.format(name))
+
+
+def register_persistent(cache):
+	"""Have a cache's contents saved to and loaded from the storage dir."""
+	_persistent_caches[cache.name] = cache
+	if _storage_dir:
+		cache.load(_get_cache_path(cache.name))
+
+
+def set_storage_dir(storage_dir):
+	"""Set the directory persistent caches are stored in, and load any
+	previously saved cache contents from it."""
+	global _storage_dir # pylint: disable=global-statement
+	_storage_dir = storage_dir
+	for name, cache in _persistent_caches.items():
+		cache.load(_get_cache_path(name))
+
+
+def save_all():
+	if not _storage_dir or not os.path.isdir(_storage_dir):
+		return
+	for name, cache in _persistent_caches.items():
+		cache.save(_get_cache_path(name))
+
+
+def cached(ttl=300, maxsize=128, negative_ttl=None, is_negative=None,
+		key=None, name=None, persist=False):
+	"""Decorator that caches a function's return values.
+
+	Results are cached for `ttl` seconds, keyed by the function's arguments,
+	or by whatever `key` returns when called with them. Results considered
+	negative by `is_negative` (by default None) are cached for `negative_ttl`
+	seconds instead, or not at all if it is not set. Exceptions are never
+	cached. With `persist`, the cache is saved to the bot's storage dir and
+	survives restarts, in which case the results must be JSON serializable.
+
+	The TTLCache instance is available as the `cache` attribute of the
+	decorated function.
+	"""
+	if is_negative is None:
+		is_negative = lambda value: value is None
+
+	def decorator(func):
+		cache = TTLCache(maxsize=maxsize, ttl=ttl,
+			name=name or func.__module__ + '.' + func.__qualname__)
+		if persist:
+			register_persistent(cache)
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			cache_key = key(*args, **kwargs) if key else make_key(args, kwargs)
+			value = cache.get(cache_key, MISSING)
+			if value is not MISSING:
+				return value
+
+			value = func(*args, **kwargs)
+			if not is_negative(value):
+				cache.set(cache_key, value)
+			elif negative_ttl:
+				cache.set(cache_key, value, ttl=negative_ttl)
+			return value
+
+		wrapper.cache = cache
+		return wrapper
+	return decorator
@@ -0,0 +1,119 @@
+import logging
+log = logging.getLogger(__name__)
+
+import concurrent.futures
+import functools
+import threading
+
+import botologist.cache
+
+
+class _Call:
+	def __init__(self):
+		self.event = threading.Event()
+		self.result = None
+		self.exception = None
+
+
+class SingleFlight:
+	"""Makes concurrent calls with the same key share a single execution.
+
+	The first caller for a key runs the function. Anyone calling with the
+	same key while that is in progress waits for it to finish, and gets the
+	same result, or the same exception raised.
+	"""
+	def __init__(self):
+		self._calls = {}
+		self._lock = threading.Lock()
+
+	def do(self, key, func, *args, **kwargs):
+		with self._lock:
+			call = self._calls.get(key)
+			is_leader = call is None
+			if is_leader:
+				call = self._calls[key] = _Call()
+
+		if not is_leader:
+			log.debug('waiting for in-flight call with key %r', key)
+			call.event.wait()
+			if call.exception is not None:
+				raise call.exception
+			return call.result
+
+		try:
+			call.result = func(*args, **kwargs)
+		except Exception as exception:
+			call.exception = exception
+			raise
+		finally:
+			with self._lock:
+				del self._calls[key]
+			call.event.set()
+
+		return call.result
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+	"""Get the thread pool shared by the whole bot for running lookups."""
+	global _executor # pylint: disable=global-statement
+	with _executor_lock:
+		if _executor is None:
+			_executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+		return _executor
+
+
+def map_concurrently(func, items, timeout=None):
+	"""Call func for every item in parallel, returning a list of results in
+	the same order as the items.
+
+	If `timeout` is given, results that are not ready within that many
+	seconds of the call are dropped and replaced by None, so one slow lookup
+	doesn't hold up the rest. Calls that raise an exception are logged and
+	also result in None.
+	"""
+	items = list(items)
+	if not items:
+		return []
+	if len(items) == 1 and timeout is None:
+		return [func(items[0])]
+
+	executor = get_executor()
+	futures = [executor.submit(func, item) for item in items]
+	done, not_done = concurrent.futures.wait(futures, timeout=timeout)
+	if not_done:
+		log.info('%d of %d calls to %s did not finish within %s seconds',
+			len(not_done), len(futures), getattr(func, '__name__', func), timeout)
+
+	results = []
+	for item, future in zip(items, futures):
+		if future not in done:
+			future.cancel()
+			results.append(None)
+		elif future.exception() is not None:
+			log.warning('%s raised an exception for %r',
+				getattr(func, '__name__', func), item, exc_info=future.exception())
+			results.append(None)
+		else:
+			results.append(future.result())
+	return results
+
+
+def single_flight(key=None):
+	"""Decorator that makes concurrent calls to a function with the same
+	arguments (or the same `key`, if given) share a single execution."""
+	def decorator(func):
+		flight = SingleFlight()
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			call_key = key(*args, **kwargs) if key else \
+				botologist.cache.make_key(args, kwargs)
+			return flight.do(call_key, func, *args, **kwargs)
+
+		wrapper.flight = flight
+		return wrapper
+	return decorator
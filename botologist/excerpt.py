@@ -0,0 +1,137 @@
+import logging
+log = logging.getLogger(__name__)
+
+import collections
+import heapq
+import re
+
+
+ELLIPSIS = '[...]'
+WHITESPACE = ' \n\r\t'
+
+_non_space_pattern = re.compile(r'\S')
+
+
+def _iter_hits(text, term):
+	start = text.find(term)
+	while start != -1:
+		yield start, start + len(term), term
+		start = text.find(term, start + 1)
+
+
+def _find_hits(text, terms):
+	"""Iterate over every occurrence of any of the terms in the text, as
+	(start, end, term) tuples in the order they appear. The text must already
+	be lowercase. Also returns the number of terms that were found at all."""
+	# searching for plain substrings is much faster than a case insensitive
+	# regex, and terms that aren't in the text can be dropped right away
+	terms = {term.lower() for term in terms if term}
+	terms = [term for term in terms if term in text]
+	return heapq.merge(*[_iter_hits(text, term) for term in terms]), len(terms)
+
+
+def _find_best_window(hits, num_terms, length):
+	"""Find the stretch of text no longer than `length` that contains the most
+	distinct terms. Returns the start and end of the hits in it. Hits that
+	are longer than `length` on their own never fit and are skipped.
+
+	The first stretch with every term in it is used, so in most cases only the
+	beginning of the text has to be looked at. If there is no such stretch,
+	the one with the most hits among those with the most terms is used.
+	"""
+	best = None
+	best_score = (0, 0)
+	counts = {}
+	window = collections.deque()
+	for hit in hits:
+		_, end, term = hit
+		window.append(hit)
+		counts[term] = counts.get(term, 0) + 1
+		while window and end - window[0][0] > length:
+			left_term = window.popleft()[2]
+			counts[left_term] -= 1
+			if not counts[left_term]:
+				del counts[left_term]
+		if len(counts) == num_terms:
+			# drop repeated terms on the left, so that the hits are as close
+			# together as possible and end up in the middle of the excerpt
+			while counts[window[0][2]] > 1:
+				counts[window.popleft()[2]] -= 1
+			return (window[0][0], end)
+		score = (len(counts), len(window))
+		if score > best_score:
+			best_score = score
+			best = (window[0][0], end)
+	return best
+
+
+def _find_space(text, start, end, reverse=False):
+	"""Find the first (or last) whitespace character in text[start:end]."""
+	if reverse:
+		return max(text.rfind(char, start, end) for char in WHITESPACE)
+	found = [pos for pos in (text.find(char, start, end) for char in WHITESPACE)
+		if pos != -1]
+	return min(found) if found else -1
+
+
+def _flatten(text):
+	return ' '.join(text.split())
+
+
+def make_excerpt(text, terms=None, length=300, threshold=None):
+	"""Cut a text down to an excerpt suitable for a single IRC message.
+
+	All whitespace, including newlines, is collapsed into single spaces. Texts
+	no longer than `threshold` (by default the same as `length`) are returned
+	in full. Longer texts are cut down to at most `length` characters at word
+	boundaries, around the part of the text with the most search terms in
+	it, and marked with [...] where something was left out. The markers count
+	towards `length`.
+	"""
+	if threshold is None:
+		threshold = length
+	if len(text) <= threshold:
+		return _flatten(text)
+
+	# the excerpt is found in the original text, and only the excerpt itself
+	# has its whitespace collapsed, which saves splitting up all of the text
+	# leave room for a marker on both sides, and give that room to the text
+	# on the sides where it turns out not to be needed
+	marker_length = len(ELLIPSIS) + 1
+	size = max(1, length - 2 * marker_length)
+
+	window = None
+	if terms:
+		hits, num_terms = _find_hits(text.lower(), terms)
+		window = _find_best_window(hits, num_terms, size)
+
+	if window:
+		first, last = window
+		# center the hits in the excerpt
+		start = first - (size - (last - first)) // 2
+		start = max(0, min(start, len(text) - size))
+	else:
+		first, last = 0, 0
+		start = 0
+	end = start + size
+	if start == 0:
+		end = min(len(text), end + marker_length)
+	if end == len(text):
+		start = max(0, start - marker_length)
+
+	# don't cut words in half, unless they're too long to fit
+	if start > 0 and not text[start - 1].isspace():
+		space = _find_space(text, start, first)
+		if space != -1:
+			start = space + 1
+	if end < len(text) and not text[end].isspace():
+		space = _find_space(text, max(start, last), end, reverse=True)
+		if space != -1:
+			end = space
+
+	excerpt = _flatten(text[start:end])
+	if _non_space_pattern.search(text, 0, start):
+		excerpt = ELLIPSIS + ' ' + excerpt
+	if _non_space_pattern.search(text, end):
+		excerpt = excerpt + ' ' + ELLIPSIS
+	return excerpt
@@ -1,15 +1,98 @@
 import logging
 log = logging.getLogger(__name__)
 
+import collections
 import http.server
+import json
+import os
+import os.path
+import threading
+import time
+
+import botologist.bot
+import botologist.metrics
+
+
+handler_latency = botologist.metrics.registry.histogram(
+	'botologist_http_handler_seconds', 'Time spent in HTTP request handlers',
+	['method', 'handler'])
+
+
+class DeliveryLog:
+	"""Keeps track of webhook deliveries that have already been handled.
+
+	Webhook providers like Github will redeliver a payload when they think the
+	previous attempt failed, and deliveries can also be retried manually. Each
+	delivery carries a unique ID, which is remembered here for `ttl` seconds so
+	that duplicates can be dropped. If `path` is given, the seen IDs are also
+	written to disk so that they survive a restart.
+	"""
+	def __init__(self, ttl=3600, path=None):
+		self.ttl = ttl
+		self.path = path
+		self._seen = collections.OrderedDict()
+		self._lock = threading.Lock()
+		if self.path:
+			self._read()
+
+	def __contains__(self, delivery_id):
+		with self._lock:
+			self._expire()
+			return delivery_id in self._seen
+
+	def __len__(self):
+		with self._lock:
+			self._expire()
+			return len(self._seen)
+
+	def add(self, delivery_id):
+		with self._lock:
+			self._expire()
+			self._seen.pop(delivery_id, None)
+			self._seen[delivery_id] = time.time()
+			if self.path:
+				self._write()
+
+	def _expire(self):
+		threshold = time.time() - self.ttl
+		while self._seen:
+			delivery_id, seen_at = next(iter(self._seen.items()))
+			if seen_at > threshold:
+				break
+			del self._seen[delivery_id]
+
+	def _read(self):
+		if not os.path.isfile(self.path):
+			return
+		try:
+			with open(self.path, 'r') as f:
+				data = json.loads(f.read())
+		except ValueError:
+			log.warning('could not read delivery log %s', self.path, exc_info=True)
+			return
+		for delivery_id, seen_at in sorted(data.items(), key=lambda i: i[1]):
+			self._seen[delivery_id] = seen_at
+		self._expire()
+
+	def _write(self):
+		tmp_path = self.path + '.tmp'
+		with open(tmp_path, 'w') as f:
+			f.write(json.dumps(self._seen))
+		os.replace(tmp_path, self.path)
 
 
 class RequestHandler(http.server.BaseHTTPRequestHandler):
+	READ_CHUNK_SIZE = 64 * 1024
+
 	@property
 	def bot(self):
 		return self.server.bot
 
 	def do_GET(self):
+		if self.server.metrics_path and self.path == self.server.metrics_path:
+			self.send_metrics()
+			return
+
 		try:
 			self.trigger_handlers('GET')
 			self.send_200()
@@ -21,11 +104,36 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
 		content_length = self.headers['Content-Length']
 		if not content_length:
 			log.warning('POST request with no Content-Length received')
-			self.send_response(400)
-			self.wfile.write(b'Content-Length header missing\n')
+			self.send_400(b'Content-Length header missing\n')
+			return
+		try:
+			length = int(content_length)
+		except ValueError:
+			length = -1
+		if length < 0:
+			log.warning('POST request with invalid Content-Length received: %r',
+				content_length)
+			self.send_400(b'Invalid Content-Length header\n')
+			return
+
+		max_length = self.server.get_max_body_size(self.path)
+		if length > max_length:
+			log.warning('POST request to %s too large: %d bytes, limit is %d',
+				self.path, length, max_length)
+			self.send_413()
+			return
+
+		body = self.read_body(length)
+		if body is None:
+			log.warning('POST request body shorter than Content-Length')
+			self.send_400(b'Incomplete request body\n')
+			return
+
+		delivery_id = self.get_delivery_id()
+		if delivery_id and delivery_id in self.server.delivery_log:
+			log.info('Dropping duplicate delivery: %s', delivery_id)
+			self.send_200()
 			return
-		length = int(self.headers['Content-Length'])
-		body = self.rfile.read(length).decode()
 
 		try:
 			self.trigger_handlers('POST', body)
@@ -34,12 +142,59 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
 			self.send_500()
 			raise
 
+		# only remember the delivery once it has been handled successfully, so
+		# that a retry of a delivery that failed still goes through
+		if delivery_id:
+			self.server.delivery_log.add(delivery_id)
+
+	def read_body(self, length):
+		"""Read the request body into a buffer allocated up front.
+
+		Returns a bytearray, which handlers can pass on to things like hmac
+		and json without any further copying, or None if the client sent less
+		data than it said it would.
+		"""
+		body = bytearray(length)
+		view = memoryview(body)
+		pos = 0
+		while pos < length:
+			read = self.rfile.readinto(view[pos:pos + self.READ_CHUNK_SIZE])
+			if not read:
+				return None
+			pos += read
+		return body
+
+	def get_delivery_id(self):
+		if not self.server.delivery_header:
+			return None
+		return self.headers.get(self.server.delivery_header)
+
 	def send_500(self):
 		self.send_response(500)
 		self.send_header('Content-type', 'text/plain')
 		self.end_headers()
 		self.wfile.write(b'An internal error occured.\n')
 
+	def send_400(self, message):
+		self.send_response(400)
+		self.send_header('Content-type', 'text/plain')
+		self.end_headers()
+		self.wfile.write(message)
+
+	def send_413(self):
+		self.send_response(413)
+		self.send_header('Content-type', 'text/plain')
+		self.end_headers()
+		self.wfile.write(b'Request body too large.\n')
+
+	def send_metrics(self):
+		body = botologist.metrics.registry.render().encode('utf-8')
+		self.send_response(200)
+		self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
 	def send_200(self):
 		self.send_response(200)
 		self.send_header('Content-type', 'text/plain')
@@ -52,29 +207,61 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
 			'headers': self.headers,
 		}
 
+		# handlers of plugins shared between channels are only called once,
+		# and the result is sent to every channel that has the plugin
+		results = {}
 		for channel in self.bot.channels.values():
 			for handler in channel.http_handlers:
 				if handler._http_method == method:
-					ret = None
+					if handler not in results:
+						results[handler] = self.call_handler(handler, method, kwargs)
+					if results[handler]:
+						self.bot._send_msg(results[handler], channel.channel)
 
-					if not handler._http_path:
-						ret = handler(path=self.path, **kwargs)
-					else:
-						if handler._http_path == self.path:
-							ret = handler(**kwargs)
-
-					if ret:
-						self.bot._send_msg(ret, channel.channel)
+	def call_handler(self, handler, method, kwargs):
+		# label by handler rather than by the requested path, which is up to
+		# the client and would create a new set of labels for every URL
+		name = botologist.bot.get_callback_name(handler)
+		if not handler._http_path:
+			with handler_latency.time(method=method, handler=name):
+				return handler(path=self.path, **kwargs)
+		elif handler._http_path == self.path:
+			with handler_latency.time(method=method, handler=name):
+				return handler(**kwargs)
+		return None
 
 	def log_message(self, string, *args):
 		log.info(string, *args)
 
 
 class HTTPServer(http.server.HTTPServer):
+	delivery_header = None
+	delivery_log = None
+	max_body_size = 1024 * 1024
+	body_size_limits = {}
+	metrics_path = '/metrics'
+
 	def set_bot(self, bot):
 		self.bot = bot
 		bot.http_server = self
 
+		self.delivery_header = bot.config.get('http_delivery_header',
+			'X-GitHub-Delivery')
+		delivery_log_path = None
+		if bot.config.get('http_delivery_persist'):
+			delivery_log_path = os.path.join(bot.storage_dir, 'http_deliveries.json')
+		self.delivery_log = DeliveryLog(
+			ttl=bot.config.get('http_delivery_ttl', 3600),
+			path=delivery_log_path,
+		)
+
+		self.max_body_size = bot.config.get('http_max_body_size', self.max_body_size)
+		self.body_size_limits = bot.config.get('http_body_size_limits', {})
+		self.metrics_path = bot.config.get('http_metrics_path', self.metrics_path)
+
+	def get_max_body_size(self, path):
+		return self.body_size_limits.get(path, self.max_body_size)
+
 	def handle_error(self, request, client_address):
 		msg = 'Exception while handling HTTP request from {}'.format(client_address)
 		self.bot.error_handler.handle_error(msg)
@@ -0,0 +1,114 @@
+import logging
+log = logging.getLogger(__name__)
+
+import threading
+import urllib.parse
+
+import requests
+import requests.adapters
+import requests.exceptions
+from requests.packages.urllib3.util.retry import Retry # pylint: disable=import-error
+
+import botologist.metrics
+
+
+_metrics = botologist.metrics.registry
+request_latency = _metrics.histogram('botologist_http_client_seconds',
+	'Time until response headers were received for outgoing HTTP requests',
+	['host'])
+request_errors = _metrics.counter('botologist_http_client_errors_total',
+	'Outgoing HTTP requests that failed without a response', ['host'])
+
+
+def _get_host(url):
+	return urllib.parse.urlsplit(url).hostname or 'unknown'
+
+
+class Session(requests.Session):
+	"""Requests session with connection pooling, default timeouts, retries
+	and per-host latency metrics.
+
+	Plugins should not use this directly, but make their requests through the
+	module's get and head functions, which share one session for the whole
+	bot so connections to the same host are kept alive and reused.
+
+	Most plugins make their requests from repliers and commands, which run on
+	the IRC read loop, so the timeouts are short and failed requests are not
+	retried by default.
+	"""
+
+	def __init__(self, timeout=(3.05, 5), retries=0, backoff_factor=0.3,
+			pool_connections=10, pool_maxsize=4):
+		super().__init__()
+		self.timeout = timeout
+
+		retry = Retry(
+			total=retries,
+			backoff_factor=backoff_factor,
+			status_forcelist=(500, 502, 503, 504),
+			raise_on_status=False,
+		)
+		# pool_block makes pool_maxsize a hard limit on the number of
+		# concurrent connections to a single host
+		adapter = requests.adapters.HTTPAdapter(
+			pool_connections=pool_connections,
+			pool_maxsize=pool_maxsize,
+			pool_block=True,
+			max_retries=retry,
+		)
+		self.mount('http://', adapter)
+		self.mount('https://', adapter)
+
+	def request(self, method, url, *args, **kwargs): # pylint: disable=arguments-differ
+		kwargs.setdefault('timeout', self.timeout)
+		host = _get_host(url)
+		try:
+			response = super().request(method, url, *args, **kwargs)
+		except requests.exceptions.RequestException:
+			request_errors.inc(host=host)
+			raise
+		request_latency.observe(response.elapsed.total_seconds(), host=host)
+		return response
+
+
+_settings = {}
+_session = None
+_lock = threading.Lock()
+
+
+def configure(config):
+	"""Configure the shared session from the bot config. Any existing session
+	is closed, and a new one is created on the next request."""
+	global _session # pylint: disable=global-statement
+	settings = {}
+	if 'http_client_timeout' in config:
+		timeout = config['http_client_timeout']
+		settings['timeout'] = tuple(timeout) if isinstance(timeout, list) else timeout
+	if 'http_client_retries' in config:
+		settings['retries'] = config['http_client_retries']
+	if 'http_client_pool_size' in config:
+		settings['pool_maxsize'] = config['http_client_pool_size']
+
+	with _lock:
+		_settings.clear()
+		_settings.update(settings)
+		if _session:
+			_session.close()
+			_session = None
+
+
+def get_session():
+	global _session # pylint: disable=global-statement
+	with _lock:
+		if _session is None:
+			log.debug('creating HTTP client session with settings: %r', _settings)
+			_session = Session(**_settings)
+		return _session
+
+
+def get(url, params=None, **kwargs):
+	return get_session().get(url, params=params, **kwargs)
+
+
+def head(url, **kwargs):
+	return get_session().head(url, **kwargs)
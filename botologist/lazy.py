@@ -0,0 +1,215 @@
+import logging
+log = logging.getLogger(__name__)
+
+import importlib
+import importlib.util
+import json
+import os
+import os.path
+import threading
+
+
+CALLBACK_TYPES = ('joins', 'kicks', 'replies', 'tickers', 'http_handlers')
+
+
+def import_class(class_path):
+	parts = class_path.split('.')
+	module = importlib.import_module('.'.join(parts[:-1]))
+	return getattr(module, parts[-1])
+
+
+def get_module_mtime(class_path):
+	"""Get the modification time of the file a plugin class lives in, without
+	importing the module itself."""
+	module_name = class_path.rsplit('.', 1)[0]
+	try:
+		spec = importlib.util.find_spec(module_name)
+	except (ImportError, ValueError):
+		return None
+	if spec is None or not spec.origin or not os.path.exists(spec.origin):
+		return None
+	return os.path.getmtime(spec.origin)
+
+
+def get_plugin_metadata(plugin_class):
+	"""Describe a plugin class's callbacks in a way that can be stored as JSON,
+	so that its commands and replies can be registered without importing it."""
+	# pylint: disable=protected-access
+	metadata = {
+		'channel_agnostic': plugin_class.channel_agnostic,
+		'commands': dict(plugin_class._commands),
+		'joins': list(plugin_class._joins),
+		'kicks': list(plugin_class._kicks),
+		'replies': list(plugin_class._replies),
+		'tickers': list(plugin_class._tickers),
+		'http_handlers': list(plugin_class._http_handlers),
+		'functions': {},
+	}
+	# pylint: enable=protected-access
+
+	names = set(metadata['commands'].values())
+	for callback_type in CALLBACK_TYPES:
+		names.update(metadata[callback_type])
+	for name in names:
+		func = getattr(plugin_class, name)
+		metadata['functions'][name] = {
+			'doc': func.__doc__,
+			'threaded': getattr(func, '_is_threaded', False),
+			'http_method': getattr(func, '_http_method', None),
+			'http_path': getattr(func, '_http_path', None),
+		}
+	return metadata
+
+
+class PluginManifest:
+	"""Cached metadata of plugin classes from a previous run, stored as JSON.
+
+	Entries are ignored when the file the plugin class lives in has been
+	modified since they were written. Plugins may be loaded from several
+	threads at once, so changes are made under a lock.
+	"""
+	def __init__(self, path):
+		self.path = path
+		self.plugins = {}
+		self.changed = False
+		self._lock = threading.Lock()
+		self.load()
+
+	def load(self):
+		if not self.path or not os.path.exists(self.path):
+			return
+		try:
+			with open(self.path) as f:
+				self.plugins = json.load(f)
+		except (OSError, ValueError):
+			log.warning('Could not read plugin manifest %s', self.path, exc_info=True)
+
+	def save(self):
+		with self._lock:
+			if not self.path or not self.changed:
+				return
+			tmp_path = self.path + '.tmp'
+			try:
+				with open(tmp_path, 'w') as f:
+					json.dump(self.plugins, f, indent=2, sort_keys=True)
+				os.replace(tmp_path, self.path)
+				self.changed = False
+			except OSError:
+				log.warning('Could not write plugin manifest %s', self.path, exc_info=True)
+
+	def get(self, class_path):
+		entry = self.plugins.get(class_path)
+		if entry is None:
+			return None
+		mtime = get_module_mtime(class_path)
+		if mtime is None or entry.get('mtime') != mtime:
+			log.debug('plugin manifest entry for %s is out of date', class_path)
+			return None
+		return entry['metadata']
+
+	def add(self, class_path, plugin_class):
+		"""Add or update a plugin class's entry, returning its metadata."""
+		metadata = get_plugin_metadata(plugin_class)
+		entry = {'mtime': get_module_mtime(class_path), 'metadata': metadata}
+		with self._lock:
+			if self.plugins.get(class_path) != entry:
+				self.plugins[class_path] = entry
+				self.changed = True
+		return metadata
+
+	def get_lazy_class(self, class_path):
+		metadata = self.get(class_path)
+		if metadata is None:
+			return None
+		return LazyPluginClass(class_path, metadata, self)
+
+
+class LazyPluginClass:
+	"""Stands in for a plugin class that hasn't been imported yet.
+
+	Calling it creates a LazyPlugin, just like calling a plugin class creates
+	a plugin instance.
+	"""
+	def __init__(self, class_path, metadata, manifest=None):
+		self.class_path = class_path
+		self.metadata = metadata
+		self.manifest = manifest
+		self.channel_agnostic = metadata['channel_agnostic']
+		self.__name__ = class_path.rsplit('.', 1)[-1]
+		self._plugin_class = None
+		self._lock = threading.Lock()
+
+	def __call__(self, bot, channel):
+		return LazyPlugin(self, bot, channel)
+
+	def load(self):
+		with self._lock:
+			if self._plugin_class is None:
+				log.info('importing plugin %s', self.class_path)
+				plugin_class = import_class(self.class_path)
+				if self.manifest is not None:
+					metadata = self.manifest.add(self.class_path, plugin_class)
+					if metadata != self.metadata:
+						log.warning('plugin %s has changed since the manifest was '
+							'written, restart the bot to pick up the changes',
+							self.class_path)
+					self.manifest.save()
+				self._plugin_class = plugin_class
+		return self._plugin_class
+
+
+class LazyCallback:
+	"""A plugin callback that instantiates the real plugin on first call."""
+	def __init__(self, plugin, name, info):
+		self.plugin = plugin
+		self.name = name
+		self.__qualname__ = plugin.class_name + '.' + name
+		self.__doc__ = info['doc']
+		self._is_threaded = info['threaded']
+		self._http_method = info['http_method']
+		self._http_path = info['http_path']
+
+	def __call__(self, *args, **kwargs):
+		return self.plugin.get_callback(self.name)(*args, **kwargs)
+
+	def __repr__(self):
+		return '<LazyCallback {}>'.format(self.__qualname__)
+
+
+class LazyPlugin:
+	"""Stands in for a plugin instance until one of its callbacks is called,
+	or until load() is called, at which point the plugin's module is imported
+	and the plugin is instantiated."""
+	def __init__(self, plugin_class, bot, channel):
+		self.plugin_class = plugin_class
+		self.class_name = plugin_class.__name__
+		self.bot = bot
+		self.channel = channel
+		self.plugin = None
+		self._callbacks = None
+		self._lock = threading.Lock()
+
+		metadata = plugin_class.metadata
+		functions = metadata['functions']
+		self.commands = {}
+		for command, name in metadata['commands'].items():
+			self.commands[command] = LazyCallback(self, name, functions[name])
+		for callback_type in CALLBACK_TYPES:
+			setattr(self, callback_type, [LazyCallback(self, name, functions[name])
+				for name in metadata[callback_type]])
+
+	def load(self):
+		with self._lock:
+			if self.plugin is None:
+				plugin = self.plugin_class.load()(self.bot, self.channel)
+				self._callbacks = {}
+				for name in self.plugin_class.metadata['functions']:
+					self._callbacks[name] = plugin._get_callback(self.bot, name) # pylint: disable=protected-access
+				self.plugin = plugin
+		return self.plugin
+
+	def get_callback(self, name):
+		if self.plugin is None:
+			self.load()
+		return self._callbacks[name]
+
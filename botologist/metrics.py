@@ -0,0 +1,218 @@
+import logging
+log = logging.getLogger(__name__)
+
+import bisect
+import threading
+import time
+
+
+def _escape(value):
+	return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+	pairs = list(zip(labelnames, labelvalues))
+	if extra:
+		pairs.append(extra)
+	if not pairs:
+		return ''
+	return '{' + ','.join('{}="{}"'.format(k, _escape(v)) for k, v in pairs) + '}'
+
+
+def _format_value(value):
+	if value == float('inf'):
+		return '+Inf'
+	if isinstance(value, float) and value.is_integer():
+		return str(int(value))
+	return str(value)
+
+
+class Metric:
+	"""Base class for metrics.
+
+	A metric has a name, a help text and optionally a list of label names.
+	Values are stored per combination of label values, which are passed as
+	keyword arguments when updating the metric.
+	"""
+	type = None
+
+	def __init__(self, name, help_text, labelnames=()):
+		self.name = name
+		self.help_text = help_text
+		self.labelnames = tuple(labelnames)
+		self._values = {}
+		self._lock = threading.Lock()
+
+	def _key(self, labels):
+		if set(labels) != set(self.labelnames):
+			raise ValueError('metric {} expects labels {!r}, got {!r}'.format(
+				self.name, self.labelnames, tuple(labels)))
+		return tuple(labels[name] for name in self.labelnames)
+
+	def get(self, **labels):
+		return self._values.get(self._key(labels))
+
+	def samples(self):
+		"""Yield (suffix, labelvalues, extra label, value) tuples."""
+		with self._lock:
+			items = list(self._values.items())
+		for labelvalues, value in items:
+			yield '', labelvalues, None, value
+
+	def render(self):
+		lines = [
+			'# HELP {} {}'.format(self.name, self.help_text),
+			'# TYPE {} {}'.format(self.name, self.type),
+		]
+		for suffix, labelvalues, extra, value in self.samples():
+			lines.append('{}{}{} {}'.format(
+				self.name, suffix,
+				_format_labels(self.labelnames, labelvalues, extra),
+				_format_value(value),
+			))
+		return '\n'.join(lines)
+
+
+class Counter(Metric):
+	type = 'counter'
+
+	def inc(self, amount=1, **labels):
+		key = self._key(labels)
+		with self._lock:
+			self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+	type = 'gauge'
+
+	def __init__(self, name, help_text, labelnames=()):
+		super().__init__(name, help_text, labelnames)
+		self._function = None
+
+	def set(self, value, **labels):
+		key = self._key(labels)
+		with self._lock:
+			self._values[key] = value
+
+	def inc(self, amount=1, **labels):
+		key = self._key(labels)
+		with self._lock:
+			self._values[key] = self._values.get(key, 0) + amount
+
+	def dec(self, amount=1, **labels):
+		self.inc(-amount, **labels)
+
+	def set_function(self, function):
+		"""Have the gauge's value be computed by calling a function whenever
+		metrics are collected. Only works for gauges without labels."""
+		assert not self.labelnames
+		self._function = function
+
+	def samples(self):
+		if self._function:
+			yield '', (), None, self._function()
+		else:
+			yield from super().samples()
+
+
+class Histogram(Metric):
+	type = 'histogram'
+	DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+	def __init__(self, name, help_text, labelnames=(), buckets=None):
+		super().__init__(name, help_text, labelnames)
+		self.buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+
+	def observe(self, value, **labels):
+		key = self._key(labels)
+		with self._lock:
+			if key not in self._values:
+				self._values[key] = {
+					'buckets': [0] * len(self.buckets),
+					'sum': 0,
+					'count': 0,
+				}
+			data = self._values[key]
+			index = bisect.bisect_left(self.buckets, value)
+			if index < len(self.buckets):
+				data['buckets'][index] += 1
+			data['sum'] += value
+			data['count'] += 1
+
+	def time(self, **labels):
+		"""Context manager that observes the time spent inside it."""
+		return _Timer(self, labels)
+
+	def samples(self):
+		with self._lock:
+			items = [(k, dict(v, buckets=list(v['buckets'])))
+				for k, v in self._values.items()]
+		for labelvalues, data in items:
+			cumulative = 0
+			for bound, count in zip(self.buckets, data['buckets']):
+				cumulative += count
+				yield '_bucket', labelvalues, ('le', _format_value(float(bound))), cumulative
+			yield '_bucket', labelvalues, ('le', '+Inf'), data['count']
+			yield '_sum', labelvalues, None, data['sum']
+			yield '_count', labelvalues, None, data['count']
+
+
+class _Timer:
+	def __init__(self, histogram, labels):
+		self.histogram = histogram
+		self.labels = labels
+		self.start = None
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc_info):
+		self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+	"""Collection of metrics, which can be rendered in the Prometheus text
+	exposition format.
+
+	Metrics are created through the counter, gauge and histogram methods. If
+	a metric with the same name already exists it is returned instead, so
+	modules and plugins can safely declare their metrics at import time.
+	"""
+	def __init__(self):
+		self.metrics = {}
+		self._lock = threading.Lock()
+
+	def _get_or_create(self, cls, name, *args, **kwargs):
+		with self._lock:
+			if name in self.metrics:
+				metric = self.metrics[name]
+				if not isinstance(metric, cls):
+					raise ValueError('metric {} already registered as a {}'.format(
+						name, metric.type))
+				return metric
+			metric = cls(name, *args, **kwargs)
+			self.metrics[name] = metric
+			return metric
+
+	def counter(self, name, help_text, labelnames=()):
+		return self._get_or_create(Counter, name, help_text, labelnames)
+
+	def gauge(self, name, help_text, labelnames=()):
+		return self._get_or_create(Gauge, name, help_text, labelnames)
+
+	def histogram(self, name, help_text, labelnames=(), buckets=None):
+		return self._get_or_create(Histogram, name, help_text, labelnames,
+			buckets=buckets)
+
+	def render(self):
+		with self._lock:
+			metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+		return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+# the bot-wide registry, which is what the /metrics HTTP route exposes
+registry = Registry()
+
+threads = registry.gauge('botologist_threads', 'Number of running threads')
+threads.set_function(threading.active_count)
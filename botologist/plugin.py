@@ -117,38 +117,51 @@ class PluginMetaclass(type):
 
 class Plugin(metaclass=PluginMetaclass):
 	"""Base plugin class."""
+
+	# plugins that don't keep any per-channel state can set this to True, in
+	# which case a single instance is shared by all channels. the instance's
+	# channel will be None, so the channel has to be found from the message.
+	channel_agnostic = False
+
 	def __init__(self, bot, channel):
-		assert isinstance(channel, botologist.protocol.Channel)
+		assert isinstance(channel, botologist.protocol.Channel) or \
+			(channel is None and self.channel_agnostic)
 		assert isinstance(bot, botologist.bot.Bot)
 
 		# pylint: disable=no-member
 		self.commands = {}
 		for command, callback in self._commands.items():
-			self.commands[command] = getattr(self, callback)
+			self.commands[command] = self._get_callback(bot, callback)
 
 		self.joins = []
 		for join in self._joins:
-			self.joins.append(getattr(self, join))
+			self.joins.append(self._get_callback(bot, join))
 
 		self.kicks = []
 		for kick in self._kicks:
-			self.kicks.append(getattr(self, kick))
+			self.kicks.append(self._get_callback(bot, kick))
 
 		self.replies = []
 		for reply in self._replies:
-			self.replies.append(getattr(self, reply))
+			self.replies.append(self._get_callback(bot, reply))
 
 		self.tickers = []
 		for ticker in self._tickers:
-			self.tickers.append(getattr(self, ticker))
+			self.tickers.append(self._get_callback(bot, ticker))
 
 		self.http_handlers = []
 		for http_handler in self._http_handlers:
-			self.http_handlers.append(getattr(self, http_handler))
+			self.http_handlers.append(self._get_callback(bot, http_handler))
 		# pylint: enable=no-member
 
 		log.debug('Instantiating plugin %s for channel %s',
-			self.__class__.__name__, channel.channel)
+			self.__class__.__name__, channel.channel if channel else '(all)')
 
 		self.bot = bot
 		self.channel = channel
+
+	def _get_callback(self, bot, name):
+		callback = getattr(self, name)
+		if bot.profiler:
+			callback = bot.profiler.wrap(self.__class__.__name__, callback)
+		return callback
@@ -0,0 +1,140 @@
+import logging
+log = logging.getLogger(__name__)
+
+import cProfile
+import functools
+import io
+import pstats
+import random
+import threading
+import time
+
+
+class CallStats:
+	def __init__(self):
+		self.calls = 0
+		self.total = 0.0
+		self.max = 0.0
+
+	@property
+	def average(self):
+		return self.total / self.calls if self.calls else 0.0
+
+	def add(self, duration):
+		self.calls += 1
+		self.total += duration
+		if duration > self.max:
+			self.max = duration
+
+
+class Profiler:
+	"""Times plugin callbacks, aggregated per plugin and method.
+
+	Callbacks are wrapped by `wrap` when a plugin is instantiated. If
+	`cprofile_rate` is higher than 0, that fraction of calls are also run
+	under cProfile, and the results are merged so that the slowest functions
+	can be found as well as the slowest callbacks. Only one call is run under
+	cProfile at a time, as only one profiler can be active per process.
+	"""
+	def __init__(self, cprofile_rate=0.0):
+		self.cprofile_rate = cprofile_rate
+		self.stats = {}
+		self.started = time.time()
+		self._pstats = None
+		self._lock = threading.Lock()
+		self._sampling = threading.Lock()
+		self.report_requested = False
+
+	def wrap(self, plugin_name, func):
+		key = (plugin_name, func.__name__)
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			profile = None
+			if self.cprofile_rate and random.random() < self.cprofile_rate \
+					and self._sampling.acquire(blocking=False):
+				profile = cProfile.Profile()
+				try:
+					profile.enable()
+				except ValueError:
+					# some other profiler is already active
+					self._sampling.release()
+					profile = None
+
+			start = time.perf_counter()
+			try:
+				return func(*args, **kwargs)
+			finally:
+				duration = time.perf_counter() - start
+				if profile:
+					profile.disable()
+					self._sampling.release()
+				self._add(key, duration, profile)
+
+		return wrapper
+
+	def _add(self, key, duration, profile=None):
+		with self._lock:
+			if key not in self.stats:
+				self.stats[key] = CallStats()
+			self.stats[key].add(duration)
+
+			if profile:
+				if self._pstats is None:
+					self._pstats = pstats.Stats(profile)
+				else:
+					self._pstats.add(profile)
+
+	def reset(self):
+		with self._lock:
+			self.stats = {}
+			self._pstats = None
+			self.started = time.time()
+
+	def get_slowest(self, limit=None):
+		"""Get a list of ((plugin, method), CallStats) tuples, sorted by the
+		total time spent in each callback."""
+		with self._lock:
+			items = list(self.stats.items())
+		items.sort(key=lambda item: item[1].total, reverse=True)
+		return items[:limit] if limit else items
+
+	def format_summary(self, limit=5):
+		items = self.get_slowest(limit)
+		if not items:
+			return 'No profiling data collected yet.'
+		return ' - '.join(
+			'{}.{}: {:.1f}ms total, {} calls, {:.1f}ms max'.format(
+				plugin, method, stats.total * 1000, stats.calls, stats.max * 1000)
+			for (plugin, method), stats in items
+		)
+
+	def format_report(self, cprofile_limit=20):
+		lines = ['Profiling report for the last {:.0f} seconds'.format(
+			time.time() - self.started)]
+		for (plugin, method), stats in self.get_slowest():
+			lines.append('{}.{}: calls={} total={:.2f}ms avg={:.2f}ms max={:.2f}ms'.format(
+				plugin, method, stats.calls, stats.total * 1000,
+				stats.average * 1000, stats.max * 1000))
+
+		with self._lock:
+			if self._pstats is not None:
+				stream = io.StringIO()
+				self._pstats.stream = stream
+				self._pstats.sort_stats('cumulative').print_stats(cprofile_limit)
+				lines.append(stream.getvalue().strip())
+
+		return '\n'.join(lines)
+
+	def log_report(self):
+		log.info(self.format_report())
+
+	def request_report(self):
+		"""Ask for a report to be logged later. Safe to call from a signal
+		handler, unlike log_report."""
+		self.report_requested = True
+
+	def log_requested_report(self):
+		if self.report_requested:
+			self.report_requested = False
+			self.log_report()
@@ -1,6 +1,7 @@
 import logging
 log = logging.getLogger(__name__)
 
+import botologist.lazy
 import botologist.plugin
 
 
@@ -58,8 +59,11 @@ class Channel:
 		return self.name
 
 	def register_plugin(self, plugin):
-		assert isinstance(plugin, botologist.plugin.Plugin)
-		self.plugins.append(plugin.__class__.__name__)
+		if isinstance(plugin, botologist.lazy.LazyPlugin):
+			self.plugins.append(plugin.class_name)
+		else:
+			assert isinstance(plugin, botologist.plugin.Plugin)
+			self.plugins.append(plugin.__class__.__name__)
 		for cmd, callback in plugin.commands.items():
 			self.commands[cmd] = callback
 		for join_callback in plugin.joins:
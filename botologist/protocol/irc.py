@@ -6,10 +6,20 @@ import socket
 import ssl
 import threading
 
+import botologist.metrics
 import botologist.util
 import botologist.protocol
 
 
+_metrics = botologist.metrics.registry
+lines_received = _metrics.counter('botologist_irc_lines_received_total',
+	'Lines received from the IRC server')
+lines_sent = _metrics.counter('botologist_irc_lines_sent_total',
+	'Lines sent to the IRC server')
+reconnects = _metrics.counter('botologist_irc_reconnects_total',
+	'Number of times the bot has reconnected to the IRC server')
+
+
 def get_client(config):
 	nick = config.get('nick', 'botologist')
 
@@ -120,6 +130,7 @@ class Client(botologist.protocol.Client):
 		self.irc_socket = None
 
 	def reconnect(self, time=None):
+		reconnects.inc()
 		if self.irc_socket:
 			self.disconnect()
 
@@ -179,6 +190,7 @@ class Client(botologist.protocol.Client):
 					continue
 
 				log.debug('[recv] %r', msg)
+				lines_received.inc()
 
 				if self.quitting and msg.startswith('ERROR :'):
 					log.info('received an IRC ERROR, but quitting, so exiting loop')
@@ -311,6 +323,7 @@ class Client(botologist.protocol.Client):
 
 		log.debug('[send] %s', repr(msg))
 		self.irc_socket.send(msg + '\r\n')
+		lines_sent.inc()
 
 	def stop(self, reason='Leaving'):
 		super().stop()
@@ -0,0 +1,342 @@
+import logging
+log = logging.getLogger(__name__)
+
+import array
+import datetime
+import json
+import os
+import os.path
+import re
+import threading
+import xml.etree.ElementTree as ElementTree
+import requests.exceptions
+
+import botologist.concurrency
+import botologist.http_client
+import botologist.plugin
+from plugins.conversion import units
+
+
+def format_number(number):
+	if not isinstance(number, int):
+		number = float(number)
+		if number % 1 == 0.0:
+			number = int(number)
+
+	if isinstance(number, int):
+		f_number = '{:,}'.format(number)
+	elif abs(number) < 0.01:
+		f_number = '{:.3g}'.format(number)
+	else:
+		f_number = '{:,.2f}'.format(float(number))
+
+	if len(f_number) > 12:
+		f_number = '{:.2}'.format(number)
+
+	return f_number
+
+
+def get_duckduckgo_data(url, query_params):
+	return botologist.http_client.get(url, query_params).json()
+
+
+def get_conversion_result(*args):
+	query = ' '.join([str(arg) for arg in args])
+	query_params = {'q': query.lower(), 'format': 'json', 'no_html': 1}
+
+	try:
+		data = get_duckduckgo_data('https://api.duckduckgo.com', query_params)
+	except requests.exceptions.RequestException:
+		log.warning('DuckDuckGo request failed', exc_info=True)
+		return False
+
+	if data['AnswerType'] == 'conversions' and data['Answer']:
+		return data['Answer']
+
+
+def get_currency_data():
+	url = 'http://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml'
+	currency_data = {}
+	try:
+		response = botologist.http_client.get(url, stream=True)
+		response.raise_for_status()
+		response.raw.decode_content = True
+		# the rates are attributes of <Cube currency="USD" rate="1.1"/>
+		# elements, which can be read as soon as their start tag is parsed
+		for _, elem in ElementTree.iterparse(response.raw, events=('start',)):
+			if elem.tag.endswith('Cube') and 'currency' in elem.attrib:
+				currency_data[elem.attrib['currency'].upper()] = float(elem.attrib['rate'])
+	except requests.exceptions.RequestException:
+		log.warning('ECB exchange data request failed', exc_info=True)
+		return {}
+	except (ElementTree.ParseError, ValueError):
+		log.warning('ECB exchange data could not be parsed', exc_info=True)
+		return {}
+	log.info('Found %d currencies', len(currency_data))
+
+	return currency_data
+
+
+class RateTable:
+	"""Exchange rates between every pair of currencies.
+
+	The table is built once from the EUR-based rates the ECB publishes. Rates
+	are stored in a flat array of doubles, where the row for a currency
+	holds the rate from that currency into every other currency, so
+	converting into any number of currencies is a single row lookup.
+	"""
+	def __init__(self, eur_rates):
+		codes = ['EUR'] + sorted(code for code in eur_rates if code != 'EUR')
+		rates = [1.0] + [float(eur_rates[code]) for code in codes[1:]]
+		self.index = {code: idx for idx, code in enumerate(codes)}
+		self.size = len(codes)
+		self.matrix = array.array('d', (
+			to_rate / from_rate
+			for from_rate in rates
+			for to_rate in rates
+		))
+
+	def __contains__(self, currency):
+		return currency in self.index
+
+	def row(self, currency):
+		start = self.index[currency] * self.size
+		return self.matrix[start:start + self.size]
+
+	def get_rate(self, from_cur, to_cur):
+		return self.matrix[self.index[from_cur] * self.size + self.index[to_cur]]
+
+	def convert(self, amount, from_cur, to_curs):
+		if from_cur not in self.index:
+			return [None] * len(to_curs)
+		row = self.row(from_cur)
+		return [amount * row[self.index[to_cur]] if to_cur in self.index else None
+			for to_cur in to_curs]
+
+	def convert_batch(self, amounts, from_cur, to_cur):
+		if from_cur not in self.index or to_cur not in self.index:
+			return [None] * len(amounts)
+		rate = self.get_rate(from_cur, to_cur)
+		return [amount * rate for amount in amounts]
+
+
+class Currency:
+	aliases = {'NIS': 'ILS', 'EURO': 'EUR'}
+
+	# how old rates can get before they are refreshed, and how long to wait
+	# before trying again if a refresh fails, in seconds
+	max_age = 3600
+	retry_interval = 300
+
+	def __init__(self, storage_path=None):
+		# where the last successfully fetched rates are stored
+		self.storage_path = storage_path
+		self.last_fetch = None
+		self.last_attempt = None
+		self.currency_data = None
+		self._refresh_lock = threading.Lock()
+		self._table = None
+		self._table_source = None
+
+	def currencies(self):
+		self.load()
+		return (self.currency_data or {}).keys()
+
+	def normalize(self, currency):
+		currency = currency.upper()
+		return self.aliases.get(currency, currency)
+
+	def get_table(self):
+		self.load()
+		if self.currency_data is None:
+			# nothing to convert with until the first fetch has finished
+			return RateTable({})
+		# rebuild the table whenever the rates have been replaced
+		if self._table is None or self._table_source is not self.currency_data:
+			self._table = RateTable(self.currency_data)
+			self._table_source = self.currency_data
+		return self._table
+
+	def convert(self, amount, from_cur, to_cur):
+		return self.convert_many(amount, from_cur, [to_cur])[0]
+
+	def convert_many(self, amount, from_cur, to_curs):
+		"""Convert an amount from one currency into several others. Returns a
+		list with a result for each currency in to_curs, which is None for
+		unknown currencies."""
+		try:
+			amount = float(amount)
+		except ValueError:
+			return [None] * len(to_curs)
+
+		from_cur = self.normalize(from_cur)
+		to_curs = [self.normalize(to_cur) for to_cur in to_curs]
+		results = self.get_table().convert(amount, from_cur, to_curs)
+		# converting a currency into itself is not interesting
+		return [None if to_cur == from_cur else result
+			for to_cur, result in zip(to_curs, results)]
+
+	def convert_batch(self, amounts, from_cur, to_cur):
+		"""Convert several amounts from one currency into another."""
+		from_cur = self.normalize(from_cur)
+		to_cur = self.normalize(to_cur)
+		return self.get_table().convert_batch(amounts, from_cur, to_cur)
+
+	def load(self):
+		"""Read stored rates if there are none in memory yet, and fetch fresh
+		ones in the background if they are missing or too old.
+
+		Rates that are too old are still used while fresh ones are fetched.
+		Without any rates at all, currencies can't be converted until the
+		first fetch has finished.
+		"""
+		if self.currency_data is None:
+			self.read()
+		if self.needs_refresh():
+			botologist.concurrency.get_executor().submit(self.refresh)
+
+	def needs_refresh(self):
+		now = datetime.datetime.now()
+		if self.last_attempt and (now - self.last_attempt).total_seconds() < self.retry_interval:
+			return False
+		return not self.last_fetch or (now - self.last_fetch).total_seconds() > self.max_age
+
+	def refresh(self):
+		# if a refresh is already running, there's no need for another one
+		if not self._refresh_lock.acquire(blocking=False):
+			return
+		try:
+			self.last_attempt = datetime.datetime.now()
+			currency_data = get_currency_data()
+			if not currency_data:
+				log.warning('No currency data fetched, keeping the old rates')
+				return
+			self.currency_data = currency_data
+			self.last_fetch = datetime.datetime.now()
+			self.write()
+		finally:
+			self._refresh_lock.release()
+
+	def read(self):
+		if not self.storage_path or not os.path.isfile(self.storage_path):
+			return
+		try:
+			with open(self.storage_path, 'r') as f:
+				data = json.loads(f.read())
+			currency_data = data['rates']
+			last_fetch = datetime.datetime.fromtimestamp(data['fetched'])
+		except (ValueError, KeyError, TypeError):
+			log.warning('Could not read stored currency rates', exc_info=True)
+			return
+		self.currency_data = currency_data
+		self.last_fetch = last_fetch
+		log.info('Read %d stored currency rates', len(self.currency_data))
+
+	def write(self):
+		if not self.storage_path or not os.path.isdir(os.path.dirname(self.storage_path)):
+			return
+		content = json.dumps({
+			'fetched': self.last_fetch.timestamp(),
+			'rates': self.currency_data,
+		})
+		tmp_path = self.storage_path + '.tmp'
+		with open(tmp_path, 'w') as f:
+			f.write(content)
+		os.replace(tmp_path, self.storage_path)
+
+
+_digit_pattern = re.compile(r'\d')
+
+
+def might_be_conversion(message):
+	"""Quickly rule out messages that can't be conversions, which is almost
+	all of them, before the more expensive ConversionPlugin.pattern is run."""
+	if not _digit_pattern.search(message):
+		return False
+	message = message.lower()
+	return ' in ' in message or ' to ' in message or ' into ' in message
+
+
+class ConversionPlugin(botologist.plugin.Plugin):
+	channel_agnostic = True
+
+	# the parts of the pattern are written so that there is only ever one way
+	# for them to match, which keeps the regex engine from backtracking: digit
+	# groups in the amount must be separated by a single space, a k or m
+	# suffix must be followed by a space, and units can't contain spaces. an
+	# amount can't start in the middle of a number, and the unit after it
+	# can't start with a character the amount could also end with.
+	amount_pattern = r'(?<![\d,.])(?<![\d,.] )((?:\d[\d,.]*(?: \d[\d,.]*)*|\.\d+)(?:[km](?= ))?)'
+	from_unit_pattern = r'((?:(?:square|cubic) )?[a-z/°][a-z./°]*)'
+	to_unit_pattern = r'((?:(?:square|cubic) )?[a-z/°][a-z.,/°]*)'
+	pattern = re.compile(amount_pattern + r' ?' + from_unit_pattern + \
+		r' (into|in|to) ' + to_unit_pattern, re.I)
+
+	def __init__(self, bot, channel):
+		super().__init__(bot, channel)
+		self.currency = Currency(os.path.join(bot.storage_dir, 'currency_rates.json'))
+		# get the first fetch of rates going before anyone asks for them. a
+		# lazily loaded plugin may be created after the bot has connected
+		if self.bot.started:
+			self.currency.load()
+		else:
+			self.bot.client.on_connect.append(self.currency.load)
+
+	@botologist.plugin.ticker()
+	def refresh_currencies(self):
+		if self.currency.needs_refresh():
+			self.currency.refresh()
+
+	@botologist.plugin.reply()
+	def convert(self, msg):
+		if not might_be_conversion(msg.message):
+			return
+		match = self.pattern.search(msg.message)
+		if not match:
+			return
+
+		conv_from = match.group(2)
+		conv_to = match.group(4)
+		if conv_from == conv_to:
+			return
+
+		amount = match.group(1).lower().replace(' ', '').replace(',', '')
+
+		try:
+			if amount.endswith('k'):
+				real_amount = float(amount[:-1]) * 1000
+			elif amount.endswith('m'):
+				real_amount = float(amount[:-1]) * 1000000
+			else:
+				real_amount = float(amount)
+		except ValueError:
+			return
+
+		if real_amount % 1 == 0.0:
+			real_amount = int(real_amount)
+
+		conv_tos = conv_to.split(',')
+		results = self.currency.convert_many(real_amount, conv_from, conv_tos)
+		if all(result is None for result in results):
+			results = [units.convert(real_amount, conv_from, to) for to in conv_tos]
+			# floating point errors make 100 c into f come out as 211.99999...
+			results = [round(result, 10) if result is not None else None
+				for result in results]
+		retvals = ['{} {}'.format(format_number(result), to)
+			for to, result in zip(conv_tos, results) if result is not None]
+		if retvals:
+			format_amount = format_number(real_amount)
+			return '{} {} = {}'.format(format_amount, conv_from,
+				', '.join(retvals))
+
+		# only ask DuckDuckGo about units we don't know. the request is done in
+		# the background so that the bot doesn't stop responding while waiting
+		if not units.find_unit(conv_from) or not all(units.find_unit(to) for to in conv_tos):
+			botologist.concurrency.get_executor().submit(
+				self.bot._wrap_error_handler(self.convert_remotely),
+				msg, real_amount, conv_from, match.group(3), conv_to)
+
+	def convert_remotely(self, msg, *args):
+		result = get_conversion_result(*args)
+		if result:
+			self.bot.send_reply(msg, result)
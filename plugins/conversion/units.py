@@ -0,0 +1,198 @@
+import logging
+log = logging.getLogger(__name__)
+
+
+class Unit:
+	"""A unit of measurement.
+
+	Values are converted into the dimension's base unit (metres, kilograms,
+	cubic metres, kelvin...) by adding `offset` and then multiplying by
+	`factor`. Only temperatures need an offset.
+	"""
+	def __init__(self, name, dimension, factor, offset=0.0):
+		self.name = name
+		self.dimension = dimension
+		self.factor = factor
+		self.offset = offset
+
+	def to_base(self, value):
+		return (value + self.offset) * self.factor
+
+	def from_base(self, value):
+		return value / self.factor - self.offset
+
+	def __repr__(self):
+		return '<Unit {} ({})>'.format(self.name, self.dimension)
+
+
+# metric prefixes that are used for most units, and the ones that make sense
+# for data sizes. the order matters when looking up units case insensitively:
+# "MG" should be milligrams rather than megagrams.
+PREFIXES = (
+	('kilo', 'k', 1e3),
+	('centi', 'c', 1e-2),
+	('milli', 'm', 1e-3),
+	('micro', 'µ', 1e-6),
+	('micro', 'u', 1e-6),
+	('nano', 'n', 1e-9),
+	('deci', 'd', 1e-1),
+	('hecto', 'h', 1e2),
+	('mega', 'M', 1e6),
+	('giga', 'G', 1e9),
+	('tera', 'T', 1e12),
+)
+DATA_PREFIXES = (
+	('kilo', 'k', 1e3),
+	('kilo', 'K', 1e3),
+	('mega', 'M', 1e6),
+	('giga', 'G', 1e9),
+	('tera', 'T', 1e12),
+	('peta', 'P', 1e15),
+	('kibi', 'Ki', 2 ** 10),
+	('mebi', 'Mi', 2 ** 20),
+	('gibi', 'Gi', 2 ** 30),
+	('tebi', 'Ti', 2 ** 40),
+	('pebi', 'Pi', 2 ** 50),
+)
+
+# (dimension, factor, names, symbols, prefixes). names are matched case
+# insensitively and may be pluralized, symbols are matched case sensitively
+# first. prefixes are combined with both the names and the symbols.
+UNIT_DEFINITIONS = (
+	# length, in metres
+	('length', 1.0, ('metre', 'meter'), ('m',), PREFIXES),
+	('length', 0.0254, ('inch', 'inches'), ('in', '"'), None),
+	('length', 0.3048, ('foot', 'feet'), ('ft', "'"), None),
+	('length', 0.9144, ('yard',), ('yd',), None),
+	('length', 1609.344, ('mile',), ('mi',), None),
+	('length', 1852.0, ('nautical-mile',), ('nmi',), None),
+
+	# mass, in kilograms
+	('mass', 1e-3, ('gram', 'gramme'), ('g',), PREFIXES),
+	('mass', 1000.0, ('tonne', 'ton'), ('t',), None),
+	('mass', 0.45359237, ('pound',), ('lb', 'lbs'), None),
+	('mass', 0.028349523125, ('ounce',), ('oz',), None),
+	('mass', 6.35029318, ('stone',), ('st',), None),
+
+	# volume, in cubic metres
+	('volume', 1e-3, ('litre', 'liter'), ('l', 'L'), PREFIXES),
+	('volume', 3.785411784e-3, ('gallon',), ('gal',), None),
+	('volume', 9.46352946e-4, ('quart',), ('qt',), None),
+	('volume', 4.73176473e-4, ('pint',), ('pt',), None),
+	('volume', 2.365882365e-4, ('cup',), (), None),
+	('volume', 2.95735295625e-5, ('fluid-ounce',), ('fl.oz', 'floz', 'fl.oz.'), None),
+	('volume', 1.478676478125e-5, ('tablespoon',), ('tbsp',), None),
+	('volume', 4.92892159375e-6, ('teaspoon',), ('tsp',), None),
+
+	# area, in square metres
+	('area', 4046.8564224, ('acre',), ('ac',), None),
+	('area', 1e4, ('hectare',), ('ha',), None),
+
+	# speed, in metres per second
+	('speed', 1.0, ('metre-per-second',), ('m/s', 'mps'), None),
+	('speed', 1 / 3.6, ('kilometre-per-hour',), ('km/h', 'kph', 'kmh', 'kmph'), None),
+	('speed', 0.44704, ('mile-per-hour',), ('mph',), None),
+	('speed', 1852 / 3600, ('knot',), ('kn', 'kt'), None),
+
+	# data, in bytes
+	('data', 1.0, ('byte',), ('B',), DATA_PREFIXES),
+	('data', 0.125, ('bit',), ('bit',), DATA_PREFIXES),
+)
+
+TEMPERATURES = (
+	(('celsius', 'centigrade'), ('c', '°c'), 1.0, 273.15),
+	(('fahrenheit',), ('f', '°f'), 5 / 9, 459.67),
+	(('kelvin',), ('°k',), 1.0, 0.0),
+)
+
+
+def _build_tables():
+	symbols = {}
+	names = {}
+
+	def add(table, key, unit):
+		# the first definition of a key wins, so that for example "mb" means
+		# megabyte rather than megabit
+		if key not in table:
+			table[key] = unit
+
+	for dimension, factor, unit_names, unit_symbols, prefixes in UNIT_DEFINITIONS:
+		unit = Unit(unit_names[0], dimension, factor)
+		for symbol in unit_symbols:
+			add(symbols, symbol, unit)
+		for name in unit_names:
+			add(names, name, unit)
+
+		for prefix_name, prefix_symbol, multiplier in prefixes or ():
+			prefixed = Unit(prefix_name + unit_names[0], dimension, factor * multiplier)
+			for symbol in unit_symbols:
+				add(symbols, prefix_symbol + symbol, prefixed)
+			for name in unit_names:
+				add(names, prefix_name + name, prefixed)
+
+	for unit_names, unit_symbols, factor, offset in TEMPERATURES:
+		unit = Unit(unit_names[0], 'temperature', factor, offset)
+		for name in unit_names + ('degree-' + unit_names[0], 'degrees-' + unit_names[0]):
+			add(names, name, unit)
+		for symbol in unit_symbols:
+			add(symbols, symbol, unit)
+
+	# anything that isn't found case sensitively is looked up in lower case,
+	# where names take precedence over symbols
+	lower = {}
+	for name, unit in names.items():
+		add(lower, name.lower(), unit)
+	for symbol, unit in symbols.items():
+		add(lower, symbol.lower(), unit)
+
+	return symbols, lower
+
+
+_symbols, _lower = _build_tables()
+
+
+def _find_simple_unit(name):
+	if name in _symbols:
+		return _symbols[name]
+	name = name.lower().replace(' ', '-')
+	if name in _lower:
+		return _lower[name]
+	# plurals: metres, inches, feet is handled in the definitions
+	for suffix in ('s', 'es'):
+		if name.endswith(suffix) and name[:-len(suffix)] in _lower:
+			return _lower[name[:-len(suffix)]]
+	if name.endswith('.') and name[:-1] in _lower:
+		return _lower[name[:-1]]
+	return None
+
+
+def find_unit(name):
+	"""Find a unit from a string like "kg", "Kilometres" or "square feet".
+
+	Returns None if the unit is not known.
+	"""
+	name = name.strip()
+	lower = name.lower()
+	for word, power, dimension in (('square ', 2, 'area'), ('cubic ', 3, 'volume')):
+		if lower.startswith(word):
+			unit = _find_simple_unit(name[len(word):])
+			if not unit or unit.dimension != 'length':
+				return None
+			return Unit(word + unit.name, dimension, unit.factor ** power)
+	return _find_simple_unit(name)
+
+
+def convert(amount, from_unit, to_unit):
+	"""Convert an amount between two units, given as strings.
+
+	Returns None if either of the units is unknown, or if they measure
+	different things.
+	"""
+	from_unit = find_unit(from_unit)
+	to_unit = find_unit(to_unit)
+	if not from_unit or not to_unit:
+		return None
+	if from_unit.dimension != to_unit.dimension:
+		log.debug('cannot convert %r to %r', from_unit, to_unit)
+		return None
+	return to_unit.from_base(from_unit.to_base(amount))
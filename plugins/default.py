@@ -106,6 +106,22 @@ class DefaultPlugin(botologist.plugin.Plugin):
 			ret = '{}d '.format(diff.days) + ret
 		return ret
 
+	@botologist.plugin.command('profile')
+	def profile(self, msg):
+		'''Show the slowest plugin callbacks, if profiling is enabled. Admins only.
+
+		Examples: !profile - !profile log - !profile reset
+		'''
+		if not msg.user.is_admin or not self.bot.profiler:
+			return None
+		if msg.args and msg.args[0] == 'reset':
+			self.bot.profiler.reset()
+			return 'Profiling data reset.'
+		if msg.args and msg.args[0] == 'log':
+			self.bot.profiler.log_report()
+			return 'Profiling report written to the log.'
+		return self.bot.profiler.format_summary()
+
 	@botologist.plugin.command('downtime')
 	def downtime(self, msg):
 		'''Show the downtime of the bot.'''
@@ -1,9 +1,11 @@
 import logging
 log = logging.getLogger(__name__)
 
+import collections
 import hmac
 import hashlib
 import json
+import threading
 
 import botologist.plugin
 
@@ -14,10 +16,112 @@ def shorten_commit_url(url):
 	return '/'.join(parts)
 
 
+def get_event_key(event, data):
+	"""Get the repository and branch a Github event should be aggregated by."""
+	repository = data['repository']['full_name']
+	if event == 'push':
+		return repository, data['ref'].split('/')[-1]
+	if event == 'pull_request':
+		return repository, data['pull_request']['base']['ref']
+	return repository, None
+
+
+def format_digest(repository, branch, events):
+	"""Format a list of (event, data) tuples into a single line."""
+	parts = []
+
+	pushes = [data for event, data in events if event == 'push']
+	commits = [commit for data in pushes for commit in data['commits']]
+	if commits:
+		authors = []
+		for commit in commits:
+			if commit['author']['username'] not in authors:
+				authors.append(commit['author']['username'])
+		part = '{} new commit{} by {}'.format(len(commits),
+			's' if len(commits) > 1 else '', ', '.join(authors))
+		part += ' - {}/compare/{}...{}'.format(
+			pushes[-1]['repository']['html_url'],
+			pushes[0]['before'][:12], pushes[-1]['after'][:12])
+		parts.append(part)
+
+	actions = collections.OrderedDict()
+	for event, data in events:
+		if event == 'pull_request':
+			key = ('pull request', data['action'])
+			number = data['pull_request']['number']
+		elif event == 'issues':
+			key = ('issue', data['action'])
+			number = data['issue']['number']
+		else:
+			continue
+		numbers = actions.setdefault(key, [])
+		if '#{}'.format(number) not in numbers:
+			numbers.append('#{}'.format(number))
+	for (kind, action), numbers in actions.items():
+		if len(numbers) > 1:
+			kind += 's'
+		parts.append('{} {}: {}'.format(kind, action, ', '.join(numbers)))
+
+	prefix = '[{}]'.format(repository)
+	if branch:
+		prefix += ' {}:'.format(branch)
+	return prefix + ' ' + ' - '.join(parts)
+
+
+class EventBuffer:
+	"""Collects Github events for a short window before they're sent.
+
+	Events are grouped by repository and branch. When the window for a group
+	closes, `callback` is called with a list of lines: the regular output if
+	only one event was received, otherwise a single digest line.
+
+	`wrap` is applied to the function the timer thread runs, so that errors
+	can be passed on to the bot's error handler.
+	"""
+	def __init__(self, window, callback, wrap=None):
+		self.window = window
+		self.callback = callback
+		self.wrap = wrap
+		self._events = collections.OrderedDict()
+		self._lock = threading.Lock()
+
+	def add(self, event, data, lines):
+		key = get_event_key(event, data)
+		with self._lock:
+			if key not in self._events:
+				self._events[key] = []
+				flush = self.wrap(self.flush) if self.wrap else self.flush
+				timer = threading.Timer(self.window, flush, args=(key,))
+				timer.daemon = True
+				timer.start()
+			self._events[key].append((event, data, lines))
+
+	def flush(self, key):
+		with self._lock:
+			events = self._events.pop(key, None)
+		if not events:
+			return
+
+		if len(events) == 1:
+			lines = events[0][2]
+		else:
+			repository, branch = key
+			lines = format_digest(repository, branch,
+				[(event, data) for event, data, _ in events])
+			log.info('Aggregated %d Github events for %s', len(events), key)
+
+		self.callback(lines)
+
+
 class GithubPlugin(botologist.plugin.Plugin):
 	def __init__(self, bot, channel):
 		super().__init__(bot, channel)
 		self.secret = bot.config['github_secret'].encode('ascii')
+		self.events = None
+		aggregate_window = bot.config.get('github_aggregate_window')
+		if aggregate_window:
+			self.events = EventBuffer(aggregate_window, self.send_events,
+				wrap=bot._wrap_error_handler)
 
 	@botologist.plugin.http_handler(method='POST', path='/github')
 	def handle_github_hook(self, body, headers):
@@ -28,7 +132,7 @@ class GithubPlugin(botologist.plugin.Plugin):
 		signature = headers['X-Hub-Signature']
 		self.check_hmac(body, signature)
 
-		data = json.loads(body)
+		data = json.loads(body.decode('utf-8'))
 		ret = None
 
 		if event == 'issues':
@@ -38,11 +142,16 @@ class GithubPlugin(botologist.plugin.Plugin):
 		elif event == 'push':
 			ret = self.handle_push(data)
 
-		if ret:
+		if ret and self.events:
+			self.events.add(event, data, ret)
+		elif ret:
 			return ret
 
+	def send_events(self, lines):
+		self.bot._send_msg(lines, self.channel.channel)
+
 	def check_hmac(self, body, signature):
-		hmac_obj = hmac.new(self.secret, body.encode('utf-8'), hashlib.sha1)
+		hmac_obj = hmac.new(self.secret, body, hashlib.sha1)
 		calculated = 'sha1=' + hmac_obj.hexdigest()
 		if not hmac.compare_digest(calculated, signature):
 			log.warning('HMAC mismatch: %s %s', signature, calculated)
@@ -1,5 +1,5 @@
-import requests
-
+import botologist.excerpt
+import botologist.http_client
 import botologist.plugin
 
 
@@ -8,7 +8,7 @@ class PCDB:
 
 	@staticmethod
 	def search(search_for):
-		response = requests.get('https://porncomment.com',
+		response = botologist.http_client.get('https://porncomment.com',
 			{'search': search_for}, headers={'accept': 'application/json'})
 		comments = response.json()['comments']
 		if comments:
@@ -17,7 +17,7 @@ class PCDB:
 	@classmethod
 	def get_random(cls):
 		if not cls.comments:
-			response = requests.get('http://porncomment.com',
+			response = botologist.http_client.get('http://porncomment.com',
 				headers={'accept': 'application/json'})
 			cls.comments = response.json()['comments']
 		return cls.comments.pop()
@@ -26,6 +26,8 @@ class PCDB:
 class PcdbPlugin(botologist.plugin.Plugin):
 	"""porn comments database plugin."""
 
+	channel_agnostic = True
+
 	@botologist.plugin.command('pcdb', alias=['random', 'r'])
 	def get_pcdb_random(self, cmd):
 		include_url = False
@@ -41,10 +43,8 @@ class PcdbPlugin(botologist.plugin.Plugin):
 		if not comment:
 			return 'No results!'
 
-		retval = comment['body'].replace('\n', ' ').replace('\r', '')
-
-		if len(retval) > 400:
-			retval = retval[:394] + ' [...]'
+		retval = botologist.excerpt.make_excerpt(comment['body'], cmd.args,
+			length=400)
 
 		if include_url:
 			retval += ' - '+comment['source_url']
@@ -1,97 +1,285 @@
 import logging
 log = logging.getLogger(__name__)
 
+import collections
+import concurrent.futures
 import json
-import requests
+import os.path
+import random
+import re
+import sqlite3
+import threading
 import requests.exceptions
+import botologist.cache
+import botologist.concurrency
+import botologist.excerpt
+import botologist.http_client
 import botologist.plugin
 
 BASE_URL = 'https://qdb.lutro.me'
 
+# seconds to wait for QDB to answer a search before trying the local index
+SEARCH_TIMEOUT = 2
+
 
 def _get_quote_url(quote):
 	return BASE_URL + '/' + str(quote['id'])
 
 
 def _get_qdb_data(url, query_params):
-	response = requests.get(url, query_params, headers={'accept': 'application/json'})
+	response = botologist.http_client.get(url, query_params, headers={'accept': 'application/json'})
 	response.raise_for_status()
 	return response.json()
 
 
+class QuoteIndex:
+	"""Local full-text index of quotes, stored in an SQLite FTS5 table.
+
+	Only approved quotes are indexed. Quotes are added as the bot sees them,
+	whether from the /qdb-update webhook or from regular lookups, so the
+	index gradually fills up with the quotes people actually look for. As it
+	only ever holds some of the quotes, searches only use it when QDB itself
+	can't be reached, or doesn't answer within SEARCH_TIMEOUT seconds.
+	"""
+	def __init__(self, path):
+		self.path = path
+		self._lock = threading.Lock()
+		self._db = sqlite3.connect(path, check_same_thread=False)
+		self._db.execute('CREATE VIRTUAL TABLE IF NOT EXISTS quotes USING fts5(body)')
+		self._db.commit()
+
+	def add(self, quote):
+		self.add_many([quote])
+
+	def add_many(self, quotes):
+		"""Add or update quotes. Quotes that are no longer approved are
+		removed from the index."""
+		with self._lock:
+			for quote in quotes:
+				self._db.execute('DELETE FROM quotes WHERE rowid = ?', (quote['id'],))
+				if quote.get('approved', True):
+					self._db.execute('INSERT INTO quotes (rowid, body) VALUES (?, ?)',
+						(quote['id'], quote['body']))
+			self._db.commit()
+
+	def get(self, quote_id):
+		with self._lock:
+			row = self._db.execute('SELECT rowid, body FROM quotes WHERE rowid = ?',
+				(quote_id,)).fetchone()
+		return self._to_quote(row)
+
+	def search(self, search):
+		# every word has to be in the quote. quoting each of them keeps FTS
+		# query syntax like AND, OR and * from having any effect.
+		words = re.findall(r'\w+', search)
+		if not words:
+			return None
+		query = ' '.join('"{}"'.format(word) for word in words)
+		with self._lock:
+			row = self._db.execute('SELECT rowid, body FROM quotes '
+				'WHERE quotes MATCH ? ORDER BY random() LIMIT 1', (query,)).fetchone()
+		return self._to_quote(row)
+
+	def __len__(self):
+		with self._lock:
+			return self._db.execute('SELECT count(*) FROM quotes').fetchone()[0]
+
+	@staticmethod
+	def _to_quote(row):
+		if row is None:
+			return None
+		return {'id': row[0], 'body': row[1], 'approved': True}
+
+
+def open_index(path):
+	"""Open the local quote index, or return None if this SQLite build doesn't
+	support FTS5."""
+	try:
+		return QuoteIndex(path)
+	except sqlite3.OperationalError:
+		log.warning('Could not create the local quote index, SQLite probably '
+			'lacks FTS5 support', exc_info=True)
+		return None
+
+
+_index = None
+
+
+def _index_quotes(quotes):
+	if _index is not None:
+		_index.add_many(quotes)
+
+
+def _fetch_quotes(url, query_params=None):
+	data = _get_qdb_data(url, query_params=query_params)
+	quotes = data['quotes']
+	if 'items' in quotes:
+		quotes = quotes['items']
+	for quote in quotes:
+		# only remember complete quotes, so ID lookups can tell whether
+		# they've been approved
+		if 'approved' in quote:
+			_quotes_by_id.set(quote['id'], quote)
+	_index_quotes(quotes)
+	return quotes
+
+
+def _get_quote(quote_id):
+	quote = _quotes_by_id.get(quote_id)
+	if quote is None and _index is not None:
+		quote = _index.get(quote_id)
+	if quote is None:
+		data = _get_qdb_data(BASE_URL + '/' + str(quote_id), query_params=None)
+		quote = data['quote']
+		_quotes_by_id.set(quote_id, quote)
+		_index_quotes([quote])
+	return quote
+
+
+def _fetch_search_results(search, key):
+	quotes = _fetch_quotes(BASE_URL + '/random', query_params={'s': search})
+	# don't remember empty results, the quote might get added any moment
+	if quotes:
+		_search_results.set(key, quotes)
+	return quotes
+
+
+def _search_quotes(search):
+	key = search.lower().strip()
+	quotes = _search_results.get(key)
+	if quotes is None and _index is None:
+		quotes = _fetch_search_results(search, key)
+	elif quotes is None:
+		# a search that takes too long is left to finish in the background,
+		# so its results are cached for the next time
+		future = botologist.concurrency.get_executor().submit(
+			_fetch_search_results, search, key)
+		try:
+			quotes = future.result(timeout=SEARCH_TIMEOUT)
+		except concurrent.futures.TimeoutError:
+			quote = _index.search(search)
+			if quote is not None:
+				log.info('QDB search is slow, using the local index')
+				return quote
+			quotes = future.result()
+		except (requests.exceptions.RequestException, ValueError):
+			quote = _index.search(search)
+			if quote is None:
+				raise
+			log.warning('QDB search failed, using the local index', exc_info=True)
+			return quote
+	return random.choice(quotes) if quotes else None
+
+
+class QuotePool:
+	"""Random quotes fetched ahead of time.
+
+	Every request for random quotes returns a whole page of them, which are
+	kept here and handed out one at a time. When the pool runs low, it is
+	refilled in the background, so only the very first random quote has to
+	wait for a request.
+	"""
+	def __init__(self, fetch, low_water=5):
+		self.fetch = fetch
+		self.low_water = low_water
+		self._quotes = collections.deque()
+		self._refilling = False
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self._quotes)
+
+	def clear(self):
+		with self._lock:
+			self._quotes.clear()
+
+	def _pop(self):
+		with self._lock:
+			return self._quotes.popleft() if self._quotes else None
+
+	def get(self):
+		quote = self._pop()
+		if quote is None:
+			self.fill()
+			quote = self._pop()
+		# if even a fresh fetch didn't find anything, there's no point in
+		# trying again in the background
+		if quote is not None and len(self._quotes) < self.low_water:
+			self.refill_in_background()
+		return quote
+
+	def fill(self):
+		quotes = self.fetch()
+		with self._lock:
+			self._quotes.extend(quotes)
+
+	def refill_in_background(self):
+		with self._lock:
+			if self._refilling:
+				return
+			self._refilling = True
+		botologist.concurrency.get_executor().submit(self._refill)
+
+	def _refill(self):
+		try:
+			self.fill()
+		except requests.exceptions.RequestException:
+			log.warning('Refilling the random quote pool failed', exc_info=True)
+		finally:
+			with self._lock:
+				self._refilling = False
+
+
+_quotes_by_id = botologist.cache.TTLCache(maxsize=1024, ttl=86400, name='qdb_quotes')
+_search_results = botologist.cache.TTLCache(maxsize=256, ttl=600, name='qdb_search')
+_random_pool = QuotePool(lambda: _fetch_quotes(BASE_URL + '/random'))
+
+
 def _search_for_quote(quote):
 	search = False
-	query_params = None
-	if isinstance(quote, int):
-		url = BASE_URL+'/'+str(quote)
-		single_quote = True
-	else:
-		single_quote = False
-		if quote == 'random':
-			url = BASE_URL+'/random'
-		elif quote == 'latest':
-			url = BASE_URL
-		else:
-			search = str(quote)
-			url = BASE_URL+'/random'
-			query_params = {'s': search}
-
 	try:
-		data = _get_qdb_data(url, query_params=query_params)
+		if isinstance(quote, int):
+			quote = _get_quote(quote)
+			if not quote['approved']:
+				return 'No quote with that ID found!'
+		else:
+			if quote == 'random':
+				quote = _random_pool.get()
+			elif quote == 'latest':
+				quotes = _fetch_quotes(BASE_URL)
+				quote = quotes[0] if quotes else None
+			else:
+				search = str(quote)
+				quote = _search_quotes(search)
+			if not quote:
+				return 'No quotes found!'
 	except requests.exceptions.RequestException:
 		log.warning('QDB request caused an exception', exc_info=True)
 		return 'HTTP error!'
 
-	if single_quote:
-		quote = data['quote']
-		if not quote['approved']:
-			return 'No quote with that ID found!'
-	else:
-		quotes = data['quotes']
-		if 'items' in quotes:
-			quotes = quotes['items']
-		if len(quotes) < 1:
-			return 'No quotes found!'
-		quote = quotes[0]
-
-	url = BASE_URL+'/'+str(quote['id'])
+	return _format_quote(quote, search)
 
-	if len(quote['body']) > 400:
-		body = quote['body']
-		if search:
-			try:
-				body_len = len(body)
-				substr_pos = body.lower().index(search.lower())
-				start = body.rfind('\n', 0, substr_pos) + 1
-				while body_len - start < 300:
-					substr_pos = body.rfind('\n', 0, start - 1) + 1
-					if body_len - substr_pos < 300:
-						start = substr_pos
-					else:
-						break
-				end = start + 350 - len(search)
-			except ValueError:
-				start = 0
-				end = 300
-		else:
-			start = 0
-			end = 300
 
-		body = body.replace('\r', '').replace('\n', ' ').replace('\t', ' ')
-		excerpt = body[start:end]
+def _format_quote(quote, search=False):
+	url = BASE_URL+'/'+str(quote['id'])
 
-		if start > 0:
-			excerpt = '[...] ' + excerpt
-		if end < len(quote['body']):
-			excerpt = excerpt + ' [...]'
-		body = excerpt
-	else:
-		body = quote['body'].replace('\r', '').replace('\n', ' ').replace('\t', ' ')
+	terms = search.split() if search else None
+	body = botologist.excerpt.make_excerpt(quote['body'], terms,
+		length=300, threshold=400)
 
 	return url + ' - ' + body
 
 
 class QdbPlugin(botologist.plugin.Plugin):
+	channel_agnostic = True
+
+	def __init__(self, bot, channel):
+		super().__init__(bot, channel)
+		global _index # pylint: disable=global-statement
+		if bot.config.get('qdb_local_index') and _index is None \
+				and os.path.isdir(bot.storage_dir):
+			_index = open_index(os.path.join(bot.storage_dir, 'qdb.sqlite3'))
+
 	@botologist.plugin.command('qdb')
 	def search(self, cmd):
 		'''Search for a quote, or show a specific quote.
@@ -112,8 +300,12 @@ class QdbPlugin(botologist.plugin.Plugin):
 
 	@botologist.plugin.http_handler(method='POST', path='/qdb-update')
 	def quote_updated(self, body, headers):
-		data = json.loads(body)
+		data = json.loads(body.decode('utf-8'))
 		quote = data['quote']
+		_quotes_by_id.set(quote['id'], quote)
+		_index_quotes([quote])
+		# a new quote may match searches that previously didn't find it
+		_search_results.clear()
 		if quote['approved']:
 			return 'New quote approved! ' + _get_quote_url(quote)
 		else:
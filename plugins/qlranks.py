@@ -1,15 +1,22 @@
 import logging
 log = logging.getLogger(__name__)
 
-import requests
 import requests.exceptions
 
+import botologist.cache
+import botologist.concurrency
+import botologist.http_client
 import botologist.plugin
 
+# the most players that can be looked up with a single command
+MAX_NICKS = 8
+LOOKUP_TIMEOUT = 5
 
+
+@botologist.cache.cached(ttl=300, name='qlranks')
 def _get_qlr_data(nick):
 	url = 'http://www.qlranks.com/api.aspx'
-	response = requests.get(url, {'nick': nick}, timeout=4)
+	response = botologist.http_client.get(url, {'nick': nick}, timeout=4)
 	return response.json()['players'][0]
 
 
@@ -28,10 +35,7 @@ def _get_qlr_elo(nick, modes=None):
 		log.warning('QLRanks request caused an exception', exc_info=True)
 		return 'HTTP error, try again!'
 
-	# qlranks returns rank 0 indicating a player has no rating - if all modes
-	# have rank 0, it is safe to assume the player does not exist
-	unranked = [mode['rank'] == 0 for mode in data.values() if isinstance(mode, dict)]
-	if all(unranked):
+	if _is_unranked(data):
 		return 'Player not found or no games played: ' + data.get('nick', 'unknown')
 
 	retval = data['nick']
@@ -50,19 +54,78 @@ def _get_qlr_elo(nick, modes=None):
 	return retval
 
 
+def _is_unranked(data):
+	# qlranks returns rank 0 indicating a player has no rating - if all modes
+	# have rank 0, it is safe to assume the player does not exist
+	return all(mode['rank'] == 0 for mode in data.values() if isinstance(mode, dict))
+
+
+def _get_qlr_elos(nicks, modes=None):
+	"""Get the QLRanks ELO of several players, formatted on a single line.
+
+	Players are looked up in parallel, and each player's data is cached
+	separately, so asking about a player again soon after is instant.
+	"""
+	if modes is None:
+		modes = ('duel',)
+	modes = sorted(set(modes), key=modes.index)
+
+	# remove duplicates while keeping the order
+	unique_nicks = []
+	for nick in nicks:
+		if nick and nick.lower() not in (n.lower() for n in unique_nicks):
+			unique_nicks.append(nick)
+	nicks = unique_nicks
+	if len(nicks) > MAX_NICKS:
+		return 'Too many players, the limit is {}!'.format(MAX_NICKS)
+
+	results = botologist.concurrency.map_concurrently(_get_qlr_data, nicks,
+		timeout=LOOKUP_TIMEOUT)
+
+	players = []
+	for nick, data in zip(nicks, results):
+		if data is None:
+			players.append(nick + ': error')
+			continue
+		if _is_unranked(data):
+			players.append(data.get('nick', nick) + ': not found')
+			continue
+
+		elos = []
+		for mode in modes:
+			if mode not in data:
+				return 'Unknown mode: ' + mode
+			if data[mode]['rank'] == 0:
+				elos.append(mode + ' unranked')
+			else:
+				elos.append('{mode} {elo} (#{rank:,})'.format(
+					mode=mode, elo=data[mode]['elo'], rank=data[mode]['rank']))
+		players.append(data['nick'] + ': ' + ', '.join(elos))
+
+	return ' | '.join(players)
+
+
 class QlranksPlugin(botologist.plugin.Plugin):
 	"""QLRanks plugin."""
+
+	channel_agnostic = True
+
 	@botologist.plugin.command('elo', threaded=True)
 	def get_elo(self, msg):
-		'''Get a player's ELO from qlranks.'''
+		'''Get the ELO of one or more players from qlranks.
+
+		Examples: !elo rapha - !elo rapha,cypher duel,ca
+		'''
 		if len(msg.args) < 1:
 			return
 
+		modes = None
 		if len(msg.args) > 1:
 			if ',' in msg.args[1]:
 				modes = msg.args[1].split(',')
 			else:
 				modes = msg.args[1:]
-			return _get_qlr_elo(msg.args[0], modes)
-		else:
-			return _get_qlr_elo(msg.args[0])
+
+		if ',' in msg.args[0]:
+			return _get_qlr_elos(msg.args[0].split(','), modes)
+		return _get_qlr_elo(msg.args[0], modes)
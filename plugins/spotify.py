@@ -7,6 +7,8 @@ import spotipy
 import spotipy.client
 from spotipy.oauth2 import SpotifyClientCredentials
 
+import botologist.cache
+import botologist.concurrency
 import botologist.plugin
 
 
@@ -14,40 +16,129 @@ def _get_artist_str(artists):
 	return ', '.join(artist['name'] for artist in artists)
 
 
-class Spotify:
-	def __init__(self, spotify=None):
-		self.spotipy = spotify or spotipy.Spotify()
+def _format_artist(data):
+	return '%s (%s)' % (data['name'], ', '.join(data['genres']))
+
+
+def _format_album(data):
+	return '%s - %s' % (_get_artist_str(data['artists']), data['name'])
+
+
+def _format_track(data):
+	return '%s - %s - %s' % (_get_artist_str(data['artists']),
+		data['album']['name'], data['name'])
+
+
+_formatters = {
+	'artist': _format_artist,
+	'album': _format_album,
+	'track': _format_track,
+}
+
+# the most IDs the batch endpoints accept in one request
+_batch_sizes = {
+	'artist': 50,
+	'album': 20,
+	'track': 50,
+}
+
+
+def _get_cache_key(self, item_type, item_id): # pylint: disable=unused-argument
+	return (item_type, item_id)
 
-	def get_artist(self, artist_id):
-		data = self.spotipy.artist(artist_id)
-		return data['name'], ', '.join(data['genres'])
 
-	def get_album(self, album_id):
-		data = self.spotipy.album(album_id)
-		return _get_artist_str(data['artists']), data['name']
+class Spotify:
+	# how long to remember that an item doesn't exist
+	NOT_FOUND_TTL = 300
 
-	def get_track(self, track_id):
-		data = self.spotipy.track(track_id)
-		return _get_artist_str(data['artists']), data['album']['name'], data['name']
+	def __init__(self, spotify=None):
+		self.spotipy = spotify or spotipy.Spotify()
 
+	def _lookup(self, item_type, item_id):
+		if item_type == 'artist':
+			return self.spotipy.artist(item_id)
+		elif item_type == 'album':
+			return self.spotipy.album(item_id)
+		elif item_type == 'track':
+			return self.spotipy.track(item_id)
+		raise ValueError('unknown item type: %r' % item_type)
+
+	def _lookup_many(self, item_type, item_ids):
+		if item_type == 'artist':
+			return self.spotipy.artists(item_ids)['artists']
+		elif item_type == 'album':
+			return self.spotipy.albums(item_ids)['albums']
+		elif item_type == 'track':
+			return self.spotipy.tracks(item_ids)['tracks']
+		raise ValueError('unknown item type: %r' % item_type)
+
+	@botologist.cache.cached(ttl=3600, maxsize=512, negative_ttl=NOT_FOUND_TTL,
+		key=_get_cache_key, name='spotify', persist=True)
+	@botologist.concurrency.single_flight(key=_get_cache_key)
 	def get_info_str(self, item_type, item_id):
 		log.info('looking up spotify:%s:%s', item_type, item_id)
 		try:
-			if item_type == 'artist':
-				return '%s (%s)' % self.get_artist(item_id)
-			elif item_type == 'album':
-				return '%s - %s' % self.get_album(item_id)
-			elif item_type == 'track':
-				return '%s - %s - %s' % self.get_track(item_id)
-			else:
-				raise ValueError('unknown item type: %r' % item_type)
+			return _formatters[item_type](self._lookup(item_type, item_id))
 		except spotipy.client.SpotifyException:
 			log.warning('spotipy threw an exception while looking up spotify:%s:%s',
 				item_type, item_id, exc_info=True)
 			return
 
+	def get_info_strs(self, items, timeout=None):
+		"""Look up several (type, id) items, returning a list of info strings
+		in the same order. Items that aren't cached are looked up with one
+		request per type, and those requests are made in parallel."""
+		cache = Spotify.get_info_str.cache
+		infos = {item: cache.get(item, botologist.cache.MISSING) for item in items}
+
+		batches = []
+		for item_type, batch_size in _batch_sizes.items():
+			item_ids = [item_id for (i_type, item_id), info in infos.items()
+				if i_type == item_type and info is botologist.cache.MISSING]
+			for idx in range(0, len(item_ids), batch_size):
+				batches.append((item_type, item_ids[idx:idx + batch_size]))
+
+		if len(batches) == 1 and len(batches[0][1]) == 1:
+			# a single item might as well use the regular endpoint
+			item_type, (item_id,) = batches[0]
+			infos[(item_type, item_id)] = self.get_info_str(item_type, item_id)
+		elif batches:
+			results = botologist.concurrency.map_concurrently(
+				lambda batch: self._get_batch(*batch), batches, timeout=timeout)
+			for result in results:
+				infos.update(result or {})
+
+		return [infos[item] if infos[item] is not botologist.cache.MISSING else None
+			for item in items]
+
+	def _get_batch(self, item_type, item_ids):
+		log.info('looking up %d spotify %ss', len(item_ids), item_type)
+		try:
+			data = self._lookup_many(item_type, item_ids)
+		except spotipy.client.SpotifyException:
+			log.warning('spotipy threw an exception while looking up spotify %ss: %s',
+				item_type, ', '.join(item_ids), exc_info=True)
+			return None
+
+		cache = Spotify.get_info_str.cache
+		infos = {}
+		for item_id, item in zip(item_ids, data):
+			# items that don't exist are returned as null
+			info = _formatters[item_type](item) if item else None
+			if info is None:
+				cache.set((item_type, item_id), None, ttl=self.NOT_FOUND_TTL)
+			else:
+				cache.set((item_type, item_id), info)
+			infos[(item_type, item_id)] = info
+		return infos
+
 
 class SpotifyPlugin(botologist.plugin.Plugin):
+	channel_agnostic = True
+
+	# seconds to wait for the links in a message to be looked up
+	LOOKUP_TIMEOUT = 5
+
 	pattern = re.compile(r'(open\.spotify\.com\/|spotify:)(artist|album|track)[:/](\w+)')
 
 	def __init__(self, bot, channel):
@@ -63,12 +154,13 @@ class SpotifyPlugin(botologist.plugin.Plugin):
 
 	@botologist.plugin.reply(threaded=True)
 	def convert(self, msg):
-		ret = []
-
+		items = []
 		for match in self.pattern.finditer(msg.message):
-			info = self.spotify.get_info_str(match.group(2), match.group(3))
-			if info:
-				ret.append('[spotify] %s' % info)
+			if match.group(2, 3) not in items:
+				items.append(match.group(2, 3))
+
+		infos = self.spotify.get_info_strs(items, timeout=self.LOOKUP_TIMEOUT)
+		ret = ['[spotify] %s' % info for info in infos if info]
 
 		if len(ret) < 3:
 			return ret
@@ -8,6 +8,7 @@ import re
 import urllib.error
 import urllib.parse
 
+import botologist.concurrency
 import botologist.http
 import botologist.plugin
 from plugins.streams import twitch, hitbox, error, cache
@@ -95,6 +96,7 @@ class StreamManager:
 		self.game_filter = None
 		self._last_fetch = None
 		self._cached_streams = cache.StreamCache() if use_cache else None
+		self._fetches = botologist.concurrency.SingleFlight()
 		self.stor_path = stor_path
 		self._read()
 		self.twitch_auth_token = twitch_auth_token
@@ -246,7 +248,8 @@ class StreamManager:
 					return self._cached_streams.get_all()
 
 		try:
-			streams = self._fetch_streams()
+			# several users running !streams at once share one set of requests
+			streams = self._fetches.do('online', self._fetch_streams)
 		except urllib.error.URLError:
 			log.warning('Could not fetch online streams!', exc_info=True)
 
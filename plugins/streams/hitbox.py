@@ -1,8 +1,8 @@
 import logging
 log = logging.getLogger(__name__)
 
-import requests
 import requests.exceptions
+import botologist.http_client
 import plugins.streams
 
 
@@ -14,7 +14,7 @@ def make_hitbox_stream(data):
 
 def get_hitbox_data(channels):
 	url = 'http://api.hitbox.tv/media/live/' + (','.join(channels))
-	response = requests.get(url)
+	response = botologist.http_client.get(url)
 	try:
 		response.raise_for_status()
 	except requests.exceptions.HTTPError:
@@ -1,8 +1,8 @@
 import logging
 log = logging.getLogger(__name__)
 
-import requests
 import requests.exceptions
+import botologist.http_client
 import plugins.streams
 
 
@@ -19,7 +19,7 @@ def get_twitch_data(channels, auth_token):
 	url = 'https://api.twitch.tv/kraken/streams'
 	query_params = {'channel': ','.join(channels)}
 	headers = {'Authorization': 'OAuth %s' % auth_token}
-	response = requests.get(url, query_params, headers=headers)
+	response = botologist.http_client.get(url, query_params, headers=headers)
 	try:
 		response.raise_for_status()
 	except requests.exceptions.HTTPError:
@@ -3,33 +3,89 @@ log = logging.getLogger(__name__)
 
 import datetime
 import dateutil.parser
-import requests
+import requests.exceptions
 import pytz
 
+import botologist.cache
+import botologist.http_client
 import botologist.plugin
 
 
+BASE_URL = 'http://api.tvmaze.com/'
+
+# how long to cache shows that don't have a next episode scheduled
+NO_EPISODE_TTL = 86400
+
+# TVMaze show IDs by normalized show name, and shows by TVMaze show ID
+_show_ids = botologist.cache.TTLCache(maxsize=1024, ttl=7 * 86400, name='tvseries_ids')
+_shows = botologist.cache.TTLCache(maxsize=512, name='tvseries_shows')
+
+
+def normalize_show(show):
+	return ' '.join(show.lower().split())
+
+
+def _get_tvmaze_data(url, query_params):
+	response = botologist.http_client.get(url, query_params)
+	response.raise_for_status()
+	return response.json()
+
+
+def _parse_show(data):
+	nextepisode = data.get('_embedded', {}).get('nextepisode')
+	if nextepisode:
+		log.debug('next episode data: %r', nextepisode)
+		nextepisode = {
+			'season': nextepisode['season'],
+			'number': nextepisode['number'],
+			'airs_at': dateutil.parser.parse(nextepisode['airstamp']),
+		}
+	return {'id': data['id'], 'name': data['name'], 'nextepisode': nextepisode}
+
+
+def get_show(show):
+	"""Get a show and its next episode, from the cache if possible.
+
+	A show stays cached until its next episode has aired, as that's the
+	earliest the next episode could change.
+	"""
+	key = normalize_show(show)
+	show_id = _show_ids.get(key)
+	if show_id is not None:
+		info = _shows.get(show_id)
+		if info is not None:
+			return info
+		data = _get_tvmaze_data(BASE_URL + 'shows/' + str(show_id),
+			{'embed': 'nextepisode'})
+	else:
+		data = _get_tvmaze_data(BASE_URL + 'singlesearch/shows',
+			{'q': show, 'embed': 'nextepisode'})
+
+	info = _parse_show(data)
+	if info['nextepisode']:
+		airs_at = info['nextepisode']['airs_at']
+		ttl = (airs_at - datetime.datetime.now(airs_at.tzinfo)).total_seconds()
+	else:
+		ttl = NO_EPISODE_TTL
+	_show_ids.set(key, info['id'])
+	_shows.set(info['id'], info, ttl=max(ttl, 0))
+	return info
+
 
 def get_next_episode_info(show, output_timezone=pytz.timezone('UTC')):
-	query = {'q': show, 'embed': 'nextepisode'}
 	try:
-		response = requests.get('http://api.tvmaze.com/singlesearch/shows', query)
-		response.raise_for_status()
+		show = get_show(show)
 	except requests.exceptions.RequestException:
 		log.warning('TVMaze request caused an exception', exc_info=True)
 		return None
-
-	try:
-		data = response.json()
 	except ValueError:
-		log.warning('TVMaze returned invalid JSON: %r', response.text, exc_info=True)
+		log.warning('TVMaze returned invalid JSON', exc_info=True)
 		return None
 
-	info = data['name']
-	nextepisode = data.get('_embedded', {}).get('nextepisode')
+	info = show['name']
+	nextepisode = show['nextepisode']
 	if nextepisode:
-		log.debug('next episode data: %r', nextepisode)
-		dt = dateutil.parser.parse(nextepisode['airstamp'])
+		dt = nextepisode['airs_at']
 		info += ' - season %d, episode %d airs at %s' % (
 			nextepisode['season'],
 			nextepisode['number'],
@@ -58,6 +114,8 @@ def get_next_episode_info(show, output_timezone=pytz.timezone('UTC')):
 
 
 class TvseriesPlugin(botologist.plugin.Plugin):
+	channel_agnostic = True
+
 	def __init__(self, bot, channel):
 		super().__init__(bot, channel)
 		self.output_tz = pytz.timezone(self.bot.config.get('output_timezone'))
@@ -1,12 +1,86 @@
-import datetime
+import logging
+log = logging.getLogger(__name__)
+
+import re
+import time
 import tweepy
 
+import botologist.cache
+import botologist.concurrency
 import botologist.plugin
 import botologist.util
 
 
+_tweet_url_regex = re.compile(r'twitter\.com/\w+/status/(\d+)')
+
+# formatted tweets by tweet ID
+_tweets = botologist.cache.TTLCache(maxsize=1024, ttl=3600, name='tweets')
+
+
+def find_tweet_ids(message):
+	tweet_ids = []
+	for tweet_id in _tweet_url_regex.findall(message):
+		if tweet_id not in tweet_ids:
+			tweet_ids.append(tweet_id)
+	return tweet_ids
+
+
+def format_tweet(tweet):
+	author = tweet.author.screen_name
+	body = tweet.text.replace('\n', ' ')
+	body = botologist.util.unescape_html(body)
+
+	return '[{author}] {body}'.format(author='@'+author, body=body)
+
+
+class RateLimit:
+	"""Keeps track of how many API calls are left, based on the rate limit
+	headers of the last response."""
+
+	# how long to wait if the API tells us we're rate limited without saying
+	# for how long, which is the length of twitter's rate limit window
+	DEFAULT_RESET = 15 * 60
+
+	def __init__(self):
+		self.remaining = None
+		self.reset = None
+
+	def update(self, response):
+		if response is None:
+			return
+		try:
+			remaining = response.headers.get('x-rate-limit-remaining')
+			reset = response.headers.get('x-rate-limit-reset')
+			if remaining is not None and reset is not None:
+				self.remaining = int(remaining)
+				self.reset = int(reset)
+		except (TypeError, ValueError):
+			log.debug('could not parse rate limit headers', exc_info=True)
+
+	def exhaust(self):
+		self.remaining = 0
+		self.reset = time.time() + self.DEFAULT_RESET
+
+	def allows(self):
+		if self.remaining is None or self.remaining > 0:
+			return True
+		return time.time() >= self.reset
+
+
+_rate_limit = RateLimit()
+
+
+def is_rate_limit_error(exception):
+	# tweepy.RateLimitError only exists since tweepy 3.5
+	rate_limit_error = getattr(tweepy, 'RateLimitError', None)
+	if rate_limit_error is not None and isinstance(exception, rate_limit_error):
+		return True
+	response = getattr(exception, 'response', None)
+	return getattr(response, 'status_code', None) == 429
+
+
 class TwitterPlugin(botologist.plugin.Plugin):
-	SPAM_THROTTLE = 10
+	channel_agnostic = True
 
 	def __init__(self, bot, channel):
 		super().__init__(bot, channel)
@@ -14,41 +88,77 @@ class TwitterPlugin(botologist.plugin.Plugin):
 		if not self.cfg:
 			raise RuntimeError('twitter_api config missing - check your config file!')
 		self.api = None
-		self.last_fetch = None
+		# a lazily loaded plugin may be created after the bot has connected
+		if self.bot.started:
+			self.init_api_in_background()
+		else:
+			self.bot.client.on_connect.append(self.init_api_in_background)
+
+	def init_api_in_background(self):
+		if self.api is None:
+			botologist.concurrency.get_executor().submit(
+				self.bot._wrap_error_handler(self.init_api))
+
+	def init_api(self):
+		api = self.make_api()
+		try:
+			api.verify_credentials()
+			_rate_limit.update(getattr(api, 'last_response', None))
+		except tweepy.TweepError:
+			log.warning('Could not verify twitter credentials', exc_info=True)
+		if self.api is None:
+			self.api = api
 
 	@botologist.plugin.reply(threaded=True)
 	def twitter(self, msg):
 		if 'twitter.com/' not in msg.message:
 			return
 
-		for word in msg.words:
-			if 'twitter.com/' in word:
-				break
-
-		parts = word.split('/')
-		if len(parts) < 5 or parts[4] != 'status':
+		tweet_ids = find_tweet_ids(msg.message)
+		if not tweet_ids:
 			return
 
-		return self.get_tweet_text(parts[5])
-
-	def get_tweet_text(self, tweet_id):
-		if self.api is None:
-			self.api = self.make_api()
+		texts = {}
+		missing = []
+		for tweet_id in tweet_ids:
+			text = _tweets.get(tweet_id)
+			if text:
+				texts[tweet_id] = text
+			else:
+				missing.append(tweet_id)
 
-		now = datetime.datetime.now()
-		if self.last_fetch:
-			diff = now - self.last_fetch
-			if diff.seconds < self.SPAM_THROTTLE:
-				return
-		self.last_fetch = now
+		if missing and not _rate_limit.allows():
+			log.info('twitter rate limit reached, not looking up %d tweets', len(missing))
+		elif missing:
+			if self.api is None:
+				self.api = self.make_api()
+			try:
+				texts.update(self.lookup_tweets(missing))
+			except tweepy.TweepError:
+				log.warning('Looking up tweets %s failed', missing, exc_info=True)
 
-		tweet = self.api.get_status(tweet_id)
+		return [texts[tweet_id] for tweet_id in tweet_ids if tweet_id in texts]
 
-		author = tweet.author.screen_name
-		body = tweet.text.replace('\n', ' ')
-		body = botologist.util.unescape_html(body)
+	def lookup_tweets(self, tweet_ids):
+		"""Look up tweets with as few API calls as possible, returning a dict
+		of tweet ID => formatted tweet."""
+		try:
+			if len(tweet_ids) == 1:
+				tweets = {tweet_ids[0]: self.api.get_status(tweet_ids[0])}
+			else:
+				tweets = {tweet.id_str: tweet
+					for tweet in self.api.statuses_lookup(tweet_ids)}
+		except tweepy.TweepError as exception:
+			if is_rate_limit_error(exception):
+				_rate_limit.exhaust()
+			raise
+		_rate_limit.update(getattr(self.api, 'last_response', None))
 
-		return '[{author}] {body}'.format(author='@'+author, body=body)
+		texts = {}
+		for tweet_id, tweet in tweets.items():
+			texts[tweet_id] = format_tweet(tweet)
+			_tweets.set(tweet_id, texts[tweet_id])
+		return texts
 
 	def make_api(self):
 		auth = tweepy.OAuthHandler(consumer_key=self.cfg['consumer_key'],
@@ -2,12 +2,21 @@ import logging
 log = logging.getLogger(__name__)
 
 import re
-import requests
+import urllib.parse
 import requests.exceptions
 
+import botologist.cache
+import botologist.concurrency
+import botologist.http_client
 import botologist.plugin
 
 
+# the maximum number of redirects to follow for a single URL
+MAX_REDIRECTS = 5
+
+# seconds to wait for the URLs in a message to be resolved
+LOOKUP_TIMEOUT = 5
+
 url_shorteners = r'|'.join((
 	r'https?://bit\.ly',
 	r'https?://goo\.gl',
@@ -21,37 +30,64 @@ short_url_regex = re.compile(r'((' + url_shorteners + r')\/[a-zA-Z0-9/]+)')
 
 def find_shortened_urls(message):
 	matches = short_url_regex.findall(message)
-	return [match[0] for match in matches]
+	urls = []
+	for match in matches:
+		if match[0] not in urls:
+			urls.append(match[0])
+	return urls
 
 
 def get_location(url):
-	response = requests.head(url)
-	if response.status_code != 301 and response.status_code != 302:
-		return response.url
-	return response.headers['location']
+	"""Get the URL that a URL redirects to, or None if it doesn't redirect."""
+	response = botologist.http_client.head(url)
+	if response.is_redirect:
+		return urllib.parse.urljoin(url, response.headers['location'])
+	return None
+
+
+def resolve_redirects(url, max_redirects=MAX_REDIRECTS):
+	"""Follow a chain of redirects, returning the last URL."""
+	for _ in range(max_redirects):
+		location = get_location(url)
+		if not location or location == url:
+			break
+		url = location
+	else:
+		log.info('Stopped following redirects after %d hops', max_redirects)
+	return url
 
+
+@botologist.cache.cached(ttl=7 * 24 * 3600, maxsize=2048, negative_ttl=600,
+	name='url', persist=True)
+@botologist.concurrency.single_flight()
 def unshorten_url(url):
 	try:
-		url = get_location(url)
+		real_url = resolve_redirects(url)
 	except requests.exceptions.RequestException:
 		log.info('HTTP error while unshortening URL', exc_info=True)
 		return None
 
-	if len(url) > 300:
-		log.info('Unshortened URL is too long (%d characters)', len(url))
+	if real_url == url:
 		return None
 
-	return url
+	if len(real_url) > 300:
+		log.info('Unshortened URL is too long (%d characters)', len(real_url))
+		return None
+
+	return real_url
 
 
 class UrlPlugin(botologist.plugin.Plugin):
+	channel_agnostic = True
+
 	@botologist.plugin.reply()
 	def reply(self, msg):
 		urls = find_shortened_urls(msg.message)
+		real_urls = botologist.concurrency.map_concurrently(unshorten_url, urls,
+			timeout=LOOKUP_TIMEOUT)
 		ret = []
 
-		for url in urls:
-			real_url = unshorten_url(url)
+		for url, real_url in zip(urls, real_urls):
 			if real_url:
 				ret.append('{} => {}'.format(url, real_url))
 
@@ -1,20 +1,120 @@
 import logging
 log = logging.getLogger(__name__)
 
-import requests
+import threading
+import time
 import requests.exceptions
 
+import botologist.cache
+import botologist.http_client
 import botologist.plugin
 
 
+BASE_URL = 'http://api.openweathermap.org/data/2.5/'
+
+# how long to remember that a city doesn't exist, in seconds
+NOT_FOUND_TTL = 3600
+
+# cities that have been asked for within this many seconds are kept up to
+# date by the ticker. the group endpoint takes at most 20 city IDs at a time.
+RECENT_TIME = 3600
+GROUP_SIZE = 20
+
+# weather data by city ID, city IDs by normalized city name, and normalized
+# names of cities that OpenWeatherMap doesn't know about
+_weather = botologist.cache.TTLCache(maxsize=512, ttl=600, name='weather')
+_city_ids = botologist.cache.TTLCache(maxsize=1024, ttl=86400, name='weather_cities')
+_not_found = botologist.cache.TTLCache(maxsize=1024, ttl=NOT_FOUND_TTL,
+	name='weather_not_found')
+
+# city ID => when it was last asked for. commands add to it while the ticker
+# goes through it, so it's only accessed with the lock held.
+_recent = {}
+_recent_lock = threading.Lock()
+
+
+def _mark_recent(city_id):
+	with _recent_lock:
+		_recent[city_id] = time.time()
+
+
 def get_owm_data(url, query_params):
-	return requests.get(url, query_params).json()
+	return botologist.http_client.get(url, query_params).json()
+
+
+def normalize_city(city):
+	return '-'.join(city.lower().replace('-', ' ').split())
+
+
+def get_weather(city, api_key):
+	"""Get the weather data for a city, from the cache if possible."""
+	key = normalize_city(city)
+	city_id = _city_ids.get(key)
+	if city_id is not None:
+		data = _weather.get(city_id)
+		if data is not None:
+			_mark_recent(city_id)
+			return data
+	else:
+		data = _not_found.get(key)
+		if data is not None:
+			return data
+
+	query_params = {'q': city, 'units': 'metric', 'APPID': api_key}
+	data = get_owm_data(BASE_URL + 'weather', query_params=query_params)
+	status = int(data['cod'])
+	if status == 200:
+		_city_ids.set(key, data['id'])
+		_weather.set(data['id'], data)
+		_mark_recent(data['id'])
+	elif status == 404:
+		_not_found.set(key, data)
+	return data
+
+
+def refresh_weather(api_key):
+	"""Refresh the weather of recently requested cities that have dropped out
+	of the cache. Cities are refreshed 20 at a time, so cities that are still
+	cached may be refreshed along with them at no extra cost."""
+	cutoff = time.time() - RECENT_TIME
+	with _recent_lock:
+		for city_id, requested in list(_recent.items()):
+			if requested < cutoff:
+				del _recent[city_id]
+		city_ids = sorted(_recent)
+	for idx in range(0, len(city_ids), GROUP_SIZE):
+		chunk = city_ids[idx:idx + GROUP_SIZE]
+		if all(city_id in _weather for city_id in chunk):
+			continue
+		query_params = {
+			'id': ','.join(str(city_id) for city_id in chunk),
+			'units': 'metric',
+			'APPID': api_key,
+		}
+		try:
+			data = get_owm_data(BASE_URL + 'group', query_params=query_params)
+		except (requests.exceptions.RequestException, ValueError):
+			log.warning('OpenWeatherMap group request caused an exception', exc_info=True)
+			return
+		for item in data.get('list', []):
+			# entries in the group response don't have a status code of their own
+			item.setdefault('cod', 200)
+			_weather.set(item['id'], item)
+		log.debug('Refreshed weather for %d cities', len(data.get('list', [])))
 
 
 class WeatherPlugin(botologist.plugin.Plugin):
+	channel_agnostic = True
+
 	def __init__(self, bot, channel):
 		super().__init__(bot, channel)
 		self.api_key = self.bot.config.get('openweathermap_apikey')
+		if 'weather_cache_ttl' in self.bot.config:
+			_weather.ttl = self.bot.config['weather_cache_ttl']
+
+	@botologist.plugin.ticker()
+	def refresh(self):
+		refresh_weather(self.api_key)
 
 	@botologist.plugin.command('weather')
 	def weather(self, cmd):
@@ -26,11 +126,9 @@ class WeatherPlugin(botologist.plugin.Plugin):
 			return 'Usage: !weather city'
 
 		city = '-'.join(cmd.args)
-		url = 'http://api.openweathermap.org/data/2.5/weather'
-		query_params = {'q': city, 'units': 'metric', 'APPID': self.api_key}
 
 		try:
-			data = get_owm_data(url, query_params=query_params)
+			data = get_weather(city, self.api_key)
 		except (requests.exceptions.RequestException, ValueError):
 			log.warning('OpenWeatherMap request caused an exception', exc_info=True)
 			return 'An HTTP error occured, try again later!'
@@ -4,12 +4,30 @@ from unittest import mock
 import os.path
 import botologist.protocol.irc as irc
 import botologist.bot
+import botologist.plugin
 
 
 def make_channel(channel):
 	return irc.Channel(channel)
 
 
+class ChannelPlugin(botologist.plugin.Plugin):
+	ticks = 0
+
+	@botologist.plugin.ticker()
+	def tick(self):
+		self.__class__.ticks += 1
+		return 'tick'
+
+
+class SharedPlugin(ChannelPlugin):
+	channel_agnostic = True
+
+	@botologist.plugin.ticker()
+	def tick(self):
+		return super().tick()
+
+
 class CommandMessageTest(unittest.TestCase):
 	def test_commands_and_args_are_parsed(self):
 		msg = irc.Message('nick!ident@host.com', '#channel', '!foo bar baz')
@@ -58,3 +76,30 @@ class BotTest(unittest.TestCase):
 		assert_reply('!asdf', 'test: !asdf')
 		assert_reply('!asdfg', None)
 		assert_reply('!asdg', None)
+
+	def test_channel_agnostic_plugins_are_shared(self):
+		bot = self.make_bot()
+		bot.register_plugin('channel', ChannelPlugin)
+		bot.register_plugin('shared', SharedPlugin)
+		bot.add_channel('#chan1', plugins=['channel', 'shared'])
+		bot.add_channel('#chan2', plugins=['channel', 'shared'])
+		chan1, chan2 = bot.channels['#chan1'], bot.channels['#chan2']
+		self.assertEqual(3, len(set(chan1.tickers) | set(chan2.tickers)))
+		bot.add_channel('#chan3', plugins=['channel', 'shared'])
+		self.assertIs(chan1.tickers[1], bot.channels['#chan3'].tickers[1])
+
+		bot.register_plugin('shared', SharedPlugin)
+		bot.add_channel('#chan4', plugins=['shared'])
+		self.assertIsNot(chan1.tickers[1], bot.channels['#chan4'].tickers[0])
+
+	def test_shared_tickers_run_once(self):
+		bot = self.make_bot()
+		bot.register_plugin('shared', SharedPlugin)
+		bot.add_channel('#chan1', plugins=['shared'])
+		bot.add_channel('#chan2', plugins=['shared'])
+		bot._send_msg = mock.Mock()
+		bot._start_tick_timer = mock.Mock()
+		SharedPlugin.ticks = 0
+		bot._tick()
+		self.assertEqual(1, SharedPlugin.ticks)
+		bot._send_msg.assert_has_calls([mock.call('tick', '#chan1'), mock.call('tick', '#chan2')])
@@ -0,0 +1,96 @@
+import unittest
+from unittest import mock
+import os
+import os.path
+
+from botologist.cache import TTLCache, cached
+
+
+class TTLCacheTest(unittest.TestCase):
+	file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+		'tmp', 'cache_test.json')
+
+	def tearDown(self):
+		if os.path.isfile(self.file_path):
+			os.remove(self.file_path)
+
+	def test_get_and_set(self):
+		cache = TTLCache()
+		self.assertEqual(None, cache.get('foo'))
+		cache.set('foo', 'bar')
+		self.assertEqual('bar', cache.get('foo'))
+		self.assertTrue('foo' in cache)
+		self.assertEqual(1, cache.hits)
+		self.assertEqual(1, cache.misses)
+		self.assertEqual(0.5, cache.hit_rate)
+
+	def test_entries_expire(self):
+		cache = TTLCache(ttl=10)
+		with mock.patch('time.time', return_value=1000):
+			cache.set('foo', 'bar')
+			cache.set('bar', 'baz', ttl=100)
+		with mock.patch('time.time', return_value=1011):
+			self.assertEqual(None, cache.get('foo'))
+			self.assertEqual('baz', cache.get('bar'))
+
+	def test_least_recently_used_is_evicted(self):
+		cache = TTLCache(maxsize=2)
+		cache.set('a', 1)
+		cache.set('b', 2)
+		cache.get('a')
+		cache.set('c', 3)
+		self.assertEqual(2, len(cache))
+		self.assertEqual(1, cache.get('a'))
+		self.assertEqual(None, cache.get('b'))
+		self.assertEqual(3, cache.get('c'))
+
+	def test_save_and_load(self):
+		cache = TTLCache()
+		cache.set(('foo', 1), {'bar': 'baz'})
+		cache.save(self.file_path)
+		cache = TTLCache()
+		cache.load(self.file_path)
+		self.assertEqual({'bar': 'baz'}, cache.get(('foo', 1)))
+
+
+class CachedDecoratorTest(unittest.TestCase):
+	def test_results_are_cached(self):
+		func = mock.MagicMock(return_value='foo')
+		decorated = cached(name='test')(func)
+		self.assertEqual('foo', decorated('a', b={'c': 'd'}))
+		self.assertEqual('foo', decorated('a', b={'c': 'd'}))
+		func.assert_called_once_with('a', b={'c': 'd'})
+		decorated('b')
+		self.assertEqual(2, func.call_count)
+		self.assertEqual(1, decorated.cache.hits)
+
+	def test_negative_results(self):
+		func = mock.MagicMock(return_value=None)
+		decorated = cached(name='test')(func)
+		decorated('a')
+		decorated('a')
+		self.assertEqual(2, func.call_count)
+
+		func = mock.MagicMock(return_value=None)
+		decorated = cached(negative_ttl=10, name='test')(func)
+		with mock.patch('time.time', return_value=1000):
+			decorated('a')
+			decorated('a')
+		self.assertEqual(1, func.call_count)
+		with mock.patch('time.time', return_value=1011):
+			decorated('a')
+		self.assertEqual(2, func.call_count)
+
+	def test_exceptions_are_not_cached(self):
+		func = mock.MagicMock(side_effect=[RuntimeError, 'foo'])
+		decorated = cached(name='test')(func)
+		with self.assertRaises(RuntimeError):
+			decorated('a')
+		self.assertEqual('foo', decorated('a'))
+
+	def test_custom_key(self):
+		func = mock.MagicMock(return_value='foo')
+		decorated = cached(key=lambda a, b: a, name='test')(func)
+		decorated('a', 1)
+		decorated('a', 2)
+		func.assert_called_once_with('a', 1)
@@ -0,0 +1,139 @@
+import unittest
+from unittest import mock
+import threading
+
+from botologist.concurrency import SingleFlight, single_flight, map_concurrently
+
+
+class Key:
+	"""A key that counts how often it is compared to another key.
+
+	SingleFlight looks up the in-flight call for every caller, and comparing
+	a new key object to the stored one is part of that lookup. Once a follower
+	has been counted it has found the in-flight call and will get its result,
+	no matter when the call finishes."""
+	def __init__(self, value):
+		self.value = value
+
+	def __hash__(self):
+		return hash(self.value)
+
+	def __eq__(self, other):
+		with Key.compared_cond:
+			Key.compared += 1
+			Key.compared_cond.notify_all()
+		return isinstance(other, Key) and self.value == other.value
+
+	compared = 0
+	compared_cond = threading.Condition()
+
+	@classmethod
+	def wait_for_comparisons(cls, num_comparisons):
+		with cls.compared_cond:
+			return cls.compared_cond.wait_for(
+				lambda: cls.compared >= num_comparisons, timeout=5)
+
+
+class SingleFlightTest(unittest.TestCase):
+	def setUp(self):
+		Key.compared = 0
+		# set by the in-flight function once it's running
+		self.started = threading.Event()
+
+	def wait_for_followers(self, num_followers):
+		self.assertTrue(self.started.wait(5))
+		self.assertTrue(Key.wait_for_comparisons(num_followers))
+
+	def run_concurrently(self, flight, key, func, num_threads=5):
+		results = []
+		errors = []
+		def target():
+			try:
+				# a new key object per caller, which is compared to the key
+				# of the in-flight call when looking it up
+				results.append(flight.do(Key(key), func))
+			except Exception as exception:
+				errors.append(exception)
+		threads = [threading.Thread(target=target) for _ in range(num_threads)]
+		for thread in threads:
+			thread.start()
+		return threads, results, errors
+
+	def test_concurrent_calls_share_result(self):
+		flight = SingleFlight()
+		release = threading.Event()
+		calls = []
+		def func():
+			calls.append(1)
+			self.started.set()
+			release.wait()
+			return 'foo'
+		threads, results, errors = self.run_concurrently(flight, 'key', func)
+		self.wait_for_followers(4)
+		release.set()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(1, len(calls))
+		self.assertEqual(['foo'] * 5, results)
+		self.assertEqual([], errors)
+
+	def test_exceptions_are_shared(self):
+		flight = SingleFlight()
+		release = threading.Event()
+		def func():
+			self.started.set()
+			release.wait()
+			raise RuntimeError('foo')
+		threads, results, errors = self.run_concurrently(flight, 'key', func, 3)
+		self.wait_for_followers(2)
+		release.set()
+		for thread in threads:
+			thread.join()
+		self.assertEqual([], results)
+		self.assertEqual(3, len(errors))
+
+	def test_sequential_calls_are_not_shared(self):
+		flight = SingleFlight()
+		func = mock.MagicMock(return_value='foo')
+		flight.do('key', func)
+		flight.do('key', func)
+		self.assertEqual(2, func.call_count)
+		self.assertEqual({}, flight._calls)
+
+	def test_decorator(self):
+		func = mock.MagicMock(return_value='foo', __name__='func')
+		decorated = single_flight()(func)
+		self.assertEqual('foo', decorated('a', b='c'))
+		func.assert_called_once_with('a', b='c')
+
+
+class MapConcurrentlyTest(unittest.TestCase):
+	def test_results_are_in_order(self):
+		self.assertEqual([], map_concurrently(str, []))
+		self.assertEqual(['1'], map_concurrently(str, [1]))
+		self.assertEqual(['1', '2', '3'], map_concurrently(str, [1, 2, 3]))
+
+	def test_items_run_in_parallel(self):
+		barrier = threading.Barrier(3, timeout=5)
+		def func(item):
+			barrier.wait()
+			return item
+		self.assertEqual([1, 2, 3], map_concurrently(func, [1, 2, 3]))
+
+	def test_late_results_are_dropped(self):
+		release = threading.Event()
+		def func(item):
+			if item == 'slow':
+				release.wait()
+			return item
+		try:
+			self.assertEqual(['fast', None], map_concurrently(func, ['fast', 'slow'], timeout=0.1))
+		finally:
+			release.set()
+
+	def test_exceptions_result_in_none(self):
+		def func(item):
+			if item == 'bad':
+				raise RuntimeError('bad')
+			return item
+		self.assertEqual(['good', None], map_concurrently(func, ['good', 'bad'], timeout=5))
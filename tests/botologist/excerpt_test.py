@@ -0,0 +1,43 @@
+import unittest
+
+from botologist.excerpt import make_excerpt
+
+
+WORDS = ' '.join('word{}'.format(i) for i in range(200))
+
+
+class ExcerptTest(unittest.TestCase):
+	def test_short_text_is_returned_whole(self):
+		self.assertEqual('foo bar baz', make_excerpt('foo\r\nbar \t baz'))
+		self.assertEqual('x' * 400, make_excerpt('x' * 400, length=300, threshold=400))
+
+	def test_cuts_at_word_boundaries(self):
+		self.assertEqual('word0 word1 word2 word3 word4 word5 word6 word7 word8 [...]',
+			make_excerpt(WORDS, length=60))
+
+	def test_centers_on_search_term(self):
+		self.assertEqual('[...] word99 word100 word101 word102 word103 [...]',
+			make_excerpt(WORDS, ['word101'], length=60))
+		self.assertEqual('[...] word194 word195 word196 word197 word198 word199',
+			make_excerpt(WORDS, ['WORD199'], length=60))
+
+	def test_prefers_window_with_most_terms(self):
+		text = 'foo ' + 'x ' * 100 + 'bar ' + 'y ' * 100 + 'foo bar ' + 'z ' * 100
+		excerpt = make_excerpt(text, ['foo', 'bar'], length=40)
+		self.assertIn('foo bar', excerpt)
+		self.assertTrue(excerpt.startswith('[...] y'))
+		self.assertTrue(excerpt.endswith('z [...]'))
+
+	def test_terms_not_found(self):
+		self.assertEqual(make_excerpt(WORDS, length=60),
+			make_excerpt(WORDS, ['nothing'], length=60))
+
+	def test_long_words_are_cut(self):
+		self.assertEqual('x' * 14 + ' [...]', make_excerpt('x' * 40, length=20))
+
+	def test_markers_count_towards_length(self):
+		for terms in (None, ['word0'], ['word101'], ['word199']):
+			self.assertLessEqual(len(make_excerpt(WORDS, terms, length=60)), 60)
+
+	def test_terms_longer_than_excerpt(self):
+		self.assertEqual('a' * 34 + ' [...]', make_excerpt('a' * 500, ['a' * 50], length=40))
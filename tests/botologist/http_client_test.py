@@ -0,0 +1,78 @@
+import unittest
+from unittest import mock
+import datetime
+
+import requests
+import requests.exceptions
+
+import botologist.bot
+import botologist.http_client as http_client
+
+
+def make_response(url, status_code=200):
+	response = requests.Response()
+	response.url = url
+	response.status_code = status_code
+	response.elapsed = datetime.timedelta(milliseconds=250)
+	return response
+
+
+class SessionTest(unittest.TestCase):
+	def test_default_timeout(self):
+		session = http_client.Session(timeout=3)
+		with mock.patch('requests.adapters.HTTPAdapter.send') as send:
+			send.return_value = make_response('http://foo.com')
+			session.get('http://foo.com')
+			self.assertEqual(3, send.call_args[1]['timeout'])
+			session.get('http://foo.com', timeout=1)
+			self.assertEqual(1, send.call_args[1]['timeout'])
+
+	def test_pool_settings(self):
+		session = http_client.Session(retries=5, pool_maxsize=2)
+		adapter = session.get_adapter('https://foo.com')
+		self.assertEqual(2, adapter._pool_maxsize)
+		self.assertTrue(adapter._pool_block)
+		self.assertEqual(5, adapter.max_retries.total)
+
+	def test_short_timeout_and_no_retries_by_default(self):
+		session = http_client.Session()
+		self.assertEqual((3.05, 5), session.timeout)
+		self.assertEqual(0, session.get_adapter('https://foo.com').max_retries.total)
+
+	def test_latency_is_recorded_per_host(self):
+		session = http_client.Session()
+		before = http_client.request_latency.get(host='bar.com')
+		before = before['count'] if before else 0
+		with mock.patch('requests.adapters.HTTPAdapter.send') as send:
+			send.return_value = make_response('http://bar.com/baz')
+			session.get('http://bar.com/baz')
+		self.assertEqual(before + 1, http_client.request_latency.get(host='bar.com')['count'])
+
+	def test_errors_are_counted_per_host(self):
+		session = http_client.Session()
+		before = http_client.request_errors.get(host='error.com') or 0
+		with mock.patch('requests.adapters.HTTPAdapter.send',
+				side_effect=requests.exceptions.ConnectionError):
+			with self.assertRaises(requests.exceptions.ConnectionError):
+				session.get('http://error.com')
+		self.assertEqual(before + 1, http_client.request_errors.get(host='error.com'))
+
+
+class ModuleTest(unittest.TestCase):
+	def tearDown(self):
+		http_client.configure({})
+
+	def test_session_is_shared(self):
+		self.assertIs(http_client.get_session(), http_client.get_session())
+
+	def test_configure(self):
+		http_client.configure({'http_client_timeout': [1, 2], 'http_client_pool_size': 8})
+		session = http_client.get_session()
+		self.assertEqual((1, 2), session.timeout)
+		self.assertEqual(8, session.get_adapter('http://foo.com')._pool_maxsize)
+		http_client.configure({})
+		self.assertIsNot(session, http_client.get_session())
+
+	def test_bot_configures_session(self):
+		botologist.bot.Bot({'storage_dir': '/tmp/botologist', 'http_client_timeout': 2})
+		self.assertEqual(2, http_client.get_session().timeout)
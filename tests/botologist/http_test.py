@@ -0,0 +1,164 @@
+import unittest
+from unittest import mock
+import http.client
+import os
+import os.path
+import threading
+
+from botologist.http import DeliveryLog, HTTPServer, RequestHandler
+import botologist.bot
+import botologist.metrics
+import botologist.plugin
+
+
+class DummyPlugin(botologist.plugin.Plugin):
+	bodies = []
+
+	@botologist.plugin.http_handler(method='POST', path='/test')
+	def handle(self, body, headers):
+		self.bodies.append(body)
+
+
+class CatchAllPlugin(botologist.plugin.Plugin):
+	@botologist.plugin.http_handler(method='POST')
+	def handle(self, body, headers, path):
+		pass
+
+
+class SharedPlugin(botologist.plugin.Plugin):
+	channel_agnostic = True
+	bodies = []
+
+	@botologist.plugin.http_handler(method='POST', path='/shared')
+	def handle(self, body, headers):
+		self.bodies.append(body)
+		return 'shared'
+
+
+class DeliveryLogTest(unittest.TestCase):
+	file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+		'tmp', 'http_deliveries.json')
+
+	def setUp(self):
+		if os.path.isfile(self.file_path):
+			os.remove(self.file_path)
+
+	def tearDown(self):
+		if os.path.isfile(self.file_path):
+			os.remove(self.file_path)
+
+	def test_remembers_deliveries(self):
+		deliveries = DeliveryLog()
+		self.assertFalse('foo' in deliveries)
+		deliveries.add('foo')
+		self.assertTrue('foo' in deliveries)
+		self.assertFalse('bar' in deliveries)
+
+	def test_deliveries_expire(self):
+		deliveries = DeliveryLog(ttl=60)
+		with mock.patch('time.time', return_value=1000):
+			deliveries.add('foo')
+		with mock.patch('time.time', return_value=1059):
+			deliveries.add('bar')
+			self.assertTrue('foo' in deliveries)
+		with mock.patch('time.time', return_value=1061):
+			self.assertFalse('foo' in deliveries)
+			self.assertTrue('bar' in deliveries)
+			self.assertEqual(1, len(deliveries))
+
+	def test_deliveries_are_persisted(self):
+		deliveries = DeliveryLog(path=self.file_path)
+		deliveries.add('foo')
+		deliveries = DeliveryLog(path=self.file_path)
+		self.assertTrue('foo' in deliveries)
+		self.assertFalse('bar' in deliveries)
+
+
+class RequestHandlerTest(unittest.TestCase):
+	def setUp(self):
+		DummyPlugin.bodies = []
+		SharedPlugin.bodies = []
+		self.bot = botologist.bot.Bot({
+			'storage_dir': os.path.join(os.path.dirname(__file__), 'tmp'),
+			'http_body_size_limits': {'/small': 4},
+		})
+		self.bot.register_plugin('dummy', DummyPlugin)
+		self.bot.add_channel('#chan', plugins=['dummy'])
+		self.server = HTTPServer(('127.0.0.1', 0), RequestHandler)
+		self.server.set_bot(self.bot)
+		self.thread = threading.Thread(target=self.server.serve_forever)
+		self.thread.start()
+
+	def tearDown(self):
+		self.server.shutdown()
+		self.server.server_close()
+		self.thread.join()
+
+	def post(self, path, body, headers=None):
+		conn = http.client.HTTPConnection(*self.server.server_address)
+		conn.request('POST', path, body, headers or {})
+		response = conn.getresponse()
+		response.read()
+		conn.close()
+		return response.status
+
+	def test_body_is_passed_as_bytes(self):
+		self.assertEqual(200, self.post('/test', b'{"foo": "bar"}'))
+		self.assertEqual([b'{"foo": "bar"}'], DummyPlugin.bodies)
+
+	def test_shared_handlers_are_called_once(self):
+		self.bot.register_plugin('shared', SharedPlugin)
+		self.bot.add_channel('#chan1', plugins=['shared'])
+		self.bot.add_channel('#chan2', plugins=['shared'])
+		self.bot._send_msg = mock.Mock()
+		self.assertEqual(200, self.post('/shared', b'1'))
+		self.assertEqual([b'1'], SharedPlugin.bodies)
+		self.bot._send_msg.assert_has_calls([
+			mock.call('shared', '#chan1'),
+			mock.call('shared', '#chan2'),
+		])
+
+	def test_body_size_limit(self):
+		self.assertEqual(413, self.post('/small', b'12345'))
+		self.assertEqual(200, self.post('/small', b'1234'))
+		self.server.max_body_size = 10
+		self.assertEqual(413, self.post('/test', b'12345678901'))
+		self.assertEqual([], DummyPlugin.bodies)
+
+	def test_invalid_content_length_is_rejected(self):
+		for length in ('-1', 'foo'):
+			conn = http.client.HTTPConnection(*self.server.server_address)
+			conn.putrequest('POST', '/test')
+			conn.putheader('Content-Length', length)
+			conn.endheaders()
+			response = conn.getresponse()
+			response.read()
+			conn.close()
+			self.assertEqual(400, response.status)
+		self.assertEqual([], DummyPlugin.bodies)
+
+	def test_duplicate_deliveries_are_dropped(self):
+		headers = {'X-GitHub-Delivery': 'foo'}
+		self.assertEqual(200, self.post('/test', b'1', headers))
+		self.assertEqual(200, self.post('/test', b'2', headers))
+		self.assertEqual(200, self.post('/test', b'3', {'X-GitHub-Delivery': 'bar'}))
+		self.assertEqual([b'1', b'3'], DummyPlugin.bodies)
+
+	def test_handler_latency_is_labelled_by_handler(self):
+		self.bot.register_plugin('catchall', CatchAllPlugin)
+		self.bot.add_channel('#chan1', plugins=['catchall'])
+		self.assertEqual(200, self.post('/anything?foo=bar', b'1'))
+		self.assertEqual(200, self.post('/test', b'1'))
+		rendered = botologist.metrics.registry.render()
+		self.assertIn('handler="CatchAllPlugin.handle"', rendered)
+		self.assertIn('handler="DummyPlugin.handle"', rendered)
+		self.assertNotIn('foo=bar', rendered)
+
+	def test_metrics(self):
+		conn = http.client.HTTPConnection(*self.server.server_address)
+		conn.request('GET', '/metrics')
+		response = conn.getresponse()
+		body = response.read().decode()
+		conn.close()
+		self.assertEqual(200, response.status)
+		self.assertIn('# TYPE botologist_threads gauge', body)
@@ -0,0 +1,146 @@
+import unittest
+from unittest import mock
+import os
+import os.path
+import json
+import threading
+
+import botologist.bot
+import botologist.lazy
+import botologist.plugin
+import botologist.protocol.irc as irc
+
+
+class LazyTestPlugin(botologist.plugin.Plugin):
+	instances = 0
+
+	def __init__(self, bot, channel):
+		super().__init__(bot, channel)
+		self.__class__.instances += 1
+
+	@botologist.plugin.command('hello', threaded=True)
+	def hello(self, cmd):
+		'''Say hello.'''
+		return 'hello ' + cmd.user.nick
+
+	@botologist.plugin.ticker()
+	def tick(self):
+		return 'tick'
+
+
+class SharedLazyTestPlugin(LazyTestPlugin):
+	channel_agnostic = True
+
+	@botologist.plugin.http_handler(path='/lazy')
+	def handle(self, body, headers):
+		return 'handled'
+
+
+class ImmediateExecutor:
+	def submit(self, func, *args):
+		func(*args)
+
+
+class LazyPluginTest(unittest.TestCase):
+	manifest_path = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+		'tmp', 'plugins.json')
+
+	def setUp(self):
+		LazyTestPlugin.instances = 0
+
+	def tearDown(self):
+		if os.path.isfile(self.manifest_path):
+			os.remove(self.manifest_path)
+
+	def make_bot(self, **config):
+		return botologist.bot.Bot(dict({
+			'server': 'localhost:6667',
+			'storage_dir': os.path.dirname(self.manifest_path),
+			'lazy_plugins': True,
+			'plugins': {
+				'lazy': 'tests.botologist.lazy_test.LazyTestPlugin',
+				'shared': 'tests.botologist.lazy_test.SharedLazyTestPlugin',
+			},
+			'channels': {
+				'#chan1': {'plugins': ['lazy', 'shared']},
+				'#chan2': {'plugins': ['lazy', 'shared']},
+			},
+		}, **config))
+
+	def test_first_run_imports_plugins_and_writes_manifest(self):
+		bot = self.make_bot()
+		self.assertIs(LazyTestPlugin, bot.plugins['lazy'])
+		self.assertEqual(2, LazyTestPlugin.instances)
+		self.assertTrue(os.path.isfile(self.manifest_path))
+
+	def test_plugins_in_manifest_are_not_imported(self):
+		self.make_bot()
+		LazyTestPlugin.instances = 0
+		with mock.patch('botologist.lazy.import_class') as import_class:
+			bot = self.make_bot()
+		import_class.assert_not_called()
+		self.assertIsInstance(bot.plugins['lazy'], botologist.lazy.LazyPluginClass)
+		self.assertEqual(0, LazyTestPlugin.instances)
+
+		chan = bot.channels['#chan1']
+		self.assertEqual(['LazyTestPlugin', 'SharedLazyTestPlugin'], chan.plugins)
+		self.assertEqual('Say hello.', chan.commands['hello'].__doc__)
+		self.assertTrue(chan.commands['hello']._is_threaded)
+		self.assertEqual('/lazy', chan.http_handlers[0]._http_path)
+
+	def test_plugin_is_loaded_on_first_use(self):
+		self.make_bot()
+		bot = self.make_bot()
+		LazyTestPlugin.instances = 0
+		msg = irc.Message('nick!user@host', '#chan1', '!hello')
+		cmd = botologist.bot.CommandMessage(msg)
+		self.assertEqual('hello nick', bot.channels['#chan1'].commands['hello'](cmd))
+		self.assertEqual('hello nick', bot.channels['#chan1'].commands['hello'](cmd))
+		self.assertEqual(1, LazyTestPlugin.instances)
+
+	def test_channel_agnostic_lazy_plugins_are_shared(self):
+		self.make_bot()
+		bot = self.make_bot()
+		chan1, chan2 = bot.channels['#chan1'], bot.channels['#chan2']
+		self.assertIsNot(chan1.tickers[0], chan2.tickers[0])
+		self.assertIs(chan1.http_handlers[0], chan2.http_handlers[0])
+		self.assertEqual(3, len(bot._lazy_plugins))
+
+	def test_plugins_are_loaded_in_background_after_connect(self):
+		self.make_bot()
+		bot = self.make_bot()
+		LazyTestPlugin.instances = 0
+		with mock.patch('botologist.concurrency.get_executor', return_value=ImmediateExecutor()):
+			bot._load_lazy_plugins()
+		self.assertEqual(2, LazyTestPlugin.instances)
+		self.assertTrue(all(plugin.plugin for plugin in bot._lazy_plugins))
+
+	def test_outdated_manifest_entries_are_ignored(self):
+		self.make_bot()
+		with mock.patch('botologist.lazy.get_module_mtime', return_value=1.0):
+			bot = self.make_bot()
+		self.assertIs(LazyTestPlugin, bot.plugins['lazy'])
+
+	def test_plugins_are_imported_eagerly_by_default(self):
+		bot = self.make_bot(lazy_plugins=False)
+		self.assertIs(LazyTestPlugin, bot.plugins['lazy'])
+		self.assertFalse(os.path.isfile(self.manifest_path))
+
+	def test_manifest_can_be_updated_from_several_threads(self):
+		manifest = botologist.lazy.PluginManifest(self.manifest_path)
+		def add(class_path, plugin_class):
+			for _ in range(20):
+				manifest.add(class_path, plugin_class)
+				manifest.changed = True
+				manifest.save()
+		threads = [
+			threading.Thread(target=add, args=('tests.botologist.lazy_test.LazyTestPlugin', LazyTestPlugin)),
+			threading.Thread(target=add, args=('tests.botologist.lazy_test.SharedLazyTestPlugin', SharedLazyTestPlugin)),
+		]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		with open(self.manifest_path) as f:
+			self.assertEqual(2, len(json.load(f)))
+		self.assertFalse(os.path.exists(self.manifest_path + '.tmp'))
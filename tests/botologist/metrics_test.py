@@ -0,0 +1,60 @@
+import unittest
+
+from botologist.metrics import Registry
+
+
+class RegistryTest(unittest.TestCase):
+	def test_counter(self):
+		registry = Registry()
+		counter = registry.counter('foo_total', 'Foo things')
+		counter.inc()
+		counter.inc(2)
+		self.assertEqual(3, counter.get())
+		self.assertEqual('# HELP foo_total Foo things\n'
+			'# TYPE foo_total counter\n'
+			'foo_total 3\n', registry.render())
+
+	def test_returns_existing_metric(self):
+		registry = Registry()
+		counter = registry.counter('foo_total', 'Foo things')
+		self.assertIs(counter, registry.counter('foo_total', 'Foo things'))
+		with self.assertRaises(ValueError):
+			registry.gauge('foo_total', 'Foo things')
+
+	def test_labels(self):
+		registry = Registry()
+		counter = registry.counter('foo_total', 'Foo things', ['kind'])
+		counter.inc(kind='a')
+		counter.inc(kind='b"')
+		self.assertEqual(1, counter.get(kind='a'))
+		self.assertIn('foo_total{kind="a"} 1', registry.render())
+		self.assertIn('foo_total{kind="b\\""} 1', registry.render())
+		with self.assertRaises(ValueError):
+			counter.inc(other='a')
+
+	def test_gauge_function(self):
+		registry = Registry()
+		gauge = registry.gauge('foo', 'Foo')
+		gauge.set_function(lambda: 42)
+		self.assertIn('foo 42', registry.render())
+
+	def test_histogram(self):
+		registry = Registry()
+		histogram = registry.histogram('foo_seconds', 'Foo', buckets=(1, 5))
+		histogram.observe(0.5)
+		histogram.observe(3)
+		histogram.observe(10)
+		self.assertEqual('# HELP foo_seconds Foo\n'
+			'# TYPE foo_seconds histogram\n'
+			'foo_seconds_bucket{le="1"} 1\n'
+			'foo_seconds_bucket{le="5"} 2\n'
+			'foo_seconds_bucket{le="+Inf"} 3\n'
+			'foo_seconds_sum 13.5\n'
+			'foo_seconds_count 3\n', registry.render())
+
+	def test_histogram_timer(self):
+		registry = Registry()
+		histogram = registry.histogram('foo_seconds', 'Foo', ['name'])
+		with histogram.time(name='bar'):
+			pass
+		self.assertEqual(1, histogram.get(name='bar')['count'])
@@ -0,0 +1,84 @@
+import unittest
+from unittest import mock
+import os.path
+
+import botologist.bot
+import botologist.plugin
+import botologist.protocol.irc as irc
+from botologist.profiling import Profiler
+
+
+class DummyPlugin(botologist.plugin.Plugin):
+	@botologist.plugin.command('foo', threaded=True)
+	def foo(self, cmd):
+		'''Do foo.'''
+		return 'foo'
+
+
+class ProfilerTest(unittest.TestCase):
+	def test_wrapped_callbacks_are_timed(self):
+		profiler = Profiler()
+		func = profiler.wrap('Plugin', lambda: 'foo')
+		self.assertEqual('foo', func())
+		self.assertEqual('foo', func())
+		stats = profiler.stats[('Plugin', '<lambda>')]
+		self.assertEqual(2, stats.calls)
+		self.assertTrue(stats.total >= stats.max > 0)
+
+	def test_exceptions_are_timed(self):
+		profiler = Profiler()
+		def func():
+			raise RuntimeError('foo')
+		with self.assertRaises(RuntimeError):
+			profiler.wrap('Plugin', func)()
+		self.assertEqual(1, profiler.stats[('Plugin', 'func')].calls)
+
+	def test_cprofile_sampling(self):
+		profiler = Profiler(cprofile_rate=1.0)
+		profiler.wrap('Plugin', lambda: sum(range(100)))()
+		self.assertIn('cumulative', profiler.format_report())
+
+	def test_only_one_call_is_sampled_at_a_time(self):
+		profiler = Profiler(cprofile_rate=1.0)
+		def inner():
+			return sum(range(100))
+		inner = profiler.wrap('Plugin', inner)
+		def outer():
+			self.assertTrue(profiler._sampling.locked())
+			return inner()
+		self.assertEqual(4950, profiler.wrap('Plugin', outer)())
+		self.assertEqual(1, profiler.stats[('Plugin', 'inner')].calls)
+		self.assertEqual(1, profiler.stats[('Plugin', 'outer')].calls)
+		self.assertFalse(profiler._sampling.locked())
+
+	def test_requested_report_is_logged_later(self):
+		profiler = Profiler()
+		with mock.patch.object(profiler, 'log_report') as log_report:
+			profiler.log_requested_report()
+			profiler.request_report()
+			log_report.assert_not_called()
+			profiler.log_requested_report()
+			profiler.log_requested_report()
+		log_report.assert_called_once_with()
+
+	def test_summary_and_reset(self):
+		profiler = Profiler()
+		self.assertEqual('No profiling data collected yet.', profiler.format_summary())
+		with mock.patch('time.perf_counter', side_effect=[1.0, 1.5]):
+			profiler.wrap('Plugin', lambda: None)()
+		self.assertEqual('Plugin.<lambda>: 500.0ms total, 1 calls, 500.0ms max',
+			profiler.format_summary())
+		profiler.reset()
+		self.assertEqual({}, profiler.stats)
+
+	def test_plugin_callbacks_are_wrapped(self):
+		bot = botologist.bot.Bot({
+			'storage_dir': os.path.join(os.path.dirname(__file__), 'tmp'),
+			'profiling': True,
+		})
+		plugin = DummyPlugin(bot, irc.Channel('#chan'))
+		command = plugin.commands['foo']
+		self.assertTrue(command._is_threaded)
+		self.assertEqual('Do foo.', command.__doc__)
+		self.assertEqual('foo', command(None))
+		self.assertEqual(1, bot.profiler.stats[('DummyPlugin', 'foo')].calls)
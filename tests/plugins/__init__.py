@@ -58,7 +58,9 @@ class PluginTestCase(unittest.TestCase):
 
 	def http(self, method, path, body=None, headers=None):
 		if body is None:
-			body = ''
+			body = b''
+		elif isinstance(body, str):
+			body = body.encode('utf-8')
 		if headers is None:
 			headers = {}
 
@@ -1,17 +1,39 @@
+import datetime
+import io
+import os
+import os.path
+import unittest
 import unittest.mock as mock
 from tests.plugins import PluginTestCase
+from plugins.conversion import Currency, RateTable, get_currency_data, units, \
+	might_be_conversion
 
 ddg_f = 'plugins.conversion.get_duckduckgo_data'
 ecb_f = 'plugins.conversion.get_currency_data'
 
+
+class ImmediateExecutor:
+	def submit(self, func, *args, **kwargs):
+		func(*args, **kwargs)
+
+
 class ConversionPluginTest(PluginTestCase):
 	def create_plugin(self):
-		from plugins.conversion import ConversionPlugin, Currency
-		Currency.last_fetch = None
-		Currency.currency_data = None
-		return ConversionPlugin(self.bot, self.channel)
+		from plugins.conversion import ConversionPlugin
+		plugin = ConversionPlugin(self.bot, self.channel)
+		plugin.currency.storage_path = None
+		return plugin
 
-	@mock.patch(ddg_f, return_value={ 'AnswerType': 'conversions', 'Answer': 'TEST' })
+	def setUp(self):
+		super().setUp()
+		patcher = mock.patch('botologist.concurrency.get_executor',
+			return_value=ImmediateExecutor())
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.bot._send_msg = mock.Mock()
+
+	@mock.patch(ddg_f, side_effect=lambda url, params: {
+		'AnswerType': 'conversions', 'Answer': 'answer: ' + params['q']})
 	@mock.patch(ecb_f, return_value={ 'NOK': 8.00, 'DKK': 6.00 })
 	def test_converts_currencies(self, currency_mock, convert_mock):
 		self.assertEqual('10 eur = 80 nok', self.reply('10 eur into nok'))
@@ -23,35 +45,233 @@ class ConversionPluginTest(PluginTestCase):
 		self.assertEqual('10 dkk = 13.33 nok', self.reply('what is 10 dkk into nok?'))
 		self.assertEqual('10,000 eur = 80,000 nok', self.reply('10k eur into nok'))
 		self.assertEqual('1,100 eur = 8,800 nok', self.reply('1.1k eur into nok'))
-		self.assertEqual('TEST', self.reply('10 cny into eur'))
-		self.assertEqual('TEST', self.reply('10 eur into cny'))
-		self.assertEqual('TEST', self.reply('10 usd into cny'))
+		self.assertEqual(None, self.reply('10 cny into eur'))
+		self.bot._send_msg.assert_called_with(['answer: 10 cny into eur'], self.channel.channel)
+		self.bot._send_msg.reset_mock()
+		self.assertEqual(None, self.reply('10 eur into cny'))
+		self.assertEqual(None, self.reply('10 usd into cny'))
+		self.assertEqual(2, self.bot._send_msg.call_count)
 		self.assertEqual('10 eur = 80 nok, 60 dkk', self.reply('10 eur into nok,dkk'))
 		self.assertEqual('10 eur = 80 nok, 60 dkk', self.reply('10 eur into nok,dkk,cny'))
 
-	def check_convert_reply(self, message, expected_qs, response='DEFAULT'):
-		if response == 'DEFAULT':
-			response = message + ' reply'
-		return_value={'AnswerType': 'conversions', 'Answer': response}
+	@mock.patch(ecb_f, return_value={'NOK': 8.00})
+	def test_zero_is_a_currency_result(self, currency_mock):
+		with mock.patch(ddg_f) as mf:
+			self.assertEqual('0 eur = 0 nok', self.reply('0 eur in nok'))
+		mf.assert_not_called()
+
+	def test_rates_are_loaded_on_connect(self):
+		self.assertIn(self.plugin.currency.load, self.bot.client.on_connect)
+
+	def test_remote_results_are_throttled(self):
+		return_value = {'AnswerType': 'conversions', 'Answer': 'answer'}
+		with mock.patch(ecb_f, return_value={}), \
+				mock.patch(ddg_f, return_value=return_value):
+			self.reply('10 foo in bar')
+			self.reply('10 foo in bar')
+		self.bot._send_msg.assert_called_once_with(['answer'], self.channel.channel)
+
+	@mock.patch(ecb_f, return_value={})
+	def test_converts_units_locally(self, currency_mock):
+		with mock.patch(ddg_f) as mf:
+			self.assertEqual('100 kg = 15.75 stones', self.reply('100kg into stones'))
+			self.assertEqual('100 kg = 15.75 stones', self.reply('100 kg into stones'))
+			self.assertEqual('100 KG = 15.75 STONES', self.reply('100 KG IN STONES'))
+			self.assertEqual('100 kg = 15.75 stones', self.reply('what is 100 kg in stones?'))
+			self.assertEqual('100 square metres = 0.02 acres',
+				self.reply('100 square metres in acres'))
+			self.assertEqual('1 mm = 1e-06 km', self.reply('1 mm in km'))
+			self.assertEqual('100 cubic metres = 100,000 litres',
+				self.reply('100 cubic metres in litres'))
+			self.assertEqual('100 fl.oz = 2.96 litres', self.reply('100 fl.oz in litres'))
+			self.assertEqual('100,000 kg = 100 tons', self.reply('100 000 kg in tons'))
+			self.assertEqual('100,000 kg = 100 tons', self.reply('100k kg in tons'))
+			self.assertEqual('0.50 kg = 1.10 lbs', self.reply('.5 kg in lbs'))
+			self.assertEqual('100 c = 212 f', self.reply('100 c in f'))
+			self.assertEqual('100 km/h = 62.14 mph', self.reply('100 km/h in mph'))
+			self.assertEqual('1 GiB = 1,073.74 MB', self.reply('1 GiB in MB'))
+			self.assertEqual('1 km = 1,000 m, 0.62 miles', self.reply('1 km in m,miles'))
+		mf.assert_not_called()
+
+	@mock.patch(ecb_f, return_value={})
+	def test_does_not_convert_between_dimensions(self, currency_mock):
+		with mock.patch(ddg_f) as mf:
+			self.assertEqual(None, self.reply('100 kg in litres'))
+		mf.assert_not_called()
+
+	def test_amount_does_not_start_mid_number(self):
+		match = self.plugin.pattern.search('it is 1,000 2.5kg in lbs')
+		self.assertEqual('1,000 2.5', match.group(1))
+		self.assertEqual(None, self.plugin.pattern.search('1,' * 240 + ' in '))
+		self.assertEqual(None, self.plugin.pattern.search('1 ' * 240 + 'in x'))
+
+	def test_ignores_messages_that_are_not_conversions(self):
+		with mock.patch('plugins.conversion.Currency.convert_many') as mf:
+			self.assertEqual(None, self.reply('what is going on in here'))
+			self.assertEqual(None, self.reply('see you at 10'))
+			self.assertEqual(None, self.reply('1 2 3 4 5 6 7 8 9 ' * 50 + 'x'))
+		mf.assert_not_called()
+
+	def check_convert_reply(self, message, expected_qs):
+		return_value = {'AnswerType': 'conversions', 'Answer': message + ' reply'}
 		with mock.patch(ddg_f, return_value=return_value) as mf:
-			self.assertEqual(response, self.reply(message))
+			self.assertEqual(None, self.reply(message))
 		mf.assert_called_with('https://api.duckduckgo.com',
 			{'q':expected_qs,'format':'json','no_html':1})
+		self.bot._send_msg.assert_called_with([message + ' reply'], self.channel.channel)
 
 	@mock.patch(ecb_f, return_value={})
-	def test_converts_units(self, currency_mock):
-		self.check_convert_reply('100kg into stones', '100 kg into stones')
-		self.check_convert_reply('100 kg into stones', '100 kg into stones')
-		self.check_convert_reply('100 kg in stones', '100 kg in stones')
-		self.check_convert_reply('100 KG IN STONES', '100 kg in stones')
-		self.check_convert_reply('asdf 100 kg in stones asdf', '100 kg in stones')
-		self.check_convert_reply('what is 100 kg in stones?', '100 kg in stones')
-		self.check_convert_reply('100 square metres in acres', '100 square metres in acres')
-		self.check_convert_reply('100 cubic metres in litres', '100 cubic metres in litres')
-		self.check_convert_reply('100 fl.oz in litres', '100 fl.oz in litres')
-		self.check_convert_reply('100 000 kg in tons', '100000 kg in tons')
-		self.check_convert_reply('100,000 kg in tons', '100000 kg in tons')
-		self.check_convert_reply('100k kg in tons', '100000 kg in tons')
-		self.check_convert_reply('123 456.78 kg in lbs', '123456.78 kg in lbs')
-		self.check_convert_reply('0.5 kg in lbs', '0.5 kg in lbs')
-		self.check_convert_reply('.5 kg in lbs', '0.5 kg in lbs')
+	def test_converts_unknown_units_remotely(self, currency_mock):
+		self.check_convert_reply('100 foo in bar', '100 foo in bar')
+		self.check_convert_reply('100 FOO IN BAR', '100 foo in bar')
+		self.check_convert_reply('asdf 100 foo in bar asdf', '100 foo in bar')
+		self.check_convert_reply('100,000 foos in bars', '100000 foos in bars')
+		self.check_convert_reply('123 456.78 kg in bars', '123456.78 kg in bars')
+		self.check_convert_reply('.5 foo in bar', '0.5 foo in bar')
+
+
+class PrefilterTest(unittest.TestCase):
+	def test_might_be_conversion(self):
+		self.assertTrue(might_be_conversion('100 kg in lbs'))
+		self.assertTrue(might_be_conversion('10 EUR INTO NOK'))
+		self.assertTrue(might_be_conversion('what is 10 usd to nok?'))
+		self.assertFalse(might_be_conversion('what is going on in here'))
+		self.assertFalse(might_be_conversion('see you at 10'))
+		self.assertFalse(might_be_conversion('10 kg'))
+
+
+class UnitsTest(unittest.TestCase):
+	def test_find_unit(self):
+		self.assertEqual('kilogram', units.find_unit('kg').name)
+		self.assertEqual('kilogram', units.find_unit('Kilograms').name)
+		self.assertEqual('foot', units.find_unit('feet').name)
+		self.assertEqual('inch', units.find_unit('inches').name)
+		self.assertEqual('area', units.find_unit('square feet').dimension)
+		self.assertEqual(None, units.find_unit('square kg'))
+		self.assertEqual(None, units.find_unit('foo'))
+
+	def test_case_sensitive_symbols(self):
+		self.assertEqual('millimetre', units.find_unit('mm').name)
+		self.assertEqual('megametre', units.find_unit('Mm').name)
+		self.assertEqual('millimetre', units.find_unit('MM').name)
+		self.assertEqual('megabyte', units.find_unit('mb').name)
+		self.assertEqual('megabit', units.find_unit('Mbit').name)
+
+	def test_convert(self):
+		self.assertAlmostEqual(1.609344, units.convert(1, 'mile', 'km'))
+		self.assertAlmostEqual(-40, units.convert(-40, 'f', 'c'))
+		self.assertAlmostEqual(273.15, units.convert(0, 'celsius', 'kelvin'))
+		self.assertAlmostEqual(1024, units.convert(1, 'KiB', 'B'))
+		self.assertAlmostEqual(10000, units.convert(1, 'ha', 'square metres'))
+		self.assertEqual(None, units.convert(1, 'kg', 'm'))
+		self.assertEqual(None, units.convert(1, 'kg', 'foo'))
+
+
+ECB_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<gesmes:Envelope xmlns:gesmes="http://www.gesmes.org/xml/2002-08-01" xmlns="http://www.ecb.int/vocabulary/2002-08-01/eurofxref">
+	<gesmes:subject>Reference rates</gesmes:subject>
+	<Cube>
+		<Cube time="2017-06-09">
+			<Cube currency="USD" rate="1.1218"/>
+			<Cube currency="NOK" rate="9.5088"/>
+		</Cube>
+	</Cube>
+</gesmes:Envelope>"""
+
+
+class CurrencyTest(unittest.TestCase):
+	file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+		'tmp', 'currency_rates.json')
+
+	def setUp(self):
+		self.currency = Currency(self.file_path)
+		patcher = mock.patch('botologist.concurrency.get_executor',
+			return_value=ImmediateExecutor())
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def tearDown(self):
+		if os.path.isfile(self.file_path):
+			os.remove(self.file_path)
+
+	def test_parses_ecb_xml(self):
+		response = mock.MagicMock()
+		response.raw = io.BytesIO(ECB_XML)
+		with mock.patch('botologist.http_client.get', return_value=response):
+			self.assertEqual({'USD': 1.1218, 'NOK': 9.5088}, get_currency_data())
+
+	def test_invalid_xml(self):
+		response = mock.MagicMock()
+		response.raw = io.BytesIO(b'<foo')
+		with mock.patch('botologist.http_client.get', return_value=response):
+			self.assertEqual({}, get_currency_data())
+
+	def test_rates_are_stored_and_read(self):
+		with mock.patch(ecb_f, return_value={'NOK': 8.00}):
+			self.assertEqual(80, self.currency.convert(10, 'eur', 'nok'))
+		self.currency = Currency(self.file_path)
+		with mock.patch(ecb_f) as mf:
+			self.assertEqual(80, self.currency.convert(10, 'eur', 'nok'))
+		mf.assert_not_called()
+		self.assertFalse(os.path.exists(self.file_path + '.tmp'))
+
+	def test_malformed_stored_rates_are_ignored(self):
+		with open(self.file_path, 'w') as f:
+			f.write('{"foo": "bar"}')
+		with mock.patch(ecb_f, return_value={'NOK': 8.00}) as mf:
+			self.assertEqual(80, self.currency.convert(10, 'eur', 'nok'))
+		mf.assert_called_once_with()
+
+	def test_failed_refresh_keeps_old_rates(self):
+		with mock.patch(ecb_f, return_value={'NOK': 8.00}):
+			self.currency.refresh()
+		with mock.patch(ecb_f, return_value={}):
+			self.currency.refresh()
+		self.assertEqual({'NOK': 8.00}, self.currency.currency_data)
+
+	def test_stale_rates_are_refreshed_in_background(self):
+		with mock.patch(ecb_f, return_value={'NOK': 8.00}):
+			self.currency.refresh()
+		self.assertFalse(self.currency.needs_refresh())
+		self.currency.last_fetch -= datetime.timedelta(hours=2)
+		self.currency.last_attempt = None
+		self.assertTrue(self.currency.needs_refresh())
+		with mock.patch('botologist.concurrency.get_executor') as executor:
+			self.assertEqual(80, self.currency.convert(10, 'eur', 'nok'))
+		executor.return_value.submit.assert_called_once_with(self.currency.refresh)
+
+	def test_first_rates_are_fetched_in_background(self):
+		with mock.patch('botologist.concurrency.get_executor') as executor:
+			self.assertEqual(None, self.currency.convert(10, 'eur', 'nok'))
+		executor.return_value.submit.assert_called_once_with(self.currency.refresh)
+		self.assertEqual(None, self.currency.currency_data)
+		with mock.patch(ecb_f, return_value={'NOK': 8.00}):
+			self.currency.refresh()
+		self.assertEqual(80, self.currency.convert(10, 'eur', 'nok'))
+
+
+class RateTableTest(unittest.TestCase):
+	def test_cross_rates(self):
+		table = RateTable({'NOK': 8.0, 'DKK': 6.0})
+		self.assertEqual(3, table.size)
+		self.assertEqual(8.0, table.get_rate('EUR', 'NOK'))
+		self.assertEqual(0.125, table.get_rate('NOK', 'EUR'))
+		self.assertEqual(0.75, table.get_rate('NOK', 'DKK'))
+		self.assertEqual(1.0, table.get_rate('DKK', 'DKK'))
+
+	def test_convert_to_many(self):
+		table = RateTable({'NOK': 8.0, 'DKK': 6.0})
+		self.assertEqual([80.0, 60.0, None], table.convert(10, 'EUR', ['NOK', 'DKK', 'CNY']))
+		self.assertEqual([None, None], table.convert(10, 'CNY', ['NOK', 'DKK']))
+
+	def test_convert_batch(self):
+		table = RateTable({'NOK': 8.0})
+		self.assertEqual([8.0, 16.0, 80.0], table.convert_batch([1, 2, 10], 'EUR', 'NOK'))
+		self.assertEqual([None, None], table.convert_batch([1, 2], 'EUR', 'CNY'))
+
+	def test_currency_uses_aliases(self):
+		currency = Currency()
+		currency.currency_data = {'ILS': 4.0}
+		currency.last_fetch = datetime.datetime.now()
+		self.assertEqual([40.0, None], currency.convert_many(10, 'euro', ['nis', 'eur']))
+		self.assertEqual([4.0, 8.0], currency.convert_batch([1, 2], 'eur', 'nis'))
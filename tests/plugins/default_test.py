@@ -1,6 +1,7 @@
 import datetime
 import re
 from tests.plugins import PluginTestCase
+from botologist.profiling import Profiler
 
 class DefaultPluginTest(PluginTestCase):
 	def create_plugin(self):
@@ -35,3 +36,13 @@ class DefaultPluginTest(PluginTestCase):
 	def test_uptime(self):
 		self.bot.started = datetime.datetime(2015, 1, 1, 12, 0, 0)
 		self.assertTrue(re.match(r'\d+d \d{1,2}h \d{1,2}m \d{1,2}s', self.cmd('uptime')))
+
+	def test_profile(self):
+		self.assertEqual(None, self.cmd('profile', is_admin=True))
+		self.bot.profiler = Profiler()
+		self.assertEqual(None, self.cmd('profile'))
+		self.assertEqual('No profiling data collected yet.', self.cmd('profile', is_admin=True))
+		self.bot.profiler.wrap('Plugin', lambda: None)()
+		self.assertIn('Plugin.<lambda>:', self.cmd('profile', is_admin=True))
+		self.assertEqual('Profiling data reset.', self.cmd('profile reset', is_admin=True))
+		self.assertEqual({}, self.bot.profiler.stats)
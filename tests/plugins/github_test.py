@@ -1,6 +1,7 @@
 import hmac
 import hashlib
 import os.path
+import unittest.mock as mock
 
 from tests.plugins import PluginTestCase
 import plugins.github
@@ -43,3 +44,62 @@ class GithubPluginTest(PluginTestCase):
 	def test_pull_request(self):
 		ret = self.trigger_webhook('pull_request')
 		self.assertEqual('[baxterthehacker/public-repo] Pull request opened by baxterthehacker: Update the README with new information - https://github.com/baxterthehacker/public-repo/pull/1', ret)
+
+
+class GithubEventBufferTest(GithubPluginTest):
+	def create_plugin(self):
+		self.sent = []
+		self.bot.config['github_aggregate_window'] = 30
+		plugin = super().create_plugin()
+		plugin.events = self.events = plugins.github.EventBuffer(30, self.sent.append)
+		return plugin
+
+	def trigger_webhook(self, event):
+		with mock.patch('threading.Timer'):
+			return super().trigger_webhook(event)
+
+	def flush(self):
+		for key in list(self.events._events):
+			self.events.flush(key)
+
+	def test_push(self):
+		self.assertEqual(None, self.trigger_webhook('push'))
+		self.assertEqual([], self.sent)
+		self.flush()
+		self.assertEqual(1, len(self.sent))
+		self.assertEqual('[baxterthehacker/public-repo] New commit to changes by baxterthehacker: Update README.md - https://github.com/baxterthehacker/public-repo/commit/0d1a26e67d', self.sent[0][0])
+
+	def test_issue(self):
+		self.assertEqual(None, self.trigger_webhook('issues'))
+		self.flush()
+		self.assertEqual(['[baxterthehacker/public-repo] Issue opened by baxterthehacker: Spelling error in the README file - https://github.com/baxterthehacker/public-repo/issues/2'], self.sent)
+
+	def test_pull_request(self):
+		self.assertEqual(None, self.trigger_webhook('pull_request'))
+		self.flush()
+		self.assertEqual(['[baxterthehacker/public-repo] Pull request opened by baxterthehacker: Update the README with new information - https://github.com/baxterthehacker/public-repo/pull/1'], self.sent)
+
+	def test_multiple_pushes_are_aggregated(self):
+		self.trigger_webhook('push')
+		self.trigger_webhook('push')
+		self.trigger_webhook('issues')
+		self.flush()
+		self.assertEqual([
+			'[baxterthehacker/public-repo] changes: 2 new commits by baxterthehacker - https://github.com/baxterthehacker/public-repo/compare/9049f1265b7d...0d1a26e67d8f',
+			'[baxterthehacker/public-repo] Issue opened by baxterthehacker: Spelling error in the README file - https://github.com/baxterthehacker/public-repo/issues/2',
+		], self.sent)
+
+	def test_pull_requests_are_aggregated(self):
+		self.trigger_webhook('pull_request')
+		self.trigger_webhook('pull_request')
+		self.flush()
+		self.assertEqual(['[baxterthehacker/public-repo] master: pull request opened: #1'], self.sent)
+
+	def test_timer_runs_flush_through_error_handler(self):
+		events = plugins.github.EventBuffer(30, self.sent.append,
+			wrap=self.bot._wrap_error_handler)
+		with mock.patch.object(self.bot, 'error_handler') as error_handler, \
+				mock.patch('threading.Timer') as timer:
+			events.add('issues', {'repository': {'full_name': 'foo/bar'}}, 'line')
+		error_handler.wrap.assert_called_once_with(events.flush)
+		self.assertIs(error_handler.wrap.return_value, timer.call_args[0][1])
@@ -1,11 +1,21 @@
+import os
+import os.path
+import threading
+import unittest
 import unittest.mock as mock
+import requests.exceptions
 from tests.plugins import PluginTestCase
+import plugins.qdb
+from plugins.qdb import QuoteIndex
 
 f = 'plugins.qdb._get_qdb_data'
 
 class QdbPluginTest(PluginTestCase):
 	def create_plugin(self):
 		from plugins.qdb import QdbPlugin
+		plugins.qdb._quotes_by_id.clear()
+		plugins.qdb._search_results.clear()
+		plugins.qdb._random_pool.clear()
 		return QdbPlugin(self.bot, self.channel)
 
 	def test_search_quote_no_results(self):
@@ -31,3 +41,143 @@ class QdbPluginTest(PluginTestCase):
 		with mock.patch(f) as mf:
 			ret = self.cmd('qdb')
 			mf.assert_called_with('https://qdb.lutro.me/random', query_params=None)
+
+	def test_long_quote_excerpt(self):
+		body = '\n'.join('<foo> line {}'.format(i) for i in range(100))
+		data = {'quotes': [{'id': 1, 'body': body}]}
+		with mock.patch(f, return_value=data):
+			ret = self.cmd('qdb line 50')
+		self.assertTrue(ret.startswith('https://qdb.lutro.me/1 - [...] '))
+		self.assertTrue(ret.endswith(' [...]'))
+		self.assertIn('<foo> line 50 <foo>', ret)
+
+	def test_quotes_are_cached_by_id(self):
+		data = {'quote': {'id': 1, 'body': 'bar', 'approved': True}}
+		with mock.patch(f, return_value=data) as mf:
+			self.assertEqual('https://qdb.lutro.me/1 - bar', self.cmd('qdb #1'))
+			self.assertEqual('https://qdb.lutro.me/1 - bar', self.cmd('qdb #1'))
+		self.assertEqual(1, mf.call_count)
+
+		data = {'quotes': [{'id': 2, 'body': 'baz', 'approved': True}]}
+		with mock.patch(f, return_value=data) as mf:
+			self.cmd('qdb baz')
+		with mock.patch(f) as mf:
+			self.assertEqual('https://qdb.lutro.me/2 - baz', self.cmd('qdb #2'))
+		mf.assert_not_called()
+
+	def test_search_results_are_cached(self):
+		data = {'quotes': [{'id': 1, 'body': 'bar'}]}
+		with mock.patch(f, return_value=data) as mf:
+			self.assertEqual('https://qdb.lutro.me/1 - bar', self.cmd('qdb foo'))
+			self.assertEqual('https://qdb.lutro.me/1 - bar', self.cmd('qdb FOO'))
+		self.assertEqual(1, mf.call_count)
+
+	def test_search_cache_is_cleared_on_update(self):
+		data = {'quotes': [{'id': 1, 'body': 'bar'}]}
+		with mock.patch(f, return_value=data) as mf:
+			self.cmd('qdb foo')
+			self.http('POST', '/qdb-update',
+				body='{"quote": {"id": 2, "body": "foo", "approved": true}}')
+			self.cmd('qdb foo')
+		self.assertEqual(2, mf.call_count)
+
+	def test_random_quotes_come_from_pool(self):
+		data = {'quotes': [{'id': i, 'body': 'quote %d' % i} for i in range(10)]}
+		with mock.patch(f, return_value=data) as mf:
+			self.assertEqual('https://qdb.lutro.me/0 - quote 0', self.cmd('qdb'))
+			self.assertEqual('https://qdb.lutro.me/1 - quote 1', self.cmd('qdb'))
+		self.assertEqual(1, mf.call_count)
+
+	def test_random_pool_is_refilled_in_background(self):
+		data = {'quotes': [{'id': i, 'body': 'quote %d' % i} for i in range(6)]}
+		executor = mock.Mock()
+		with mock.patch(f, return_value=data), \
+				mock.patch('botologist.concurrency.get_executor', return_value=executor):
+			self.cmd('qdb')
+			executor.submit.assert_not_called()
+			self.cmd('qdb')
+			executor.submit.assert_called_once_with(plugins.qdb._random_pool._refill)
+			self.cmd('qdb')
+			self.assertEqual(1, executor.submit.call_count)
+			plugins.qdb._random_pool._refill()
+		self.assertEqual(9, len(plugins.qdb._random_pool))
+
+	def test_local_index_is_searched_when_qdb_fails(self):
+		plugins.qdb._index = QuoteIndex(':memory:')
+		try:
+			self.http('POST', '/qdb-update',
+				body='{"quote": {"id": 3, "body": "foo bar baz", "approved": true}}')
+
+			data = {'quotes': [{'id': 4, 'body': 'foobar baz'}]}
+			with mock.patch(f, return_value=data) as mf:
+				self.assertEqual('https://qdb.lutro.me/4 - foobar baz', self.cmd('qdb baz'))
+			self.assertEqual(1, mf.call_count)
+			self.assertEqual(2, len(plugins.qdb._index))
+
+			error = requests.exceptions.ConnectionError()
+			with mock.patch(f, side_effect=error):
+				self.assertEqual('https://qdb.lutro.me/3 - foo bar baz', self.cmd('qdb foo'))
+				self.assertEqual('HTTP error!', self.cmd('qdb qux'))
+
+			with mock.patch(f) as mf:
+				plugins.qdb._quotes_by_id.clear()
+				self.assertEqual('https://qdb.lutro.me/3 - foo bar baz', self.cmd('qdb #3'))
+			mf.assert_not_called()
+		finally:
+			plugins.qdb._index = None
+
+
+	def test_local_index_is_searched_when_qdb_is_slow(self):
+		plugins.qdb._index = QuoteIndex(':memory:')
+		plugins.qdb._index.add({'id': 3, 'body': 'foo bar baz', 'approved': True})
+		release = threading.Event()
+		def slow_search(url, query_params):
+			release.wait(5)
+			return {'quotes': [{'id': 4, 'body': 'foo'}]}
+		try:
+			with mock.patch('plugins.qdb.SEARCH_TIMEOUT', 0.01), \
+					mock.patch(f, side_effect=slow_search):
+				self.assertEqual('https://qdb.lutro.me/3 - foo bar baz', self.cmd('qdb foo'))
+				release.set()
+				release.clear()
+				threading.Timer(0.05, release.set).start()
+				# quotes the index doesn't have are still waited for
+				self.assertEqual('https://qdb.lutro.me/4 - foo', self.cmd('qdb qux'))
+		finally:
+			release.set()
+			plugins.qdb._index = None
+
+
+class QuoteIndexTest(unittest.TestCase):
+	path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tmp', 'qdb.sqlite3')
+
+	def setUp(self):
+		self.index = QuoteIndex(self.path)
+
+	def tearDown(self):
+		if os.path.isfile(self.path):
+			os.remove(self.path)
+
+	def test_search(self):
+		self.index.add_many([
+			{'id': 1, 'body': '<foo> hello world', 'approved': True},
+			{'id': 2, 'body': '<bar> goodbye world', 'approved': True},
+		])
+		self.assertEqual(1, self.index.search('HELLO')['id'])
+		self.assertEqual(2, self.index.search('world goodbye')['id'])
+		self.assertEqual(None, self.index.search('hello goodbye'))
+		self.assertEqual(None, self.index.search('hello OR goodbye'))
+		self.assertEqual(None, self.index.search('***'))
+
+	def test_updates_and_removes_quotes(self):
+		self.index.add({'id': 1, 'body': 'foo', 'approved': True})
+		self.index.add({'id': 1, 'body': 'bar', 'approved': True})
+		self.assertEqual({'id': 1, 'body': 'bar', 'approved': True}, self.index.get(1))
+		self.assertEqual(None, self.index.search('foo'))
+		self.index.add({'id': 1, 'body': 'bar', 'approved': False})
+		self.assertEqual(None, self.index.get(1))
+		self.assertEqual(0, len(self.index))
+
+	def test_index_is_stored(self):
+		self.index.add({'id': 1, 'body': 'foo', 'approved': True})
+		self.assertEqual(1, QuoteIndex(self.path).search('foo')['id'])
@@ -1,4 +1,5 @@
 import unittest.mock as mock
+import requests.exceptions
 from tests.plugins import PluginTestCase
 
 f = 'plugins.qlranks._get_qlr_data'
@@ -28,3 +29,33 @@ class QlranksPluginTest(PluginTestCase):
 			self.assertTrue(ret.index('ca: 1227 (rank 8,888)'))
 			self.assertTrue(ret.index('duel: 1337 (rank 9,999)'))
 			self.assertEqual(ret, self.cmd('elo test ca,duel'))
+
+	def test_multiple_players(self):
+		players = {
+			'foo': {'nick': 'Foo', 'duel': {'elo': 1337, 'rank': 9999}, 'ca': {'elo': 1227, 'rank': 0}},
+			'bar': {'nick': 'Bar', 'duel': {'elo': 1500, 'rank': 1234}, 'ca': {'elo': 1600, 'rank': 12}},
+			'baz': {'nick': 'baz', 'duel': {'elo': 0, 'rank': 0}},
+		}
+		with mock.patch(f, side_effect=lambda nick: players[nick]) as mf:
+			ret = self.cmd('elo foo,bar,baz,foo')
+			self.assertEqual('Foo: duel 1337 (#9,999) | Bar: duel 1500 (#1,234) | baz: not found', ret)
+			self.assertEqual(3, mf.call_count)
+
+			ret = self.cmd('elo foo,bar ca,duel')
+			self.assertEqual('Foo: ca unranked, duel 1337 (#9,999) | Bar: ca 1600 (#12), duel 1500 (#1,234)', ret)
+
+			self.assertEqual('Unknown mode: tdm', self.cmd('elo foo,bar tdm'))
+
+	def test_multiple_players_error(self):
+		def get_data(nick):
+			if nick == 'bar':
+				raise requests.exceptions.ConnectionError()
+			return {'nick': nick, 'duel': {'elo': 1337, 'rank': 1}}
+		with mock.patch(f, side_effect=get_data):
+			self.assertEqual('foo: duel 1337 (#1) | bar: error', self.cmd('elo foo,bar'))
+
+	def test_too_many_players(self):
+		with mock.patch(f) as mf:
+			ret = self.cmd('elo ' + ','.join('p%d' % i for i in range(9)))
+		self.assertEqual('Too many players, the limit is 8!', ret)
+		mf.assert_not_called()
@@ -0,0 +1,60 @@
+import unittest.mock as mock
+from tests.plugins import PluginTestCase
+
+from plugins.spotify import Spotify
+
+
+def get_track(track_id):
+	return {
+		'name': 'Track ' + track_id,
+		'album': {'name': 'Album'},
+		'artists': [{'name': 'Artist'}],
+	}
+
+
+def get_album(album_id):
+	return {'name': 'Album ' + album_id, 'artists': [{'name': 'A'}, {'name': 'B'}]}
+
+
+class SpotifyPluginTest(PluginTestCase):
+	def create_plugin(self):
+		from plugins.spotify import SpotifyPlugin
+		Spotify.get_info_str.cache.clear()
+		plugin = SpotifyPlugin(self.bot, self.channel)
+		plugin.spotify.spotipy = mock.Mock()
+		return plugin
+
+	@property
+	def spotipy(self):
+		return self.plugin.spotify.spotipy
+
+	def test_single_link(self):
+		self.spotipy.track.return_value = get_track('a')
+		ret = self.reply('https://open.spotify.com/track/a')
+		self.assertEqual(['[spotify] Artist - Album - Track a'], ret)
+		self.spotipy.track.assert_called_once_with('a')
+
+	def test_multiple_links_are_batched_per_type(self):
+		self.spotipy.tracks.return_value = {'tracks': [get_track('a'), None]}
+		self.spotipy.albums.return_value = {'albums': [get_album('c')]}
+		ret = self.reply('spotify:track:a spotify:album:c spotify:track:b spotify:track:a')
+		self.assertEqual([
+			'[spotify] Artist - Album - Track a',
+			'[spotify] A, B - Album c',
+		], ret)
+		self.spotipy.tracks.assert_called_once_with(['a', 'b'])
+		self.spotipy.albums.assert_called_once_with(['c'])
+		self.spotipy.track.assert_not_called()
+
+	def test_links_are_cached(self):
+		self.spotipy.tracks.return_value = {'tracks': [get_track('a'), None]}
+		self.reply('spotify:track:a spotify:track:b')
+		self.spotipy.tracks.reset_mock()
+		self.spotipy.track.return_value = get_track('c')
+		ret = self.reply('spotify:track:a spotify:track:b spotify:track:c')
+		self.assertEqual([
+			'[spotify] Artist - Album - Track a',
+			'[spotify] Artist - Album - Track c',
+		], ret)
+		self.spotipy.tracks.assert_not_called()
+		self.spotipy.track.assert_called_once_with('c')
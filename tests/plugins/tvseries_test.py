@@ -0,0 +1,69 @@
+import datetime
+import time
+import unittest.mock as mock
+import requests.exceptions
+
+from tests.plugins import PluginTestCase
+import plugins.tvseries
+
+
+f = 'plugins.tvseries._get_tvmaze_data'
+
+
+def get_show_data(airs_in=None):
+	data = {'id': 1, 'name': 'Some Show'}
+	if airs_in is not None:
+		airs_at = datetime.datetime.now(datetime.timezone.utc) + airs_in
+		data['_embedded'] = {'nextepisode': {
+			'season': 2,
+			'number': 3,
+			'airstamp': airs_at.replace(microsecond=0).isoformat(),
+		}}
+	return data
+
+
+class TvseriesPluginTest(PluginTestCase):
+	cfg = {'output_timezone': 'UTC'}
+
+	def create_plugin(self):
+		plugins.tvseries._show_ids.clear()
+		plugins.tvseries._shows.clear()
+		return plugins.tvseries.TvseriesPlugin(self.bot, self.channel)
+
+	def test_next_episode(self):
+		data = get_show_data(datetime.timedelta(days=2, minutes=1))
+		with mock.patch(f, return_value=data) as mf:
+			ret = self.cmd('nextepisode some show')
+		mf.assert_called_once_with('http://api.tvmaze.com/singlesearch/shows',
+			{'q': 'some show', 'embed': 'nextepisode'})
+		self.assertTrue(ret.startswith('Some Show - season 2, episode 3 airs at '))
+		self.assertTrue(ret.endswith(' (in 2d 0h)'))
+
+	def test_no_next_episode(self):
+		with mock.patch(f, return_value=get_show_data()):
+			ret = self.cmd('nextepisode some show')
+		self.assertEqual('Some Show - no next episode :(', ret)
+
+	def test_show_is_cached_until_next_episode_airs(self):
+		data = get_show_data(datetime.timedelta(hours=5))
+		with mock.patch(f, return_value=data) as mf:
+			self.cmd('nextepisode some show')
+			ret = self.cmd('nextepisode  Some SHOW')
+		self.assertEqual(1, mf.call_count)
+		self.assertIn('Some Show - season 2, episode 3 airs at ', ret)
+		expires = plugins.tvseries._shows._data[1][1]
+		self.assertTrue(4 * 3600 < expires - time.time() <= 5 * 3600)
+
+	def test_aired_show_is_fetched_by_id(self):
+		data = get_show_data(datetime.timedelta(hours=5))
+		with mock.patch(f, return_value=data):
+			self.cmd('nextepisode some show')
+		plugins.tvseries._shows.clear()
+		with mock.patch(f, return_value=data) as mf:
+			self.cmd('nextepisode some show')
+		mf.assert_called_once_with('http://api.tvmaze.com/shows/1',
+			{'embed': 'nextepisode'})
+
+	def test_http_error(self):
+		with mock.patch(f, side_effect=requests.exceptions.ConnectionError):
+			self.assertEqual(None, self.cmd('nextepisode some show'))
@@ -1,13 +1,28 @@
+import time
 import unittest.mock as mock
+import tweepy
 from tests.plugins import PluginTestCase
+import plugins.twitter
+
+
+def make_tweet(tweet_id, text=None):
+	tweet = mock.MagicMock()
+	tweet.id_str = tweet_id
+	tweet.author.screen_name = 'author'
+	tweet.text = text or 'text ' + tweet_id
+	return tweet
+
 
 class TwitterPluginTest(PluginTestCase):
 	cfg = {'twitter_api': True}
 
 	def create_plugin(self):
 		from plugins.twitter import TwitterPlugin
+		plugins.twitter._tweets.clear()
+		plugins.twitter._rate_limit = plugins.twitter.RateLimit()
 		plugin = TwitterPlugin(self.bot, self.channel)
 		plugin.api = self.api = mock.MagicMock()
+		self.api.last_response = None
 		return plugin
 
 	def test_calls_api(self):
@@ -17,4 +32,67 @@ class TwitterPluginTest(PluginTestCase):
 		self.api.get_status = mock.MagicMock(return_value=tweet)
 
 		ret = self.reply('https://twitter.com/author/status/625945123789119488')
-		self.assertEqual('[@author] text', ret)
+		self.assertEqual(['[@author] text'], ret)
+		self.api.get_status.assert_called_once_with('625945123789119488')
+
+	def test_multiple_tweets_are_looked_up_in_bulk(self):
+		self.api.statuses_lookup.return_value = [make_tweet('2'), make_tweet('1')]
+
+		ret = self.reply('https://twitter.com/author/status/1 and '
+			'https://twitter.com/author/status/2?s=20')
+		self.assertEqual(['[@author] text 1', '[@author] text 2'], ret)
+		self.api.statuses_lookup.assert_called_once_with(['1', '2'])
+		self.api.get_status.assert_not_called()
+
+	def test_tweets_are_cached(self):
+		self.api.get_status.return_value = make_tweet('1')
+		self.reply('https://twitter.com/author/status/1')
+		self.reply('https://twitter.com/author/status/1')
+		self.assertEqual(1, self.api.get_status.call_count)
+
+	def test_rate_limit(self):
+		self.api.last_response = mock.Mock(headers={
+			'x-rate-limit-remaining': '0',
+			'x-rate-limit-reset': str(int(time.time()) + 60),
+		})
+		self.api.get_status.return_value = make_tweet('1')
+		self.assertEqual(['[@author] text 1'], self.reply('https://twitter.com/author/status/1'))
+		self.assertEqual(None, self.reply('https://twitter.com/author/status/2'))
+		self.assertEqual(1, self.api.get_status.call_count)
+
+	def test_rate_limit_error(self):
+		self.api.get_status.side_effect = tweepy.RateLimitError('rate limited')
+		self.assertEqual(None, self.reply('https://twitter.com/author/status/1'))
+		self.assertFalse(plugins.twitter._rate_limit.allows())
+
+	def test_rate_limit_error_without_rate_limit_error_class(self):
+		error = tweepy.TweepError('rate limited')
+		error.response = mock.Mock(status_code=429)
+		self.api.get_status.side_effect = error
+		with mock.patch.object(tweepy, 'RateLimitError', None):
+			self.assertEqual(None, self.reply('https://twitter.com/author/status/1'))
+		self.assertFalse(plugins.twitter._rate_limit.allows())
+
+	def test_other_errors_do_not_exhaust_rate_limit(self):
+		self.api.get_status.side_effect = tweepy.TweepError('not found')
+		self.assertEqual(None, self.reply('https://twitter.com/author/status/1'))
+		self.assertTrue(plugins.twitter._rate_limit.allows())
+
+	def test_api_is_initialized_on_connect(self):
+		self.plugin.api = None
+		with mock.patch.object(self.plugin, 'make_api', return_value=self.api), \
+				mock.patch('botologist.concurrency.get_executor') as executor:
+			for callback in self.bot.client.on_connect:
+				if callback == self.plugin.init_api_in_background:
+					callback()
+			executor.return_value.submit.assert_called_once_with(mock.ANY)
+			self.plugin.init_api()
+		self.assertIs(self.api, self.plugin.api)
+		self.api.verify_credentials.assert_called_once_with()
+
+	def test_api_is_initialized_right_away_when_already_connected(self):
+		self.bot.started = True
+		with mock.patch('botologist.concurrency.get_executor') as executor:
+			plugin = plugins.twitter.TwitterPlugin(self.bot, self.channel)
+		executor.return_value.submit.assert_called_once_with(mock.ANY)
+		self.assertNotIn(plugin.init_api_in_background, self.bot.client.on_connect)
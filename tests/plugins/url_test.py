@@ -1,10 +1,11 @@
 import unittest.mock as mock
 from tests.plugins import PluginTestCase
+import plugins.url
 
 class UrlPluginTest(PluginTestCase):
 	def create_plugin(self):
-		from plugins.url import UrlPlugin
-		return UrlPlugin(self.bot, self.channel)
+		plugins.url.unshorten_url.cache.clear()
+		return plugins.url.UrlPlugin(self.bot, self.channel)
 
 	def test_unshortens_url(self):
 		url = 'http://www.foobar.com'
@@ -13,6 +14,41 @@ class UrlPluginTest(PluginTestCase):
 		self.assertEqual(['http://t.co/asdf => http://www.foobar.com'], ret)
 
 	def test_shorten_goo_gl_maps(self):
-		with mock.patch('plugins.url.get_location') as mock_get_location:
+		with mock.patch('plugins.url.get_location', return_value=None) as mock_get_location:
 			self.reply('http://goo.gl/maps/asdf')
 		mock_get_location.assert_called_once_with('http://goo.gl/maps/asdf')
+
+	def test_follows_redirect_chain(self):
+		locations = {
+			'http://t.co/asdf': 'http://bit.ly/asdf',
+			'http://bit.ly/asdf': 'https://www.foobar.com/',
+		}
+		with mock.patch('plugins.url.get_location', side_effect=locations.get):
+			ret = self.reply('http://t.co/asdf')
+		self.assertEqual(['http://t.co/asdf => https://www.foobar.com/'], ret)
+
+	def test_redirect_hop_limit(self):
+		with mock.patch('plugins.url.get_location', side_effect=lambda url: url + 'a') as mf:
+			ret = self.reply('http://t.co/asdf')
+		self.assertEqual(plugins.url.MAX_REDIRECTS, mf.call_count)
+		self.assertEqual(['http://t.co/asdf => http://t.co/asdfaaaaa'], ret)
+
+	def test_resolved_urls_are_cached(self):
+		url = 'http://www.foobar.com'
+		with mock.patch('plugins.url.get_location', side_effect=[url, None]) as mf:
+			self.reply('http://t.co/asdf')
+			ret = self.reply('http://t.co/asdf')
+		self.assertEqual(2, mf.call_count)
+		self.assertEqual(['http://t.co/asdf => http://www.foobar.com'], ret)
+
+	def test_resolves_multiple_urls(self):
+		locations = {
+			'http://t.co/asdf': 'http://www.foo.com',
+			'http://bit.ly/asdf': 'http://www.bar.com',
+		}
+		with mock.patch('plugins.url.get_location', side_effect=locations.get):
+			ret = self.reply('http://t.co/asdf http://bit.ly/asdf http://t.co/asdf')
+		self.assertEqual([
+			'http://t.co/asdf => http://www.foo.com',
+			'http://bit.ly/asdf => http://www.bar.com',
+		], ret)
@@ -1,5 +1,6 @@
 import json
 import os.path
+import threading
 import unittest.mock as mock
 
 from tests.plugins import PluginTestCase
@@ -20,6 +21,10 @@ def get_json(state):
 
 class WeatherPluginTest(PluginTestCase):
 	def create_plugin(self):
+		plugins.weather._weather.clear()
+		plugins.weather._city_ids.clear()
+		plugins.weather._not_found.clear()
+		plugins.weather._recent.clear()
 		return plugins.weather.WeatherPlugin(self.bot, self.channel)
 
 	@mock.patch(f, return_value=get_json('edinburgh'))
@@ -36,3 +41,63 @@ class WeatherPluginTest(PluginTestCase):
 	def test_not_found(self, mock):
 		ret = self.cmd('weather asljkhajkhf')
 		self.assertEqual('Error: City not found', ret)
+
+	def test_weather_is_cached_by_city(self):
+		with mock.patch(f, return_value=get_json('edinburgh')) as mf:
+			self.cmd('weather edinburgh')
+			ret = self.cmd('weather EDINBURGH')
+		self.assertEqual(1, mf.call_count)
+		self.assertEqual('Weather in Edinburgh, GB: light rain - temperature: 17.64°C - wind: 1.5m/s', ret)
+
+	def test_not_found_is_cached(self):
+		with mock.patch(f, return_value=get_json('404')) as mf:
+			self.cmd('weather asljkhajkhf')
+			ret = self.cmd('weather asljkhajkhf')
+		self.assertEqual(1, mf.call_count)
+		self.assertEqual('Error: City not found', ret)
+
+	def test_refreshes_expired_cities_in_bulk(self):
+		edinburgh = get_json('edinburgh')
+		tel_aviv = get_json('tel_aviv')
+		with mock.patch(f, side_effect=[edinburgh, tel_aviv]):
+			self.cmd('weather edinburgh')
+			self.cmd('weather tel aviv')
+
+		with mock.patch(f) as mf:
+			self.plugin.refresh()
+		mf.assert_not_called()
+
+		plugins.weather._weather.clear()
+		edinburgh = dict(edinburgh, main={'temp': 10})
+		del edinburgh['cod']
+		group = {'cnt': 2, 'list': [edinburgh, tel_aviv]}
+		with mock.patch(f, return_value=group) as mf:
+			self.plugin.refresh()
+		mf.assert_called_once_with('http://api.openweathermap.org/data/2.5/group',
+			query_params={'id': '293396,2650225', 'units': 'metric', 'APPID': None})
+
+		with mock.patch(f) as mf:
+			ret = self.cmd('weather edinburgh')
+		mf.assert_not_called()
+		self.assertEqual('Weather in Edinburgh, GB: light rain - temperature: 10°C - wind: 1.5m/s', ret)
+
+	def test_forgets_cities_not_requested_recently(self):
+		with mock.patch(f, return_value=get_json('edinburgh')):
+			self.cmd('weather edinburgh')
+		plugins.weather._recent[2650225] -= plugins.weather.RECENT_TIME + 1
+		plugins.weather._weather.clear()
+		with mock.patch(f) as mf:
+			self.plugin.refresh()
+		mf.assert_not_called()
+
+	def test_cities_can_be_added_while_refreshing(self):
+		def add_cities():
+			for city_id in range(2000):
+				plugins.weather._mark_recent(city_id)
+		thread = threading.Thread(target=add_cities)
+		with mock.patch(f, return_value={'list': []}):
+			thread.start()
+			while thread.is_alive():
+				self.plugin.refresh()
+		thread.join()
+		self.assertEqual(2000, len(plugins.weather._recent))